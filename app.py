@@ -1,6 +1,16 @@
 from flask import Flask
 from db import db_init, close_db
 from routes import profiles_bp
+import realtime
+import ingest
+import clustering
+import tiles
+import profilecache
+import passwords
+import ratelimit
+import cli
+import metrics
+import routing
 
 
 def create_app(test_config=None):
@@ -13,6 +23,16 @@ def create_app(test_config=None):
         app.config.update(test_config)
 
     db_init(app)
+    metrics.init_app(app)
+    realtime.init_app(app)
+    ingest.init_app(app)
+    clustering.init_app(app)
+    tiles.init_app(app)
+    profilecache.init_app(app)
+    passwords.init_app(app)
+    ratelimit.init_app(app)
+    routing.init_app(app)
+    cli.init_app(app)
     app.register_blueprint(profiles_bp, url_prefix="/profiles")
     app.teardown_appcontext(close_db)
 
@@ -21,3 +41,19 @@ def create_app(test_config=None):
         return {"app": "Driving Navigation (prototype)", "status": "ok"}
 
     return app
+
+
+def shutdown(app):
+    # graceful stop for servers: end event streams, write positions still in
+    # the ingest buffer, then release pools. Safe to call more than once.
+    app.extensions["location_hub"].close()
+    buffer = app.extensions.get("location_buffer")
+    if buffer:
+        buffer.close()
+    app.extensions["password_hasher"].close()
+    limiter = app.extensions.get("rate_limiter")
+    if limiter and hasattr(limiter.store, "close"):
+        limiter.store.close()
+    pool = app.extensions.get("db_pool")
+    if pool:
+        pool.close()
@@ -0,0 +1,272 @@
+# ASGI entry point. The event loop owns the sockets (keep-alive, slow clients,
+# idle connections cost no thread) while each request runs the ordinary Flask
+# views on a bounded thread pool, so SQLite I/O and password checks never
+# block the loop. At most SERVE_THREADS requests run at once; the rest wait
+# in the pool's queue. Event streams (requests accepting text/event-stream)
+# hold a thread for as long as they stay open, so they get a pool of their
+# own, SERVE_STREAMS threads, and are answered 503 beyond that rather than
+# queued: open streams never hold up ordinary requests. A view can register
+# a callback through environ[ON_DISCONNECT] to be woken when its client goes
+# away, as the location stream does to end at once instead of at its next
+# keepalive. Request bodies are read into memory, so anything larger than
+# MAX_CONTENT_LENGTH (default 16 MiB) is answered 413 without being read.
+#
+#   uvicorn --factory asgi:create_asgi_app --workers 1
+#
+# or `python serve.py`. On lifespan shutdown, streams are ended and buffered
+# positions are written before the process exits (app.shutdown).
+import asyncio
+import collections
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app import create_app, shutdown
+
+
+SEND_WINDOW = 64  # body chunks a request thread may queue ahead of the socket
+MAX_BODY = 16 * 1024 * 1024
+ON_DISCONNECT = "group_navigation.on_disconnect"
+
+
+class Disconnected(Exception):
+    pass
+
+
+class _Disconnect:
+    # set once the client is gone; callbacks added before run then, later
+    # ones at once
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def set(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+class AsgiAdapter:
+    def __init__(self, app, threads=32, streams=256):
+        self.app = app
+        self.threads = threads
+        self.streams = streams
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="asgi")
+        self.stream_executor = ThreadPoolExecutor(streams, thread_name_prefix="asgi-stream")
+        self.open_streams = 0  # only touched on the event loop
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(None, shutdown, self.app)
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.stream_executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _reject(self, send, status, message, headers=()):
+        await send({"type": "http.response.start", "status": status, "headers": [*headers, (b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": message})
+
+    async def _http(self, scope, receive, send):
+        stream = any(name == b"accept" and b"text/event-stream" in value for name, value in scope["headers"])
+        if stream and self.open_streams >= self.streams:
+            await self._reject(send, 503, b"too many open streams", [(b"retry-after", b"5")])
+            return
+
+        limit = self.app.config["MAX_CONTENT_LENGTH"]
+        declared = next((value for name, value in scope["headers"] if name == b"content-length"), b"")
+        if limit is not None and declared.isdigit() and int(declared) > limit:
+            await self._reject(send, 413, b"request body too large")
+            return
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if limit is not None and len(body) > limit:
+                # e.g. chunked, with no Content-Length to check up front
+                await self._reject(send, 413, b"request body too large")
+                return
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        outbox = _Outbox(loop)
+        disconnected = _Disconnect()
+        environ = _environ(scope, bytes(body))
+        environ[ON_DISCONNECT] = disconnected.add
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = loop.create_task(watch())
+        if stream:
+            self.open_streams += 1
+        try:
+            executor = self.stream_executor if stream else self.executor
+            done = loop.run_in_executor(executor, self._run, environ, outbox, disconnected)
+            finished = False
+            while not finished:
+                chunks, more = [], True
+                for item in await outbox.take():
+                    if item is None:
+                        finished = True
+                    elif item["type"] == "http.response.start":
+                        await send(item)
+                    else:
+                        chunks.append(item["body"])
+                        more = item["more_body"]
+                if chunks:
+                    # everything the thread produced since the last wakeup goes out as one message
+                    await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": more})
+                    outbox.window.release(len(chunks))
+            await done
+        finally:
+            # also stops a streaming response if this task is cancelled
+            disconnected.set()
+            watcher.cancel()
+            if stream:
+                self.open_streams -= 1
+
+    def _run(self, environ, outbox, disconnected):
+        # runs on a pool thread; never waits for the socket unless
+        # SEND_WINDOW chunks are already queued
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["start"] = {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers],
+            }
+
+        def put(body, more):
+            while not outbox.window.acquire(timeout=1):
+                if disconnected.is_set():
+                    raise Disconnected()
+            if disconnected.is_set():
+                raise Disconnected()
+            if not response.get("sent"):
+                outbox.put(response["start"])
+                response["sent"] = True
+            outbox.put({"type": "http.response.body", "body": body, "more_body": more})
+
+        try:
+            iterable = self.app(environ, start_response)
+            try:
+                for chunk in iterable:
+                    if chunk:
+                        put(chunk, True)
+                put(b"", False)
+            except Disconnected:
+                pass
+            finally:
+                if hasattr(iterable, "close"):
+                    iterable.close()
+        finally:
+            outbox.put(None)
+
+
+class _Outbox:
+    # Messages from a request thread to the event loop. The thread appends
+    # without blocking and only wakes the loop when it is not already due to
+    # run, so a fast producer (a streamed template) hands over many chunks
+    # per wakeup while a slow one (an event stream) is sent at once.
+    def __init__(self, loop):
+        self.loop = loop
+        self.window = threading.BoundedSemaphore(SEND_WINDOW)
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+        self._scheduled = False
+
+    def put(self, item):
+        with self._lock:
+            self._items.append(item)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.loop.call_soon_threadsafe(self._ready.set)
+
+    async def take(self):
+        await self._ready.wait()
+        self._ready.clear()
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+            self._scheduled = False
+        return items
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin1"),
+        "PATH_INFO": scope["path"].encode().decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def create_asgi_app(test_config=None):
+    # serve.py passes --threads and --streams to uvicorn's worker processes
+    # as SERVE_THREADS and SERVE_STREAMS
+    app = create_app(test_config)
+    if app.config["MAX_CONTENT_LENGTH"] is None:
+        app.config["MAX_CONTENT_LENGTH"] = MAX_BODY
+    app.config.setdefault("SERVE_THREADS", int(os.environ.get("SERVE_THREADS", 32)))
+    app.config.setdefault("SERVE_STREAMS", int(os.environ.get("SERVE_STREAMS", 256)))
+    return AsgiAdapter(app, app.config["SERVE_THREADS"], app.config["SERVE_STREAMS"])
@@ -0,0 +1,57 @@
+# Latency of the admin dashboard on a large table: first and deep pages for
+# each sort order, plus narrow and broad prefix searches.
+#
+#   python -m benchmarks.bench_admin [--users 1000000] [--requests 200]
+import argparse
+import sqlite3
+import time
+from benchmarks.common import BENCH_PASSWORD, make_app, print_table, seed_profiles, summarize, temp_db_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    ids = seed_profiles(db_path, args.users)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE user_profiles SET is_admin = 1 WHERE id = ?", (ids[0],))
+    conn.commit()
+    deep = conn.execute("SELECT created_at, id FROM user_profiles WHERE id = ?", (ids[len(ids) // 2],)).fetchone()
+    conn.close()
+
+    middle = ids[len(ids) // 2]
+    pages = {
+        "newest first": "/profiles/admin",
+        "deep page (created_at)": f"/profiles/admin?after={deep[0]}&after_id={deep[1]}",
+        "sort username": "/profiles/admin?sort=username&order=asc",
+        "deep page (username)": f"/profiles/admin?sort=username&order=asc&after=user{middle}&after_id={middle}",
+        "sort email desc": "/profiles/admin?sort=email&order=desc",
+        "search narrow": f"/profiles/admin?q=user{middle}",
+        "search broad": "/profiles/admin?q=user",
+        "search email": f"/profiles/admin?q=user{middle}@",
+    }
+
+    client = app.test_client()
+    rv = client.post("/profiles/login", json={"username": f"user{ids[0]}", "password": BENCH_PASSWORD})
+    assert rv.status_code == 200
+
+    results = []
+    for label, url in pages.items():
+        latencies = []
+        t0 = time.perf_counter()
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            rv = client.get(url)
+            rv.get_data()  # drain the streamed page
+            latencies.append(time.perf_counter() - start)
+            assert rv.status_code == 200
+        results.append((label, summarize(latencies, time.perf_counter() - t0)))
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# Requests/sec on GET /profiles/<id> with a fresh connection per request
+# (the old behaviour) versus the pooled, WAL-configured connections.
+#
+#   python -m benchmarks.bench_db_pool [--users 10000] [--requests 5000] [--threads 4]
+import argparse
+from benchmarks.common import make_app, print_table, run_requests, seed_profiles, summarize, temp_db_path
+
+CONFIGS = {
+    "connect per request": {"DATABASE_POOL_SIZE": 0, "DATABASE_PRAGMAS": {}},
+    "pool + WAL pragmas": {},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    results = []
+    for label, config in CONFIGS.items():
+        db_path = temp_db_path()
+        app = make_app(db_path, **config)
+        ids = seed_profiles(db_path, args.users)
+
+        def get_profile(client, i):
+            rv = client.get(f"/profiles/{ids[i % len(ids)]}")
+            assert rv.status_code == 200
+
+        latencies, elapsed = run_requests(app, get_profile, args.requests, args.threads)
+        results.append((label, summarize(latencies, elapsed)))
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
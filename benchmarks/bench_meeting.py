@@ -0,0 +1,66 @@
+# Meeting-point solver latency against group size: the geodesic geometric
+# median ("sum") and minimax centre ("max") on their own, and the road
+# meeting point on a synthetic street grid (see bench_routing), for members
+# scattered over a square of --spread-km in the middle of it.
+#
+#   python -m benchmarks.bench_meeting [--members 10,50,500,5000] [--nodes 100000] [--spread-km 5]
+import argparse
+import time
+import numpy as np
+import meeting
+import routing
+from spatial import KM_PER_DEG_LAT
+from benchmarks.bench_routing import ORIGIN, grid_network
+from benchmarks.common import print_table, summarize
+
+
+def _time(func, repeat):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - begin)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", default="10,50,500,5000", help="comma-separated group sizes")
+    parser.add_argument("--nodes", type=int, default=100000, help="road grid size, 0 to skip road meeting points")
+    parser.add_argument("--spread-km", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    router = None
+    centre = ORIGIN
+    if args.nodes:
+        router = routing.Router()
+        router.set_graph(routing.build_graph(*grid_network(args.nodes)))
+        half = int(round(args.nodes ** 0.5)) * 0.0005
+        centre = (ORIGIN[0] + half, ORIGIN[1] + half)
+    span = args.spread_km / KM_PER_DEG_LAT
+    corner = (centre[0] - span / 2, centre[1] - span / 2)
+    rng = np.random.default_rng(0)
+    for size in (int(s) for s in args.members.split(",")):
+        lats = corner[0] + rng.uniform(0, span, size)
+        lngs = corner[1] + rng.uniform(0, span, size)
+        rows = [
+            (f"geodesic {objective}", _time(lambda: meeting.meeting_point(lats, lngs, objective), args.repeat))
+            for objective in meeting.OBJECTIVES
+        ]
+        if router is not None:
+            origins = dict(enumerate(zip(lats.tolist(), lngs.tolist())))
+            for objective in meeting.OBJECTIVES:
+                # each run moves one member, as a position update would
+                def solve():
+                    key = int(rng.integers(size))
+                    origins[key] = (corner[0] + rng.uniform(0, span), corner[1] + rng.uniform(0, span))
+                    meeting.road_meeting_point(router, origins, objective)
+                rows.append((f"road {objective}", _time(solve, max(args.repeat // 20, 3))))
+        print(f"\n{size} members")
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Latency of GET /profiles/<id> while a login storm runs in the background,
+# with password hashing inline on the request threads versus on the bounded
+# process pool. Logins rejected by the pool's backpressure (503) are counted.
+#
+#   python -m benchmarks.bench_passwords [--requests 500] [--logins 8]
+import argparse
+import threading
+from benchmarks.common import BENCH_PASSWORD, make_app, print_table, run_requests, seed_profiles, summarize, temp_db_path
+
+CONFIGS = {
+    "no logins": ({}, 0),
+    "storm, hashing inline": ({"PASSWORD_HASH_WORKERS": 0}, None),
+    "storm, process pool": ({}, None),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login threads")
+    args = parser.parse_args()
+
+    results = []
+    for label, (config, logins) in CONFIGS.items():
+        logins = args.logins if logins is None else logins
+        db_path = temp_db_path()
+        app = make_app(db_path, **config)
+        ids = seed_profiles(db_path, args.users)
+        app.extensions["password_hasher"].hash("warm up")  # start the pool outside the measurement
+
+        stop = threading.Event()
+        counts = {200: 0, 503: 0}
+
+        def storm():
+            client = app.test_client()
+            while not stop.is_set():
+                rv = client.post("/profiles/login", json={"username": f"user{ids[0]}", "password": BENCH_PASSWORD})
+                counts[rv.status_code] = counts.get(rv.status_code, 0) + 1
+
+        stormers = [threading.Thread(target=storm, daemon=True) for _ in range(logins)]
+        for t in stormers:
+            t.start()
+
+        def get_profile(client, i):
+            rv = client.get(f"/profiles/{ids[i % len(ids)]}")
+            assert rv.status_code == 200
+
+        latencies, elapsed = run_requests(app, get_profile, args.requests, args.threads)
+        stop.set()
+        for t in stormers:
+            t.join()
+        app.extensions["password_hasher"].close()
+        results.append((label, summarize(latencies, elapsed)))
+        if logins:
+            print(f"{label}: {counts[200]} logins, {counts[503]} rejected with 503")
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Size and serving time of bulk location responses as JSON and in the
+# columnar binary format (Accept: application/vnd.group-navigation.locations):
+# /profiles/locations for a viewport covering every user, and the whole
+# profile list. gzip sizes show what is left once a proxy compresses them.
+#
+#   python -m benchmarks.bench_payloads [--users 100000] [--requests 20]
+import argparse
+import gzip
+import time
+import columnar
+from benchmarks.common import make_app, percentile, seed_profiles, temp_db_path
+
+URLS = {
+    "/profiles/locations": "/profiles/locations?bbox=-159,20,-156,23",
+    "/profiles/ (every row)": "/profiles/?format=ndjson",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    app = make_app(db_path, RATE_LIMIT_ENABLED=False)
+    seed_profiles(db_path, args.users)
+    client = app.test_client()
+
+    print(f"{'':<40}{'p50 ms':>10}{'p95 ms':>10}{'KiB':>10}{'gzip KiB':>10}")
+    for label, url in URLS.items():
+        for encoding, headers in (("json", {}), ("columnar", {"Accept": columnar.MIMETYPE})):
+            latencies = []
+            for _ in range(args.requests):
+                t0 = time.perf_counter()
+                rv = client.get(url, headers=headers)
+                body = rv.data
+                latencies.append(time.perf_counter() - t0)
+                assert rv.status_code == 200
+            print(f"{label + ', ' + encoding:<40}{percentile(latencies, 50) * 1000:>10.1f}"
+                  f"{percentile(latencies, 95) * 1000:>10.1f}{len(body) // 1024:>10}{len(gzip.compress(body)) // 1024:>10}")
+    app.extensions["password_hasher"].close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Route query latency against road graph size, on synthetic square street
+# grids (0.001 degree blocks, ~15% of streets missing, mixed speeds, a fifth
+# one-way). For each size: graph build time, A* straight on the graph, and
+# GET /profiles/routes with a cold and a warm route cache.
+#
+#   python -m benchmarks.bench_routing [--sizes 10000,100000,1000000] [--landmarks 8]
+import argparse
+import random
+import time
+import numpy as np
+import routing
+from benchmarks.common import make_app, print_table, run_requests, summarize, temp_db_path
+
+ORIGIN = (21.0, -158.0)
+
+
+def grid_network(nodes, seed=0):
+    # (lat, lng, src, dst, speed_kmh) arrays for routing.build_graph
+    side = int(round(nodes ** 0.5))
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(side * side), side)
+    lat = ORIGIN[0] + rows * 0.001 + rng.uniform(-2e-4, 2e-4, side * side)
+    lng = ORIGIN[1] + cols * 0.001 + rng.uniform(-2e-4, 2e-4, side * side)
+    index = np.arange(side * side).reshape(side, side)
+    a = np.concatenate((index[:, :-1].ravel(), index[:-1, :].ravel()))
+    b = np.concatenate((index[:, 1:].ravel(), index[1:, :].ravel()))
+    keep = rng.random(len(a)) > 0.15
+    a, b = a[keep], b[keep]
+    speed = rng.choice([30.0, 45.0, 65.0, 100.0], len(a), p=[0.6, 0.2, 0.15, 0.05])
+    two_way = rng.random(len(a)) >= 0.2
+    return lat, lng, np.concatenate((a, b[two_way])), np.concatenate((b, a[two_way])), np.concatenate((speed, speed[two_way]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated node counts, e.g. 10000,1000000")
+    parser.add_argument("--landmarks", type=int, default=routing.DEFAULT_LANDMARKS, help="0 for plain A*")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    app = make_app(temp_db_path(), RATE_LIMIT_ENABLED=False)
+    router = app.extensions["router"]
+    for size in (int(s) for s in args.sizes.split(",")):
+        started = time.perf_counter()
+        graph = routing.build_graph(*grid_network(size), landmarks=args.landmarks)
+        built = time.perf_counter() - started
+        router.set_graph(graph)
+        rng = random.Random(size)
+
+        def point():
+            node = rng.randrange(graph.node_count)
+            return f"{graph.lat[node]},{graph.lng[node]}"
+
+        pairs = [(point(), point()) for _ in range(args.requests)]
+        warm = pairs[:10]
+
+        def direct(client, i):
+            source, target = rng.randrange(graph.node_count), rng.randrange(graph.node_count)
+            graph.shortest_path(source, target)
+
+        def cold(client, i):
+            rv = client.get(f"/profiles/routes?from={pairs[i][0]}&to={pairs[i][1]}")
+            assert rv.status_code == 200, rv.get_data(as_text=True)
+
+        def cached(client, i):
+            rv = client.get(f"/profiles/routes?from={warm[i % 10][0]}&to={warm[i % 10][1]}")
+            assert rv.status_code == 200
+
+        rows = []
+        for label, make_request in (("A* on the graph", direct), ("/routes, cold cache", cold), ("/routes, cached", cached)):
+            latencies, elapsed = run_requests(app, make_request, args.requests, args.threads)
+            rows.append((label, summarize(latencies, elapsed)))
+        print(f"\n{graph.node_count:,} nodes, {graph.edge_count:,} edges, {args.landmarks} landmarks, built in {built:.1f}s")
+        print_table(rows)
+    app.extensions["password_hasher"].close()
+
+
+if __name__ == "__main__":
+    main()
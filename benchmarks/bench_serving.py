@@ -0,0 +1,32 @@
+# The same HTTP load against the threaded werkzeug server and against
+# uvicorn serving asgi.py, at increasing client counts. Needs uvicorn.
+#
+#   python -m benchmarks.bench_serving [--users 10000] [--clients 8,64,256] [--seconds 15]
+import argparse
+from benchmarks.common import print_table
+from benchmarks.load_http import run
+
+MIX = "get=50,update_location=25,list=10,map=10,admin=5"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--clients", default="8,64,256")
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--threads", type=int, default=32, help="ASGI request threads")
+    parser.add_argument("--mix", default=MIX, help="logins and registrations are left out by default")
+    args = parser.parse_args()
+
+    rows = []
+    for clients in (int(c) for c in args.clients.split(",")):
+        for server in ("wsgi", "asgi"):
+            results, failed = run(args.users, clients, args.seconds, mix=args.mix, server_kind=server, threads=args.threads)
+            rows.append((f"{server}, {clients} clients", results["total"]))
+            if failed:
+                print(f"{server}, {clients} clients: unexpected responses {failed}")
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Render time and allocations for the HTML pages that list every user:
+# /profiles/admin (one table row per user) and /profiles/map with a viewport
+# covering every user (all inlined as JSON). Allocations are the tracemalloc
+# peak for one request, measured separately from the timed runs.
+#
+#   python -m benchmarks.bench_templates [--users 10000] [--requests 50]
+import argparse
+import sqlite3
+import time
+import tracemalloc
+from benchmarks.common import BENCH_PASSWORD, make_app, percentile, seed_profiles, temp_db_path
+
+PAGES = {
+    "/profiles/admin": "/profiles/admin",
+    "/profiles/map (all users)": "/profiles/map?bbox=-159,20,-156,23",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    ids = seed_profiles(db_path, args.users)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE user_profiles SET is_admin = 1 WHERE id = ?", (ids[0],))
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    rv = client.post("/profiles/login", json={"username": f"user{ids[0]}", "password": BENCH_PASSWORD})
+    assert rv.status_code == 200
+
+    print(f"{'':<28}{'p50 ms':>10}{'p95 ms':>10}{'KiB':>10}{'peak KiB':>10}")
+    for label, url in PAGES.items():
+        client.get(url)  # compile the template outside the measurements
+        latencies = []
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            rv = client.get(url)
+            latencies.append(time.perf_counter() - t0)
+            assert rv.status_code == 200
+        size = len(rv.data) // 1024
+
+        tracemalloc.start()
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<28}{percentile(latencies, 50) * 1000:>10.1f}{percentile(latencies, 95) * 1000:>10.1f}{size:>10}{peak // 1024:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Shared helpers for the benchmark scripts. Run them from the repository
+# root as modules, e.g. `python -m benchmarks.bench_db_pool`.
+import json
+import os
+import platform
+import random
+import subprocess
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from werkzeug.security import generate_password_hash
+from app import create_app
+
+BENCH_PASSWORD = "bench-password"
+
+
+def temp_db_path(name="bench.db"):
+    return os.path.join(tempfile.mkdtemp(prefix="groupnav-bench-"), name)
+
+
+def make_app(db_path, **config):
+    # benchmark clients all come from one address, so rate limits are off
+    return create_app({"DATABASE": db_path, "RATE_LIMIT_ENABLED": False, **config})
+
+
+def seed_profiles(db_path, count, center=(21.3069, -157.8583), spread_deg=1.0, seed=0, chunk=10000):
+    # synthetic users scattered around `center`; all share one password hash
+    # so seeding a million rows does not spend minutes hashing
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    created_at = datetime.utcnow().isoformat()
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM user_profiles")
+    start = cur.fetchone()[0] + 1
+    for offset in range(0, count, chunk):
+        rows = []
+        for i in range(start + offset, start + min(offset + chunk, count)):
+            rows.append((
+                f"user{i}", f"user{i}@example.com", password_hash, f"User {i}", "car",
+                center[0] + rng.uniform(-spread_deg, spread_deg),
+                center[1] + rng.uniform(-spread_deg, spread_deg),
+                created_at,
+            ))
+        cur.executemany(
+            "INSERT INTO user_profiles (username, email, password_hash, full_name, vehicle_type, latitude, longitude, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+    conn.close()
+    return list(range(start, start + count))
+
+
+def session_cookie(app, user_id):
+    # signed session cookie value for `user_id`, so benchmark clients can act
+    # as a user without paying for a password check on every login
+    return app.session_interface.get_signing_serializer(app).dumps({"user_id": user_id})
+
+
+def run_requests(app, make_request, requests, threads=1, setup=None):
+    # Issue `requests` calls of make_request(client, i) spread over `threads`
+    # worker threads, each with its own test client; setup(client, thread)
+    # runs untimed first. Returns (latencies, elapsed).
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(thread, indices):
+        client = app.test_client()
+        if setup:
+            setup(client, thread)
+        local = []
+        for i in indices:
+            t0 = time.perf_counter()
+            make_request(client, i)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(t, range(t, requests, threads))) for t in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return latencies, time.perf_counter() - t0
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    return {
+        "requests": len(latencies),
+        "req_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def print_table(rows):
+    # rows: list of (label, summary dict)
+    print(f"{'':<28}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, s in rows:
+        print(f"{label:<28}{s['req_per_sec']:>10}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_baseline(path, results, params):
+    # results: {label: summary dict}; saved with enough context to tell
+    # whether two runs are comparable
+    with open(path, "w") as f:
+        json.dump({
+            "commit": _git_commit(),
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} cpu",
+            "params": params,
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare_baseline(path, results, tolerance=0.2):
+    # Print current vs baseline p95 and req/s per label; returns the labels
+    # whose p95 grew or whose throughput fell by more than `tolerance`.
+    with open(path) as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {path} (commit {baseline.get('commit')}, {baseline.get('machine')})")
+    print(f"{'':<28}{'p95 ms':>10}{'was':>10}{'req/s':>10}{'was':>10}")
+    regressions = []
+    for label, s in results.items():
+        old = baseline["results"].get(label)
+        if old is None:
+            print(f"{label:<28}{s['p95_ms']:>10}{'-':>10}{s['req_per_sec']:>10}{'-':>10}")
+            continue
+        slower = s["p95_ms"] > old["p95_ms"] * (1 + tolerance)
+        fewer = s["req_per_sec"] < old["req_per_sec"] * (1 - tolerance)
+        flag = "  REGRESSION" if slower or fewer else ""
+        print(f"{label:<28}{s['p95_ms']:>10}{old['p95_ms']:>10}{s['req_per_sec']:>10}{old['req_per_sec']:>10}{flag}")
+        if flag:
+            regressions.append(label)
+    return regressions
@@ -0,0 +1,196 @@
+# Multi-client HTTP load generator. Serves the app from a threaded werkzeug
+# server (or uvicorn with --server asgi) in a child process and drives it
+# with --clients keep-alive connections, each logged in as its own driver
+# and issuing a weighted mix of requests for --seconds. Reports per-endpoint
+# p50/p95/p99 and req/s.
+#
+#   python -m benchmarks.load_http [--users 10000] [--clients 32] [--seconds 20]
+#   python -m benchmarks.load_http --mix get=80,update_location=20 --out load.json
+#   python -m benchmarks.load_http --server asgi --compare load.json
+import argparse
+import http.client
+import json
+import multiprocessing
+import random
+import sqlite3
+import sys
+import threading
+import time
+from werkzeug.serving import WSGIRequestHandler, make_server
+from app import shutdown
+from benchmarks.common import (
+    BENCH_PASSWORD, compare_baseline, make_app, print_table, seed_profiles, session_cookie, summarize, temp_db_path,
+    write_baseline,
+)
+
+CENTER = (21.3069, -157.8583)
+DEFAULT_MIX = "get=45,update_location=25,list=10,map=10,admin=4,login=3,register=3"
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args):
+        pass
+
+
+def _serve(db_path, ports, stop, server_kind="wsgi", threads=32):
+    # not a daemon process: the app starts its own password hashing pool
+    app = make_app(db_path)
+    if server_kind == "asgi":
+        import socket
+        import uvicorn
+        from asgi import AsgiAdapter
+
+        # an explicit IPPROTO_TCP, or asyncio leaves Nagle on for accepted sockets
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        sock.bind(("127.0.0.1", 0))
+        server = uvicorn.Server(uvicorn.Config(AsgiAdapter(app, threads), lifespan="on", log_level="warning"))
+        thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        ports.put(sock.getsockname()[1])
+        stop.wait()
+        server.should_exit = True
+        thread.join()
+    else:
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=_QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ports.put(server.server_port)
+        stop.wait()
+        server.shutdown()
+        shutdown(app)
+
+
+def _requests(ids, client, rng):
+    # name -> () -> (method, path, body, expected status)
+    driver = ids[1 + client % (len(ids) - 1)]
+    counter = iter(range(sys.maxsize))
+
+    def bbox():
+        lat, lng = CENTER[0] + rng.uniform(-0.5, 0.5), CENTER[1] + rng.uniform(-0.5, 0.5)
+        return f"{lng - 0.025},{lat - 0.025},{lng + 0.025},{lat + 0.025}"
+
+    def register():
+        name = f"load{client}x{next(counter)}"
+        return "POST", "/profiles/register", {"username": name, "email": f"{name}@example.com", "password": BENCH_PASSWORD}, 201
+
+    return {
+        "get": lambda: ("GET", f"/profiles/{rng.choice(ids)}", None, 200),
+        "update_location": lambda: ("PUT", f"/profiles/{driver}", {
+            "latitude": CENTER[0] + rng.uniform(-1, 1), "longitude": CENTER[1] + rng.uniform(-1, 1)}, 200),
+        "list": lambda: ("GET", f"/profiles/?after={rng.choice(ids)}&limit=100", None, 200),
+        "map": lambda: ("GET", f"/profiles/map?bbox={bbox()}", None, 200),
+        "admin": lambda: ("GET", "/profiles/admin", None, 200),
+        "login": lambda: ("POST", "/profiles/login", {"username": f"user{rng.choice(ids)}", "password": BENCH_PASSWORD}, 200),
+        "register": register,
+    }, driver
+
+
+def run(users=10000, clients=32, seconds=20.0, think=0.0, mix=DEFAULT_MIX, server_kind="wsgi", threads=32):
+    # returns ({name: summary, "total": summary}, {name: unexpected responses})
+    mix = {name: float(weight) for name, weight in (item.split("=") for item in mix.split(","))}
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    ids = seed_profiles(db_path, users, center=CENTER)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE user_profiles SET is_admin = 1 WHERE id = ?", (ids[0],))
+    conn.commit()
+    conn.close()
+    cookie_name = app.config["SESSION_COOKIE_NAME"]
+
+    ctx = multiprocessing.get_context("spawn")
+    ports, stop = ctx.Queue(), ctx.Event()
+    server = ctx.Process(target=_serve, args=(db_path, ports, stop, server_kind, threads))
+    server.start()
+    port = ports.get(timeout=60)
+
+    latencies = {name: [] for name in mix}
+    errors = {name: 0 for name in mix}
+    lock = threading.Lock()
+    start = threading.Barrier(clients + 1)
+
+    def client(index):
+        rng = random.Random(index)
+        requests, driver = _requests(ids, index, rng)
+        names, weights = list(mix), list(mix.values())
+        cookies = {
+            name: f"{cookie_name}={session_cookie(app, ids[0] if name == 'admin' else driver)}" for name in names
+        }
+        local = {name: [] for name in names}
+        failed = {name: 0 for name in names}
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        start.wait()
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            method, path, body, expected = requests[name]()
+            headers = {"Cookie": cookies[name]}
+            if body is not None:
+                body = json.dumps(body)
+                headers["Content-Type"] = "application/json"
+            t0 = time.perf_counter()
+            try:
+                conn.request(method, path, body, headers)
+                rv = conn.getresponse()
+                rv.read()
+                ok = rv.status == expected
+            except (OSError, http.client.HTTPException):
+                conn.close()  # reconnects on the next request
+                ok = False
+            local[name].append(time.perf_counter() - t0)
+            if not ok:
+                failed[name] += 1
+            if think:
+                time.sleep(think)
+        conn.close()
+        with lock:
+            for name in names:
+                latencies[name].extend(local[name])
+                errors[name] += failed[name]
+
+    workers = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in workers:
+        t.start()
+    deadline = time.perf_counter() + seconds
+    t0 = time.perf_counter()
+    start.wait()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    server.join()
+    app.extensions["password_hasher"].close()
+
+    results = {name: summarize(values, elapsed) for name, values in latencies.items() if values}
+    results["total"] = summarize([v for values in latencies.values() for v in values], elapsed)
+    return results, {name: count for name, count in errors.items() if count}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--think", type=float, default=0.0, help="seconds each client waits between requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated name=weight")
+    parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi", help="threaded werkzeug or uvicorn + asgi.py")
+    parser.add_argument("--threads", type=int, default=32, help="ASGI request threads")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with a JSON file written by --out")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results, failed = run(args.users, args.clients, args.seconds, args.think, args.mix, args.server, args.threads)
+    print(f"{args.clients} clients, {args.users:,} users, {args.server}")
+    print_table(list(results.items()))
+    if failed:
+        print("unexpected responses: " + ", ".join(f"{name} {count}" for name, count in failed.items()))
+
+    params = {k: getattr(args, k) for k in ("users", "clients", "seconds", "think", "mix", "server", "threads")}
+    if args.out:
+        write_baseline(args.out, results, params)
+    if args.compare and compare_baseline(args.compare, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Load test for the live location hub: simulates thousands of moving clients,
+# each publishing position fixes and subscribed to a viewport around itself.
+#
+#   python -m benchmarks.load_realtime [--clients 2000] [--rate 1.0] [--seconds 10]
+#
+# Publishers run in a few threads (each driving many simulated clients) and
+# consumer threads drain the subscriber mailboxes, as the SSE streams would.
+import argparse
+import random
+import threading
+import time
+from benchmarks.common import percentile
+from realtime import LocationHub
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=1.0, help="position fixes per client per second")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--viewport-deg", type=float, default=0.2)
+    parser.add_argument("--spread-deg", type=float, default=1.0)
+    parser.add_argument("--publishers", type=int, default=4)
+    parser.add_argument("--consumers", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    hub = LocationHub()
+    positions = [[21.3 + rng.uniform(-args.spread_deg, args.spread_deg),
+                  -157.8 + rng.uniform(-args.spread_deg, args.spread_deg)] for _ in range(args.clients)]
+    half = args.viewport_deg / 2
+    subscribers = [hub.subscribe((lng - half, lat - half, lng + half, lat + half)) for lat, lng in positions]
+
+    stop = threading.Event()
+    latencies = []
+    latency_lock = threading.Lock()
+
+    def publisher(indices):
+        local_rng = random.Random(indices[0] if indices else 0)
+        interval = 1.0 / args.rate
+        next_tick = time.perf_counter()
+        while not stop.is_set():
+            for i in indices:
+                pos = positions[i]
+                pos[0] += local_rng.uniform(-0.0005, 0.0005)
+                pos[1] += local_rng.uniform(-0.0005, 0.0005)
+                hub.publish(i, pos[0], pos[1], username=f"driver{i}")
+            next_tick += interval
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+
+    def consumer(subs):
+        local = []
+        while not stop.is_set():
+            for sub in subs:
+                now = time.time()
+                local.extend(now - e["ts"] for e in sub.drain(0))
+            time.sleep(0.01)
+        with latency_lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=publisher, args=(list(range(p, args.clients, args.publishers)),))
+               for p in range(args.publishers)]
+    threads += [threading.Thread(target=consumer, args=(subscribers[c::args.consumers],))
+                for c in range(args.consumers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    stats = hub.stats()
+    print(f"clients              {args.clients}")
+    print(f"published/s          {stats['published'] / elapsed:,.0f} (target {args.clients * args.rate:,.0f})")
+    print(f"deliveries/s         {stats['delivered'] / elapsed:,.0f}")
+    print(f"coalesced            {stats['coalesced']:,}")
+    print(f"delivery p50 / p99   {percentile(latencies, 50) * 1000:.1f} ms / {percentile(latencies, 99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
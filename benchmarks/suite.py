@@ -0,0 +1,135 @@
+# Latency and throughput of the main profiles endpoints (login, register,
+# list, get, update-location, map, a 10-member group's map and admin) on
+# synthetic datasets of several sizes. Results can be saved as a JSON baseline and later runs
+# compared against it, e.g. before and after a change:
+#
+#   python -m benchmarks.suite --sizes 1000,100000 --out baseline.json
+#   python -m benchmarks.suite --sizes 1000,100000 --compare baseline.json
+#
+# Exits with status 1 when --compare finds a scenario whose p95 grew, or whose
+# req/s fell, by more than --tolerance.
+import argparse
+import random
+import sqlite3
+import sys
+import groups
+from benchmarks.common import (
+    BENCH_PASSWORD, compare_baseline, make_app, print_table, run_requests, seed_profiles, summarize, temp_db_path,
+    write_baseline,
+)
+
+CENTER = (21.3069, -157.8583)
+VIEWPORT_DEG = 0.05
+GROUP_SIZE = 10
+
+
+def _login_as(user_id):
+    def setup(client, thread):
+        with client.session_transaction() as sess:
+            sess["user_id"] = user_id(thread)
+    return setup
+
+
+def scenarios(ids, size, group_id):
+    # name -> (setup, make_request, slow); slow scenarios hash a password per
+    # request and run --slow-requests times instead of --requests
+    rng = random.Random(size)
+    admin = ids[0]
+    west, south = CENTER[1] - VIEWPORT_DEG / 2, CENTER[0] - VIEWPORT_DEG / 2
+    bbox = f"{west},{south},{west + VIEWPORT_DEG},{south + VIEWPORT_DEG}"
+
+    def check(rv, status=200):
+        rv.get_data()  # drain streamed bodies so the whole response is timed
+        assert rv.status_code == status, (rv.status_code, rv.get_data(as_text=True)[:200])
+
+    def login(client, i):
+        check(client.post("/profiles/login", json={"username": f"user{ids[i % len(ids)]}", "password": BENCH_PASSWORD}))
+
+    def register(client, i):
+        name = f"new{size}x{i}"
+        check(client.post("/profiles/register", json={"username": name, "email": f"{name}@example.com", "password": BENCH_PASSWORD}), 201)
+
+    def list_page(client, i):
+        check(client.get(f"/profiles/?after={rng.choice(ids)}&limit=100"))
+
+    def get(client, i):
+        check(client.get(f"/profiles/{rng.choice(ids)}"))
+
+    def update_location(client, i):
+        with client.session_transaction() as sess:
+            user_id = sess["user_id"]
+        position = {"latitude": CENTER[0] + rng.uniform(-1, 1), "longitude": CENTER[1] + rng.uniform(-1, 1)}
+        check(client.put(f"/profiles/{user_id}", json=position))
+
+    def show_map(client, i):
+        check(client.get(f"/profiles/map?bbox={bbox}"))
+
+    def group_locations(client, i):
+        check(client.get(f"/profiles/groups/{group_id}/locations"))
+
+    def admin_page(client, i):
+        check(client.get("/profiles/admin"))
+
+    as_driver = _login_as(lambda thread: ids[1 + thread % (len(ids) - 1)])
+    return {
+        "login": (None, login, True),
+        "register": (None, register, True),
+        "list": (None, list_page, False),
+        "get": (None, get, False),
+        "update_location": (as_driver, update_location, False),
+        "map": (as_driver, show_map, False),
+        "group": (_login_as(lambda thread: ids[1]), group_locations, False),
+        "admin": (_login_as(lambda thread: admin), admin_page, False),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated user counts, e.g. 1000,1000000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--slow-requests", type=int, default=40, help="requests for login and register")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with a JSON file written by --out")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    for size in sizes:
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        ids = seed_profiles(db_path, size, center=CENTER)
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE user_profiles SET is_admin = 1 WHERE id = ?", (ids[0],))
+        group_id = groups.create_group(conn, "convoy", ids[1], "2024-01-01T00:00:00")
+        for member in ids[2:GROUP_SIZE + 1]:
+            groups.add_member(conn, group_id, member, joined_at="2024-01-01T00:00:00")
+        conn.commit()
+        conn.close()
+        app.extensions["password_hasher"].hash("warm up")  # start the pool outside the measurement
+
+        rows = []
+        for name, (setup, make_request, slow) in scenarios(ids, size, group_id).items():
+            if only and name not in only:
+                continue
+            requests = args.slow_requests if slow else args.requests
+            latencies, elapsed = run_requests(app, make_request, requests, args.threads, setup=setup)
+            summary = summarize(latencies, elapsed)
+            results[f"{name} @{size}"] = summary
+            rows.append((name, summary))
+        app.extensions["password_hasher"].close()
+        print(f"\n{size:,} users")
+        print_table(rows)
+
+    params = {"sizes": sizes, "requests": args.requests, "slow_requests": args.slow_requests, "threads": args.threads}
+    if args.out:
+        write_baseline(args.out, results, params)
+    if args.compare and compare_baseline(args.compare, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Versioned change log for map clients. map_changes holds one row per user
+# whose map state (position, username or full name) has ever changed, with
+# the version of the latest change: triggers on user_profiles (see
+# db.init_schema) stamp every such write, from the request handlers, the
+# ingest buffer's flushes and bulk imports alike, with MAX(version) + 1.
+# SQLite has a single writer, so versions become visible in order. A client
+# that has applied everything up to version v asks for rows with version > v
+# (one range scan of idx_map_changes_version) and gets each changed user's
+# current state once, however often they moved in between; the log is
+# compacted by construction and never grows past the number of users.
+#
+# `added` is the version at which the user last appeared on the map (NULL
+# while they are off it), which tells inserted markers from moved ones.
+from groups import in_bbox
+
+NEXT_VERSION = "(SELECT IFNULL(MAX(version), 0) + 1 FROM map_changes)"
+SELECT_VERSION = "SELECT IFNULL(MAX(version), 0) FROM map_changes"
+SELECT_CHANGES = (
+    "SELECT c.version, c.user_id AS id, c.added, p.username, p.full_name, p.latitude, p.longitude "
+    "FROM map_changes AS c LEFT JOIN user_profiles AS p ON p.id = c.user_id "
+    "WHERE c.version > ? ORDER BY c.version LIMIT ?"
+)
+
+
+def current_version(db):
+    cur = db.execute(SELECT_VERSION)
+    version = cur.fetchone()[0]
+    cur.close()
+    return version
+
+
+def changes_since(db, since, limit, overlay=dict, bbox=None):
+    # (inserted, moved, removed, version, more) after version `since`:
+    # inserted and moved are user rows (through `overlay`, e.g. the ingest
+    # buffer's), removed are ids of users now off the map or, given a bbox,
+    # outside it. version is the last one included; more is True when the
+    # page was full and the caller should ask again from there.
+    rows = db.execute(SELECT_CHANGES, (since, limit)).fetchall()
+    inserted, moved, removed = [], [], []
+    for row in rows:
+        user = overlay({key: row[key] for key in ("id", "username", "full_name", "latitude", "longitude")})
+        located = row["added"] is not None and user["latitude"] is not None and user["longitude"] is not None
+        if located and (bbox is None or in_bbox(user, bbox)):
+            (inserted if row["added"] > since else moved).append(user)
+        elif since:
+            # a client starting from scratch has nothing to remove
+            removed.append(row["id"])
+    version = rows[-1]["version"] if rows else since
+    return inserted, moved, removed, version, len(rows) == limit
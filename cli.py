@@ -0,0 +1,263 @@
+# `flask users ...` commands: bulk import/export of user profiles as CSV or
+# NDJSON, plus single-account helpers (these replace the old add_user.py,
+# create_admin.py and set_password.py scripts).
+#
+#   flask --app app users import fleet.csv
+#   flask --app app users export --format ndjson users.ndjson
+#   flask --app app users create admin admin@example.com --admin
+#   flask --app app users set-password ewabeach
+#
+# and `flask routing build`, which compiles an OSM extract into the graph
+# file that ROUTING_GRAPH points at, and `flask history expire`, which drops
+# location history older than LOCATION_HISTORY_DAYS (e.g. from cron).
+import csv
+import json
+import sqlite3
+import time
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+import history
+import repository
+import routing
+from db import connect, drop_secondary_indexes, init_schema
+
+users_cli = AppGroup("users", help="Import, export and manage user profiles.")
+routing_cli = AppGroup("routing", help="Prepare the road graph used for routing.")
+history_cli = AppGroup("history", help="Manage the recorded location history.")
+
+TRUE_VALUES = ("1", "true", "yes", "y")
+
+
+def _format_for(file, fmt):
+    if fmt:
+        return fmt
+    return "ndjson" if file.name.endswith((".ndjson", ".jsonl")) else "csv"
+
+
+def _read_records(source, fmt):
+    if fmt == "csv":
+        yield from csv.DictReader(source)
+    else:
+        for line in source:
+            if line.strip():
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("each line must be a JSON object")
+                yield record
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _optional(value):
+    # CSV has no null: empty cells become NULL
+    return None if value is None or value == "" else value
+
+
+def _coordinate(value, limit):
+    value = _optional(value)
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        value = None
+    # also rules out NaN
+    if value is None or not -limit <= value <= limit:
+        raise ValueError("latitude must be a number in -90..90 and longitude in -180..180")
+    return value
+
+
+def _profile_rows(records, hasher, created_at):
+    # records -> tuples in repository.IMPORT_FIELDS order; plain-text
+    # passwords are hashed in parallel on the password pool
+    rows, to_hash = [], []
+    for record in records:
+        if not record.get("username") or not record.get("email"):
+            raise ValueError("username and email are required")
+        password_hash = _optional(record.get("password_hash"))
+        if password_hash is None and _optional(record.get("password")) is not None:
+            to_hash.append((len(rows), record["password"]))
+        rows.append([
+            record["username"],
+            record["email"],
+            password_hash,
+            _optional(record.get("full_name")),
+            _optional(record.get("vehicle_type")),
+            _coordinate(record.get("latitude"), 90),
+            _coordinate(record.get("longitude"), 180),
+            1 if str(record.get("is_admin", "")).lower() in TRUE_VALUES else 0,
+            _optional(record.get("created_at")) or created_at,
+        ])
+    if to_hash:
+        hashes = hasher.hash_many([password for _, password in to_hash])
+        for (index, _), password_hash in zip(to_hash, hashes):
+            rows[index][2] = password_hash
+    return [tuple(row) for row in rows]
+
+
+def _report(verb, count, started):
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0.0
+    click.echo(f"{verb} {count} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)", err=True)
+
+
+@users_cli.command("import")
+@click.argument("source", type=click.File("r", encoding="utf-8"), default="-")
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), help="Default: from the file extension, else csv.")
+@click.option("--chunk-size", default=5000, show_default=True, help="Rows per transaction.")
+@click.option("--skip-existing", is_flag=True, help="Skip rows whose username or email exists instead of failing.")
+@click.option("--defer-indexes/--no-defer-indexes", default=False, show_default=True,
+              help="Drop secondary indexes during the load and rebuild them once at the end. Faster, but "
+                   "only for loads while the app is not serving: /nearby and the admin pages scan the "
+                   "whole table until the rebuild.")
+def import_users(source, fmt, chunk_size, skip_existing, defer_indexes):
+    """Load profiles from CSV or NDJSON.
+
+    Columns: username, email, password or password_hash, full_name,
+    vehicle_type, latitude, longitude, is_admin, created_at.
+    """
+    fmt = _format_for(source, fmt)
+    hasher = current_app.extensions["password_hasher"]
+    created_at = datetime.utcnow().isoformat()
+    conn = connect(current_app.config)
+    if defer_indexes:
+        drop_secondary_indexes(conn)
+    started = time.perf_counter()
+    read = imported = 0
+    try:
+        for chunk in _chunks(_read_records(source, fmt), chunk_size):
+            rows = _profile_rows(chunk, hasher, created_at)
+            with conn:
+                imported += repository.import_profiles(conn, rows, skip_existing)
+            read += len(chunk)
+    except (ValueError, sqlite3.IntegrityError) as e:
+        # earlier chunks stay committed
+        raise click.ClickException(f"in the chunk starting at row {read + 1}: {e} ({imported} rows imported)")
+    finally:
+        if defer_indexes:
+            init_schema(conn)  # recreates the dropped indexes
+        conn.close()
+    _report("imported", imported, started)
+    if imported < read:
+        click.echo(f"skipped {read - imported} existing rows", err=True)
+
+
+@users_cli.command("export")
+@click.argument("target", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), help="Default: from the file extension, else csv.")
+@click.option("--chunk-size", default=5000, show_default=True, help="Rows fetched per batch.")
+@click.option("--include-password-hash", is_flag=True, help="Also export password hashes, e.g. to migrate accounts.")
+def export_users(target, fmt, chunk_size, include_password_hash):
+    """Stream every profile to CSV or NDJSON."""
+    fmt = _format_for(target, fmt)
+    columns = list(repository.PROFILE_FIELDS) + (["password_hash"] if include_password_hash else [])
+    conn = connect(current_app.config)
+    started = time.perf_counter()
+    exported = 0
+    try:
+        cur = repository.list_profiles(conn, columns, 0, -1)
+        writer = csv.writer(target) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            if writer:
+                writer.writerows(rows)
+            else:
+                target.write("".join(json.dumps(dict(r)) + "\n" for r in rows))
+            exported += len(rows)
+    finally:
+        conn.close()
+    _report("exported", exported, started)
+
+
+@users_cli.command("create")
+@click.argument("username")
+@click.argument("email")
+@click.option("--password", prompt=True, hide_input=True, confirmation_prompt=True)
+@click.option("--full-name")
+@click.option("--vehicle-type")
+@click.option("--admin", is_flag=True, help="Give the account access to /profiles/admin.")
+def create_user(username, email, password, full_name, vehicle_type, admin):
+    """Create one account."""
+    password_hash = current_app.extensions["password_hasher"].hash(password)
+    row = (username, email, password_hash, full_name, vehicle_type, None, None, 1 if admin else 0, datetime.utcnow().isoformat())
+    conn = connect(current_app.config)
+    try:
+        with conn:
+            repository.import_profiles(conn, [row])
+    except sqlite3.IntegrityError:
+        raise click.ClickException("username or email already exists")
+    finally:
+        conn.close()
+    click.echo(f"created {'admin ' if admin else ''}account {username}")
+
+
+@users_cli.command("set-password")
+@click.argument("username")
+@click.option("--password", prompt=True, hide_input=True, confirmation_prompt=True)
+def set_password(username, password):
+    """Replace an account's password."""
+    conn = connect(current_app.config)
+    try:
+        row = repository.get_credentials(conn, username)
+        if row is None:
+            raise click.ClickException(f"no such user: {username}")
+        with conn:
+            repository.set_password_hash(conn, row[0], current_app.extensions["password_hasher"].hash(password))
+    finally:
+        conn.close()
+    click.echo(f"password set for {username}")
+
+
+@routing_cli.command("build")
+@click.argument("extract", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option("--landmarks", default=routing.DEFAULT_LANDMARKS, show_default=True,
+              help="Landmarks for A* bounds; each costs 8 bytes per node and two full searches to build.")
+def build_graph(extract, output, landmarks):
+    """Compile an .osm (.gz, .bz2) extract into an .npz road graph.
+
+    Point ROUTING_GRAPH at the output.
+    """
+    started = time.perf_counter()
+    graph = routing.build_graph(*routing.read_osm(extract), landmarks=landmarks)
+    if not graph.node_count:
+        raise click.ClickException("no drivable roads in the extract")
+    graph.save(output)
+    click.echo(f"{graph.node_count} nodes, {graph.edge_count} edges in {time.perf_counter() - started:.1f}s", err=True)
+
+
+@history_cli.command("expire")
+@click.option("--days", type=click.IntRange(min=1), help="Days of history to keep. Default: LOCATION_HISTORY_DAYS.")
+def expire_history(days):
+    """Drop location history older than --days."""
+    days = days or current_app.config["LOCATION_HISTORY_DAYS"]
+    if not days:
+        raise click.ClickException("pass --days or set LOCATION_HISTORY_DAYS")
+    conn = connect(current_app.config)
+    try:
+        with conn:
+            dropped = history.expire(conn, days)
+    finally:
+        conn.close()
+    click.echo(f"dropped {len(dropped)} days of history", err=True)
+
+
+def init_app(app):
+    app.cli.add_command(users_cli)
+    app.cli.add_command(routing_cli)
+    app.cli.add_command(history_cli)
@@ -0,0 +1,169 @@
+# Server-side marker clustering for the map. For every zoom level up to
+# CLUSTER_MAX_ZOOM the located users are bucketed into a grid of
+# CLUSTER_RADIUS_PX pixel cells in Web Mercator space; each cell keeps a count
+# and coordinate sums, so moving one user is O(zoom levels) and a viewport
+# query only visits the cells on screen.
+#
+# Writes in this process arrive through the location_changed signal. Those
+# it never hears about (other workers, `flask users import`, plain SQL) are
+# caught up from the map change log before each query: a MAX(version) probe,
+# then only the users changed since the index last looked.
+import math
+import threading
+import changelog
+from signals import location_changed
+from spatial import web_mercator
+
+TILE_SIZE = 256
+LOCATED_USERS = (
+    "SELECT id, username, full_name, latitude, longitude FROM user_profiles "
+    "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+)
+# more changes than this since the last query and the index is rebuilt
+REFRESH_LIMIT = 10000
+
+
+def _plottable(lat, lng):
+    # rows written around the API (plain SQL, old imports) can hold anything
+    return (isinstance(lat, (int, float)) and isinstance(lng, (int, float))
+            and -90 <= lat <= 90 and -180 <= lng <= 180)
+
+
+class ClusterIndex:
+    def __init__(self, max_zoom=14, radius_px=60):
+        self.max_zoom = max_zoom
+        self.radius_px = radius_px
+        # per zoom: cell -> [count, sum_lat, sum_lng, sum_id]; while a cell
+        # holds a single user, sum_id is that user's id
+        self._levels = [{} for _ in range(max_zoom + 1)]
+        self._positions = {}
+        self._names = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.loaded = False
+        self.version = 0  # map change log version the index has caught up to
+        self.reloads = 0
+        self.refreshed = 0  # users updated from the change log
+        self.skipped = 0  # positions left off the map as unplottable
+
+    def _scale(self, zoom):
+        return 2 ** zoom * TILE_SIZE / self.radius_px
+
+    def _cell(self, x, y, scale):
+        limit = int(math.ceil(scale)) - 1
+        return min(int(x * scale), limit), min(int(y * scale), limit)
+
+    def _apply(self, user_id, lat, lng, sign):
+        x, y = web_mercator(lat, lng)
+        for zoom, cells in enumerate(self._levels):
+            cell = self._cell(x, y, self._scale(zoom))
+            entry = cells.get(cell)
+            if entry is None:
+                entry = cells[cell] = [0, 0.0, 0.0, 0]
+            entry[0] += sign
+            entry[1] += sign * lat
+            entry[2] += sign * lng
+            entry[3] += sign * user_id
+            if entry[0] == 0:
+                del cells[cell]
+
+    def load(self, db):
+        # read first: changes made while loading are applied again, harmlessly
+        version = changelog.current_version(db)
+        with self._lock:
+            self._levels = [{} for _ in range(self.max_zoom + 1)]
+            self._positions.clear()
+            self._names.clear()
+            for user_id, username, full_name, lat, lng in db.execute(LOCATED_USERS):
+                if not _plottable(lat, lng):
+                    self.skipped += 1
+                    continue
+                self._positions[user_id] = (lat, lng)
+                self._names[user_id] = (username, full_name)
+                self._apply(user_id, lat, lng, 1)
+            self.version = version
+            self.loaded = True
+            self.reloads += 1
+
+    def refresh(self, db, overlay=dict):
+        # catch up with the change log; loads the index on first use
+        with self._refresh_lock:
+            version = changelog.current_version(db)
+            if not self.loaded or version < self.version:
+                # never loaded, or the database was replaced
+                self.load(db)
+                return
+            if version == self.version:
+                return
+            inserted, moved, removed, last, more = changelog.changes_since(db, self.version, REFRESH_LIMIT, overlay)
+            if more:
+                self.load(db)
+                return
+            for user in inserted + moved:
+                self.update(user["id"], user["latitude"], user["longitude"], user["username"], user["full_name"])
+            for user_id in removed:
+                self.update(user_id, None, None)
+            self.refreshed += len(inserted) + len(moved) + len(removed)
+            self.version = last
+
+    def update(self, user_id, latitude, longitude, username=None, full_name=None):
+        with self._lock:
+            if not self.loaded:
+                return  # the first query loads current positions from the database
+            previous = self._positions.pop(user_id, None)
+            if previous is not None:
+                self._apply(user_id, previous[0], previous[1], -1)
+            if latitude is None or longitude is None or not _plottable(latitude, longitude):
+                if latitude is not None and longitude is not None:
+                    self.skipped += 1
+                self._names.pop(user_id, None)
+                return
+            self._positions[user_id] = (latitude, longitude)
+            self._apply(user_id, latitude, longitude, 1)
+            if username is not None or full_name is not None or user_id not in self._names:
+                old = self._names.get(user_id, (None, None))
+                self._names[user_id] = (username or old[0], full_name or old[1])
+
+    def on_location_changed(self, sender, user_id, latitude, longitude, username=None, full_name=None, **fields):
+        self.update(user_id, latitude, longitude, username, full_name)
+
+    def query(self, zoom, bbox):
+        zoom = min(zoom, self.max_zoom)
+        west, south, east, north = bbox
+        scale = self._scale(zoom)
+        x0, y0 = self._cell(*web_mercator(north, west), scale)
+        x1, y1 = self._cell(*web_mercator(south, east), scale)
+        cols = list(range(x0, x1 + 1)) if west <= east else (
+            list(range(x0, self._cell(1.0, 0, scale)[0] + 1)) + list(range(0, x1 + 1))
+        )
+        with self._lock:
+            cells = self._levels[zoom]
+            if len(cols) * (y1 - y0 + 1) > len(cells):
+                # viewport has more cells than are occupied: filter instead
+                wanted = set(cols)
+                entries = [e for (cx, cy), e in cells.items() if cx in wanted and y0 <= cy <= y1]
+            else:
+                entries = [cells[(cx, cy)] for cx in cols for cy in range(y0, y1 + 1) if (cx, cy) in cells]
+            clusters = []
+            for count, sum_lat, sum_lng, sum_id in entries:
+                if count == 1:
+                    username, full_name = self._names.get(sum_id, (None, None))
+                    lat, lng = self._positions[sum_id]
+                    clusters.append({"count": 1, "id": sum_id, "username": username, "full_name": full_name,
+                                     "latitude": lat, "longitude": lng})
+                else:
+                    clusters.append({"count": count, "latitude": sum_lat / count, "longitude": sum_lng / count})
+        return clusters
+
+    def stats(self):
+        return {"users": len(self._positions), "version": self.version, "reloads": self.reloads, "refreshed": self.refreshed,
+                "skipped": self.skipped}
+
+
+def init_app(app):
+    app.config.setdefault("CLUSTER_MAX_ZOOM", 14)
+    app.config.setdefault("CLUSTER_RADIUS_PX", 60)
+    index = ClusterIndex(app.config["CLUSTER_MAX_ZOOM"], app.config["CLUSTER_RADIUS_PX"])
+    app.extensions["cluster_index"] = index
+    location_changed.connect(index.on_location_changed, sender=app)
+    return index
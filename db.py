@@ -1,21 +1,84 @@
 import sqlite3
 import os
+import queue
 from flask import g, current_app
+from changelog import NEXT_VERSION
+from spatial import grid_cell_sql
 
 
-def db_init(app):
-    # default DATABASE config should be provided by app (can be overridden in tests)
-    app.config.setdefault("DATABASE", os.path.join(app.instance_path, "app.db"))
-    # ensure instance folder exists
-    try:
-        os.makedirs(app.instance_path, exist_ok=True)
-    except Exception:
-        pass
+# Applied once to every new connection. WAL lets readers run alongside the
+# single writer; synchronous=NORMAL is durable across application crashes in
+# WAL mode and only fsyncs on checkpoint.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -20000,  # negative means KiB, i.e. ~20 MB per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "foreign_keys": "ON",
+}
 
-    # create table schema if not exists
-    db_path = app.config["DATABASE"]
-    uri = db_path.startswith("file:")
-    conn = sqlite3.connect(db_path, uri=uri)
+
+def connect(config):
+    db_path = config["DATABASE"]
+    # pooled connections are handed between request threads, one at a time
+    conn = sqlite3.connect(
+        db_path,
+        uri=db_path.startswith("file:"),
+        check_same_thread=False,
+        cached_statements=config.get("DATABASE_STATEMENT_CACHE", 256),
+    )
+    conn.row_factory = sqlite3.Row
+    for name, value in config.get("DATABASE_PRAGMAS", DEFAULT_PRAGMAS).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class ConnectionPool:
+    # Keeps up to `size` configured connections open between requests.
+    # Connections are checked out per request; if the pool is empty a new one
+    # is opened, and surplus connections are closed when returned.
+
+    def __init__(self, config, size):
+        self.config = config
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.config)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# Plain b-tree indexes that nothing depends on for correctness; bulk loads
+# drop them and let init_schema() rebuild each one in a single pass.
+SECONDARY_INDEXES = {
+    # the admin listing's sort orders and prefix search
+    "idx_user_profiles_created_at_key": "user_profiles (ifnull(created_at, ''))",
+    "idx_user_profiles_username_lower": "user_profiles (lower(username))",
+    "idx_user_profiles_email_lower": "user_profiles (lower(email))",
+    "idx_location_grid_cell": "location_grid (cell, user_id)",
+}
+
+
+def init_schema(conn):
+    # create or migrate every table, index and trigger; safe to run repeatedly
     cur = conn.cursor()
     cur.execute(
         """
@@ -43,16 +106,186 @@ def db_init(app):
         cur.execute("ALTER TABLE user_profiles ADD COLUMN is_admin INTEGER DEFAULT 0")
     except sqlite3.OperationalError:
         pass  # Column already exists
+    # R*Tree spatial index over user locations (points stored as degenerate boxes)
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_locations'")
+    if not cur.fetchone():
+        cur.execute("CREATE VIRTUAL TABLE user_locations USING rtree(id, min_lat, max_lat, min_lng, max_lng)")
+        # backfill rows that were located before the index existed
+        cur.execute(
+            "INSERT INTO user_locations SELECT id, latitude, latitude, longitude, longitude FROM user_profiles WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+    # keep user_locations in sync with every write to user_profiles
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS user_locations_insert AFTER INSERT ON user_profiles
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO user_locations VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS user_locations_update AFTER UPDATE OF latitude, longitude ON user_profiles
+        BEGIN
+            DELETE FROM user_locations WHERE id = OLD.id;
+            INSERT INTO user_locations SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS user_locations_delete AFTER DELETE ON user_profiles
+        BEGIN
+            DELETE FROM user_locations WHERE id = OLD.id;
+        END
+        """
+    )
+    # uniform grid index for nearest-neighbour queries, same sync scheme
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'location_grid'")
+    if not cur.fetchone():
+        cur.execute("CREATE TABLE location_grid (user_id INTEGER PRIMARY KEY, cell INTEGER NOT NULL)")
+        cur.execute(
+            f"INSERT INTO location_grid SELECT id, {grid_cell_sql('latitude', 'longitude')} FROM user_profiles WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS location_grid_insert AFTER INSERT ON user_profiles
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO location_grid VALUES (NEW.id, {grid_cell_sql('NEW.latitude', 'NEW.longitude')});
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS location_grid_update AFTER UPDATE OF latitude, longitude ON user_profiles
+        BEGIN
+            DELETE FROM location_grid WHERE user_id = OLD.id;
+            INSERT INTO location_grid SELECT NEW.id, {grid_cell_sql('NEW.latitude', 'NEW.longitude')}
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS location_grid_delete AFTER DELETE ON user_profiles
+        BEGIN
+            DELETE FROM location_grid WHERE user_id = OLD.id;
+        END
+        """
+    )
+    # versioned map change log for /profiles/map/changes; see changelog.py
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'map_changes'")
+    if not cur.fetchone():
+        cur.execute("CREATE TABLE map_changes (user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL, added INTEGER)")
+        cur.execute("CREATE UNIQUE INDEX idx_map_changes_version ON map_changes (version)")
+        # users already on the map count as added in id order
+        cur.execute("INSERT INTO map_changes SELECT id, id, id FROM user_profiles WHERE latitude IS NOT NULL AND longitude IS NOT NULL")
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS map_changes_insert AFTER INSERT ON user_profiles
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO map_changes VALUES (NEW.id, {NEXT_VERSION}, {NEXT_VERSION})
+            ON CONFLICT (user_id) DO UPDATE SET version = excluded.version, added = excluded.added;
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS map_changes_update AFTER UPDATE OF latitude, longitude, username, full_name ON user_profiles
+        WHEN (NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL OR OLD.latitude IS NOT NULL AND OLD.longitude IS NOT NULL)
+        AND (NEW.latitude IS NOT OLD.latitude OR NEW.longitude IS NOT OLD.longitude
+             OR NEW.username IS NOT OLD.username OR NEW.full_name IS NOT OLD.full_name)
+        BEGIN
+            INSERT INTO map_changes VALUES (NEW.id, {NEXT_VERSION}, IIF(NEW.latitude IS NULL OR NEW.longitude IS NULL, NULL, {NEXT_VERSION}))
+            ON CONFLICT (user_id) DO UPDATE SET version = excluded.version, added = CASE
+                WHEN NEW.latitude IS NULL OR NEW.longitude IS NULL THEN NULL
+                WHEN OLD.latitude IS NULL OR OLD.longitude IS NULL THEN excluded.version
+                ELSE IFNULL(added, 0)
+            END;
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS map_changes_delete AFTER DELETE ON user_profiles
+        WHEN OLD.latitude IS NOT NULL AND OLD.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO map_changes VALUES (OLD.id, {NEXT_VERSION}, NULL)
+            ON CONFLICT (user_id) DO UPDATE SET version = excluded.version, added = NULL;
+        END
+        """
+    )
+    # groups (convoys); see groups.py for the queries these keys serve
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS groups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            owner_id INTEGER NOT NULL REFERENCES user_profiles (id) ON DELETE CASCADE,
+            created_at TEXT
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS group_members (
+            group_id INTEGER NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL REFERENCES user_profiles (id) ON DELETE CASCADE,
+            role TEXT NOT NULL DEFAULT 'member',
+            joined_at TEXT,
+            PRIMARY KEY (group_id, user_id)
+        ) WITHOUT ROWID
+        """
+    )
+    # a user's groups and role in each, straight from the index; also what
+    # the foreign keys use when a profile is deleted
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members (user_id, group_id, role)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_groups_owner ON groups (owner_id)")
+    # replaced by idx_user_profiles_created_at_key, which holds NULL dates
+    cur.execute("DROP INDEX IF EXISTS idx_user_profiles_created_at")
+    for name, definition in SECONDARY_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+    conn.commit()
+
+
+def drop_secondary_indexes(conn):
+    for name in SECONDARY_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
     conn.commit()
+
+
+def db_init(app):
+    # default DATABASE config should be provided by app (can be overridden in tests)
+    app.config.setdefault("DATABASE", os.path.join(app.instance_path, "app.db"))
+    app.config.setdefault("DATABASE_PRAGMAS", DEFAULT_PRAGMAS)
+    # 0 disables pooling: every request opens and closes its own connection
+    app.config.setdefault("DATABASE_POOL_SIZE", 8)
+    # ensure instance folder exists
+    try:
+        os.makedirs(app.instance_path, exist_ok=True)
+    except Exception:
+        pass
+
+    # create table schema if not exists
+    conn = connect(app.config)
+    init_schema(conn)
     conn.close()
 
+    if app.config["DATABASE_POOL_SIZE"] > 0:
+        app.extensions["db_pool"] = ConnectionPool(app.config, app.config["DATABASE_POOL_SIZE"])
+
 
 def get_db():
     if "db" not in g:
-        db_path = current_app.config["DATABASE"]
-        conn = sqlite3.connect(db_path, uri=db_path.startswith("file:"))
-        conn.row_factory = sqlite3.Row
-        g.db = conn
+        pool = current_app.extensions.get("db_pool")
+        g.db = pool.acquire() if pool else connect(current_app.config)
+        metrics = current_app.extensions.get("metrics")
+        if metrics:
+            g.db = metrics.instrument(g.db)
     return g.db
 
 
@@ -60,4 +293,13 @@ def close_db(e=None):
     db = g.pop("db", None)
 
     if db is not None:
-        db.close()
+        if hasattr(db, "finish"):
+            # instrumented: record statements still open, then hand back the
+            # sqlite3 connection itself
+            db.finish()
+            db = db.wrapped
+        pool = current_app.extensions.get("db_pool")
+        if pool:
+            pool.release(db)
+        else:
+            db.close()
@@ -0,0 +1,146 @@
+# Groups (convoys) of users. group_members is a WITHOUT ROWID table keyed by
+# (group_id, user_id), so every group-scoped query here starts with one
+# primary-key range scan over the group's members and then looks up each
+# member's profile by id: its cost follows the size of the group, not the
+# number of users. idx_group_members_user covers the reverse direction (a
+# user's groups and role in each). Both are created by db.init_schema().
+#
+# Leaders invite; a membership only counts once the user has accepted it
+# (joined_at is set). Until then the invitee's position is neither shown to
+# the group nor writable by its leaders.
+import numpy as np
+from spatial import haversine_km
+
+LEADER = "leader"
+MEMBER = "member"
+ROLES = (LEADER, MEMBER)
+
+INSERT_GROUP = "INSERT INTO groups (name, owner_id, created_at) VALUES (?, ?, ?)"
+SELECT_GROUP = "SELECT id, name, owner_id, created_at FROM groups WHERE id = ?"
+DELETE_GROUP = "DELETE FROM groups WHERE id = ?"
+UPSERT_MEMBER = (
+    "INSERT INTO group_members (group_id, user_id, role, joined_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (group_id, user_id) DO UPDATE SET role = excluded.role"
+)
+DELETE_MEMBER = "DELETE FROM group_members WHERE group_id = ? AND user_id = ?"
+ACCEPT_INVITE = "UPDATE group_members SET joined_at = ? WHERE group_id = ? AND user_id = ? AND joined_at IS NULL"
+DELETE_INVITE = "DELETE FROM group_members WHERE group_id = ? AND user_id = ? AND joined_at IS NULL"
+SELECT_ROLE = "SELECT role FROM group_members WHERE group_id = ? AND user_id = ? AND joined_at IS NOT NULL"
+SELECT_USER_GROUPS = (
+    "SELECT g.id, g.name, g.owner_id, g.created_at, m.role, m.joined_at IS NULL AS invited "
+    "FROM group_members AS m JOIN groups AS g ON g.id = m.group_id "
+    "WHERE m.user_id = ? ORDER BY m.group_id"
+)
+SELECT_MEMBERS = (
+    "SELECT p.id, p.username, p.full_name, p.vehicle_type, p.latitude, p.longitude, m.role, m.joined_at "
+    "FROM group_members AS m JOIN user_profiles AS p ON p.id = m.user_id "
+    "WHERE m.group_id = ? AND m.user_id > ? AND m.joined_at IS NOT NULL ORDER BY m.user_id LIMIT ?"
+)
+SELECT_MEMBER_LOCATIONS = (
+    "SELECT p.id, p.username, p.full_name, p.latitude, p.longitude "
+    "FROM group_members AS m JOIN user_profiles AS p ON p.id = m.user_id "
+    "WHERE m.group_id = ? AND m.joined_at IS NOT NULL"
+)
+# members of any group `user_id` leads, among the given ids
+SELECT_LED_MEMBERS = (
+    "SELECT DISTINCT m.user_id FROM group_members AS l "
+    "JOIN group_members AS m ON m.group_id = l.group_id "
+    "WHERE l.user_id = ? AND l.role = 'leader' AND l.joined_at IS NOT NULL "
+    "AND m.user_id IN ({placeholders}) AND m.joined_at IS NOT NULL"
+)
+
+
+def create_group(db, name, owner_id, created_at):
+    # the owner joins as the first leader; returns the new group id. The
+    # caller commits.
+    group_id = db.execute(INSERT_GROUP, (name, owner_id, created_at)).lastrowid
+    db.execute(UPSERT_MEMBER, (group_id, owner_id, LEADER, created_at))
+    return group_id
+
+
+def get_group(db, group_id):
+    cur = db.execute(SELECT_GROUP, (group_id,))
+    row = cur.fetchone()
+    cur.close()
+    return row
+
+
+def delete_group(db, group_id):
+    # memberships go with it (ON DELETE CASCADE)
+    return db.execute(DELETE_GROUP, (group_id,)).rowcount
+
+
+def add_member(db, group_id, user_id, role=MEMBER, joined_at=None):
+    # invites the user (joined straight away given joined_at), or changes
+    # the role of an existing member or invitee
+    db.execute(UPSERT_MEMBER, (group_id, user_id, role, joined_at))
+
+
+def remove_member(db, group_id, user_id):
+    return db.execute(DELETE_MEMBER, (group_id, user_id)).rowcount
+
+
+def accept_invite(db, group_id, user_id, joined_at):
+    # 1 if the user had a pending invitation, now a membership
+    return db.execute(ACCEPT_INVITE, (joined_at, group_id, user_id)).rowcount
+
+
+def decline_invite(db, group_id, user_id):
+    return db.execute(DELETE_INVITE, (group_id, user_id)).rowcount
+
+
+def get_role(db, group_id, user_id):
+    # "leader", "member", or None for non-members and invitees
+    cur = db.execute(SELECT_ROLE, (group_id, user_id))
+    row = cur.fetchone()
+    cur.close()
+    return row[0] if row else None
+
+
+def user_groups(db, user_id):
+    return db.execute(SELECT_USER_GROUPS, (user_id,)).fetchall()
+
+
+def list_members(db, group_id, after=0, limit=100):
+    # keyset page ordered by user id
+    return db.execute(SELECT_MEMBERS, (group_id, after, limit)).fetchall()
+
+
+def member_locations(db, group_id, overlay=dict):
+    # every member with a known position, passed through `overlay` (e.g. the
+    # ingest buffer's) before the check so pending fixes count
+    rows = (overlay(row) for row in db.execute(SELECT_MEMBER_LOCATIONS, (group_id,)))
+    return [row for row in rows if row["latitude"] is not None and row["longitude"] is not None]
+
+
+def in_bbox(row, bbox):
+    west, south, east, north = bbox
+    if not south <= row["latitude"] <= north:
+        return False
+    if west <= east:
+        return west <= row["longitude"] <= east
+    return row["longitude"] >= west or row["longitude"] <= east  # crosses the antimeridian
+
+
+def nearby_members(members, lat, lng, k=None, radius_km=None, exclude_id=None):
+    # like spatial.nearby_users, over a group's member_locations(): the group
+    # is small, so every member is measured instead of searching the grid
+    members = [m for m in members if m["id"] != exclude_id]
+    if not members:
+        return []
+    distances = haversine_km(lat, lng, np.array([m["latitude"] for m in members]), np.array([m["longitude"] for m in members]))
+    order = np.argsort(distances, kind="stable")
+    if radius_km is not None:
+        order = order[distances[order] <= radius_km]
+    if k is not None:
+        order = order[:k]
+    return [(members[i], float(distances[i])) for i in order]
+
+
+def led_members(db, leader_id, ids):
+    # the subset of `ids` who have joined groups that `leader_id` leads
+    ids = list(ids)
+    if not ids:
+        return set()
+    cur = db.execute(SELECT_LED_MEMBERS.format(placeholders=", ".join("?" for _ in ids)), [leader_id] + ids)
+    return {row[0] for row in cur.fetchall()}
@@ -0,0 +1,117 @@
+# Append-only location history, partitioned into one table per UTC day
+# (location_history_YYYYMMDD). Each partition is a WITHOUT ROWID table keyed
+# by (user_id, ts), so a user's track over a time range is one index range
+# scan per day, and expiring old history is a DROP TABLE per day.
+import math
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+PARTITION_PREFIX = "location_history_"
+CREATE_PARTITION = (
+    "CREATE TABLE IF NOT EXISTS {name} ("
+    "user_id INTEGER NOT NULL, ts REAL NOT NULL, latitude REAL NOT NULL, longitude REAL NOT NULL, "
+    "PRIMARY KEY (user_id, ts)) WITHOUT ROWID"
+)
+INSERT_POINT = "INSERT OR IGNORE INTO {name} (user_id, ts, latitude, longitude) VALUES (?, ?, ?, ?)"
+SELECT_TRACK = "SELECT ts, latitude, longitude FROM {name} WHERE user_id = ? AND ts BETWEEN ? AND ? ORDER BY ts"
+SELECT_PARTITIONS = "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'location_history_%'"
+
+METERS_PER_DEG = math.pi * 6371008.8 / 180
+# fixes are accepted with timestamps from up to MAX_POINT_AGE ago (recorded
+# offline and uploaded later) to MAX_CLOCK_SKEW ahead of the server's clock
+MAX_POINT_AGE = 366 * 24 * 3600
+MAX_CLOCK_SKEW = 24 * 3600
+
+
+def valid_ts(ts, now=None):
+    # False for timestamps outside that window, including inf and NaN
+    now = time.time() if now is None else now
+    return now - MAX_POINT_AGE <= ts <= now + MAX_CLOCK_SKEW
+
+
+def partition_name(ts):
+    return PARTITION_PREFIX + datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%d")
+
+
+def append_points(db, points):
+    # points: iterable of (user_id, ts, latitude, longitude); the caller commits
+    by_partition = {}
+    for point in points:
+        by_partition.setdefault(partition_name(point[1]), []).append(point)
+    for name, rows in by_partition.items():
+        db.execute(CREATE_PARTITION.format(name=name))
+        db.executemany(INSERT_POINT.format(name=name), rows)
+    return sum(len(rows) for rows in by_partition.values())
+
+
+def partitions_between(db, from_ts, to_ts):
+    existing = {row[0] for row in db.execute(SELECT_PARTITIONS)}
+    day = datetime.fromtimestamp(from_ts, timezone.utc).date()
+    last = datetime.fromtimestamp(to_ts, timezone.utc).date()
+    names = []
+    while day <= last:
+        name = PARTITION_PREFIX + day.strftime("%Y%m%d")
+        if name in existing:
+            names.append(name)
+        day += timedelta(days=1)
+    return names
+
+
+def iter_track(db, user_id, from_ts, to_ts):
+    # (ts, latitude, longitude) tuples in time order, read lazily per day
+    for name in partitions_between(db, from_ts, to_ts):
+        cur = db.execute(SELECT_TRACK.format(name=name), (user_id, from_ts, to_ts))
+        for row in cur:
+            yield tuple(row)
+
+
+def drop_partitions_before(db, ts):
+    cutoff = partition_name(ts)
+    dropped = [row[0] for row in db.execute(SELECT_PARTITIONS) if row[0] < cutoff]
+    for name in dropped:
+        db.execute(f"DROP TABLE {name}")
+    return dropped
+
+
+def expire(db, days, now=None):
+    # keep the last `days` days (and today); returns the dropped partitions
+    now = time.time() if now is None else now
+    return drop_partitions_before(db, now - days * 24 * 3600)
+
+
+def simplify(points, tolerance_m):
+    # Douglas-Peucker on an (n, 3) array of (ts, latitude, longitude), using
+    # an equirectangular projection around the track, which is accurate to
+    # well under a metre at the scale of a drive. Returns the kept rows.
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    if n < 3 or tolerance_m <= 0:
+        return points
+    lat0 = math.radians(points[:, 1].mean())
+    xy = np.column_stack((
+        points[:, 2] * METERS_PER_DEG * math.cos(lat0),
+        points[:, 1] * METERS_PER_DEG,
+    ))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = xy[first], xy[last]
+        segment = end - start
+        rel = xy[first + 1:last] - start
+        length = math.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            distances = np.abs(segment[0] * rel[:, 1] - segment[1] * rel[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance_m:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
@@ -0,0 +1,197 @@
+# Write-coalescing buffer for high-frequency location updates. The latest
+# position per user is held in memory and written to SQLite in batched
+# executemany transactions, either every LOCATION_FLUSH_INTERVAL seconds or
+# once LOCATION_FLUSH_MAX_PENDING users are waiting. Positions not yet
+# flushed (at most one interval's worth) are lost if the process dies.
+# Every fix (not just the latest) is also queued for the location history
+# and written in the same transaction. With LOCATION_HISTORY_DAYS set, the
+# flush thread also drops older history days, at most once an hour.
+import atexit
+import threading
+import time
+import history
+from db import connect
+
+FLUSH_LOCATIONS = "UPDATE user_profiles SET latitude = ?, longitude = ? WHERE id = ?"
+EXPIRE_INTERVAL = 3600
+
+
+class LocationBuffer:
+    def __init__(self, config, interval=1.0, max_pending=1000, record_history=True, history_days=None):
+        self.config = config
+        self.interval = interval
+        self.max_pending = max_pending
+        self.record_history = record_history
+        self.history_days = history_days
+        self._next_expiry = 0.0
+        self._pending = {}
+        self._history = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._conn = None
+        # called with {user_id: (latitude, longitude)} after each flush commits
+        self.flush_listeners = []
+        self.updates = 0
+        self.coalesced = 0  # positions overwritten before they reached disk
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.history_rows = 0
+        self.flush_errors = 0
+        self.dropped_points = 0  # history points with unusable timestamps
+        self.expired_partitions = 0  # history days dropped as too old
+
+    def put(self, user_id, latitude, longitude, ts=None):
+        with self._lock:
+            if user_id in self._pending:
+                self.coalesced += 1
+            self._pending[user_id] = (latitude, longitude)
+            if self.record_history:
+                self._history.append((user_id, ts if ts is not None else time.time(), latitude, longitude))
+            self.updates += 1
+            full = len(self._pending) >= self.max_pending or len(self._history) >= self.max_pending
+        self._start()
+        if full:
+            self._wakeup.set()
+
+    def get(self, user_id):
+        # buffered (latitude, longitude), or None if nothing is pending
+        return self._pending.get(user_id)
+
+    def pending(self):
+        # {user_id: (latitude, longitude)} of every position not yet flushed
+        with self._lock:
+            return dict(self._pending)
+
+    def discard(self, user_id):
+        # drop a pending position before the profile is written directly.
+        # Waits out a flush in progress, whose batch may hold the user's
+        # older position, so that the direct write lands after it.
+        with self._flush_lock:
+            with self._lock:
+                self._pending.pop(user_id, None)
+
+    def overlay(self, row):
+        # profile row as a dict with any buffered position applied to the
+        # latitude/longitude columns it has
+        data = dict(row)
+        pending = self.get(data["id"])
+        if pending:
+            for key, value in zip(("latitude", "longitude"), pending):
+                if key in data:
+                    data[key] = value
+        return data
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                points, self._history = self._history, []
+            if not batch and not points:
+                return 0
+            # a point history cannot file would fail every retry of the batch
+            now = time.time()
+            kept = [point for point in points if history.valid_ts(point[1], now)]
+            self.dropped_points += len(points) - len(kept)
+            points = kept
+            try:
+                if self._conn is None:
+                    self._conn = connect(self.config)
+                with self._conn:
+                    self._conn.executemany(
+                        FLUSH_LOCATIONS,
+                        [(lat, lng, user_id) for user_id, (lat, lng) in batch.items()],
+                    )
+                    history.append_points(self._conn, points)
+            except Exception:
+                # put the batch back unless a newer position arrived meanwhile
+                with self._lock:
+                    for user_id, position in batch.items():
+                        self._pending.setdefault(user_id, position)
+                    self._history[:0] = points
+                self.flush_errors += 1
+                raise
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            self.history_rows += len(points)
+            for listener in self.flush_listeners:
+                listener(batch)
+            return len(batch)
+
+    def expire_history(self, now=None):
+        # drop history days past LOCATION_HISTORY_DAYS; returns their names
+        with self._flush_lock:
+            if self._conn is None:
+                self._conn = connect(self.config)
+            with self._conn:
+                dropped = history.expire(self._conn, self.history_days, now)
+            self.expired_partitions += len(dropped)
+            return dropped
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="location-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # counted in flush_errors, retried on the next tick
+            if self.history_days and time.monotonic() >= self._next_expiry:
+                self._next_expiry = time.monotonic() + EXPIRE_INTERVAL
+                try:
+                    self.expire_history()
+                except Exception:
+                    pass  # tried again at the next interval
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "pending_history": len(self._history),
+            "updates": self.updates,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "history_rows": self.history_rows,
+            "flush_errors": self.flush_errors,
+            "dropped_points": self.dropped_points,
+            "expired_partitions": self.expired_partitions,
+        }
+
+
+def init_app(app):
+    app.config.setdefault("LOCATION_BUFFER_ENABLED", False)
+    app.config.setdefault("LOCATION_FLUSH_INTERVAL", 1.0)
+    app.config.setdefault("LOCATION_FLUSH_MAX_PENDING", 1000)
+    app.config.setdefault("LOCATION_HISTORY_ENABLED", True)
+    app.config.setdefault("LOCATION_HISTORY_DAYS", None)  # keep everything
+    if not app.config["LOCATION_BUFFER_ENABLED"]:
+        return None
+    buffer = LocationBuffer(
+        app.config,
+        interval=app.config["LOCATION_FLUSH_INTERVAL"],
+        max_pending=app.config["LOCATION_FLUSH_MAX_PENDING"],
+        record_history=app.config["LOCATION_HISTORY_ENABLED"],
+        history_days=app.config["LOCATION_HISTORY_DAYS"],
+    )
+    app.extensions["location_buffer"] = buffer
+    atexit.register(buffer.close)
+    return buffer
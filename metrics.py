@@ -0,0 +1,282 @@
+# Optional request and SQL instrumentation, exported on /metrics in the
+# Prometheus text format. With METRICS_ENABLED off (the default) nothing is
+# installed and get_db hands out plain connections.
+#
+# Statements are timed from execute until their cursor is exhausted, closed
+# or released with the request's connection, so the time spent stepping
+# through rows counts. Statements slower than SLOW_QUERY_MS are logged with
+# their EXPLAIN QUERY PLAN.
+import bisect
+import re
+import threading
+import time
+from flask import Response, g, request
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OTHER_STATEMENT = "other"
+
+
+def normalize_sql(sql):
+    # one label per statement shape: whitespace collapsed, numbers and
+    # placeholder lists folded
+    sql = " ".join(sql.split())
+    sql = re.sub(r"\b\d+(\.\d+)?\b", "N", sql)
+    return re.sub(r"\?(\s*,\s*\?)+", "?, ...", sql)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _le(bound):
+    return f'le="{bound}"'
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, values, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def __len__(self):
+        return len(self._series)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((values, list(s)) for values, s in self._series.items())
+        for values, s in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, s):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, _le(bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels, values, _le('+Inf'))} {s[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {s[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {s[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, values=(), amount=1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labels, v)} {count}" for v, count in values)
+        return lines
+
+
+class TimedCursor:
+    # wraps a sqlite3 cursor; time and rows accumulate until finish()
+    def __init__(self, cursor, metrics, conn):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._conn = conn
+        self._statement = None
+
+    def _start(self, method, sql, params, many=False):
+        self.finish()
+        self._statement = sql
+        self._params = None if many else params
+        self._rows = 0
+        self._seconds = 0.0
+        self._conn._open.add(self)
+        t0 = time.perf_counter()
+        try:
+            method(sql, params)
+        finally:
+            self._seconds += time.perf_counter() - t0
+        return self
+
+    def execute(self, sql, params=()):
+        return self._start(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq):
+        return self._start(self._cursor.executemany, sql, seq, many=True)
+
+    def _fetch(self, method, *args):
+        t0 = time.perf_counter()
+        result = method(*args)
+        self._seconds += time.perf_counter() - t0
+        return result
+
+    def fetchone(self):
+        row = self._fetch(self._cursor.fetchone)
+        if row is None:
+            self.finish()
+        elif self._statement is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(self._cursor.fetchmany, self._cursor.arraysize if size is None else size)
+        if self._statement is not None:
+            self._rows += len(rows)
+        if not rows:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cursor.fetchall)
+        if self._statement is not None:
+            self._rows += len(rows)
+        self.finish()
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self.finish()
+        self._cursor.close()
+
+    def finish(self):
+        if self._statement is not None:
+            statement, self._statement = self._statement, None
+            self._conn._open.discard(self)
+            self._metrics.record_query(self._conn.wrapped, statement, self._params, self._seconds, self._rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    # wraps the request's sqlite3 connection so every statement is timed
+    def __init__(self, conn, metrics):
+        self.wrapped = conn
+        self._metrics = metrics
+        self._open = set()
+
+    def cursor(self):
+        return TimedCursor(self.wrapped.cursor(), self._metrics, self)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def finish(self):
+        # record statements whose cursors were never read to the end
+        for cursor in list(self._open):
+            cursor.finish()
+
+    def __enter__(self):
+        self.wrapped.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.wrapped.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+
+class Metrics:
+    def __init__(self, logger, slow_query_ms=100.0, max_statements=200):
+        self.logger = logger
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.max_statements = max_statements
+        self._statements = {}  # raw sql -> label, bounded by max_statements
+        self.requests = Histogram("http_request_duration_seconds", "Request latency.", ("endpoint", "method", "status"))
+        self.queries = Histogram("sqlite_query_duration_seconds", "Statement latency, execute through last fetch.", ("statement",))
+        self.rows = Counter("sqlite_rows_returned_total", "Rows fetched per statement.", ("statement",))
+        self.slow_queries = Counter("sqlite_slow_queries_total", "Statements slower than SLOW_QUERY_MS.", ("statement",))
+
+    def instrument(self, conn):
+        return TimedConnection(conn, self)
+
+    def _label(self, sql):
+        label = self._statements.get(sql)
+        if label is None:
+            if len(self._statements) >= self.max_statements:
+                return OTHER_STATEMENT  # bounded even if statements are built dynamically
+            label = self._statements[sql] = normalize_sql(sql)
+        return label
+
+    def record_query(self, conn, sql, params, seconds, rows):
+        label = self._label(sql)
+        self.queries.observe((label,), seconds)
+        if rows:
+            self.rows.inc((label,), rows)
+        if seconds >= self.slow_query_seconds:
+            self.slow_queries.inc((label,))
+            self.logger.warning("slow query (%.1f ms, %d rows): %s\n%s", seconds * 1000, rows, label, self.explain(conn, sql, params))
+
+    def explain(self, conn, sql, params):
+        if params is None or not sql.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")):
+            return "  (no plan)"
+        try:
+            plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        except Exception as e:
+            return f"  (no plan: {e})"
+        return "\n".join(f"  {row[0]:>4} {row[1]:>4} {row[3]}" for row in plan)
+
+    def before_request(self):
+        g.metrics_started = time.perf_counter()
+
+    def after_request(self, response):
+        # streamed bodies are sent after this, so they time to the first byte
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            endpoint = request.endpoint or "unmatched"
+            self.requests.observe((endpoint, request.method, str(response.status_code)), time.perf_counter() - started)
+        return response
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.queries, self.rows, self.slow_queries):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    app.config.setdefault("METRICS_ENABLED", False)
+    app.config.setdefault("SLOW_QUERY_MS", 100.0)
+    app.config.setdefault("METRICS_MAX_STATEMENTS", 200)
+    if not app.config["METRICS_ENABLED"]:
+        return None
+    metrics = Metrics(app.logger, app.config["SLOW_QUERY_MS"], app.config["METRICS_MAX_STATEMENTS"])
+    app.extensions["metrics"] = metrics
+    app.before_request(metrics.before_request)
+    app.after_request(metrics.after_request)
+    app.add_url_rule(
+        "/metrics", "metrics",
+        lambda: Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8"),
+    )
+    return metrics
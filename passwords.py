@@ -0,0 +1,145 @@
+# Password hashing off the request threads. Hashes are deliberately slow, so
+# they run on a small process pool where they cannot hold the GIL or every
+# core. At most PASSWORD_HASH_MAX_PENDING calls may be queued or running;
+# beyond that callers get PasswordHasherBusy (503 + Retry-After) instead of
+# piling up behind the pool.
+import atexit
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def method_prefix(method):
+    # the "<method>:<params>" werkzeug writes in front of the salt, with its
+    # defaults filled in, e.g. "pbkdf2" -> "pbkdf2:sha256:600000"
+    name, *args = method.split(":")
+    if name == "pbkdf2":
+        defaults = ["sha256", str(DEFAULT_PBKDF2_ITERATIONS)]
+    elif name == "scrypt":
+        defaults = [str(2 ** 15), "8", "1"]
+    else:
+        return method
+    return ":".join([name] + args + defaults[len(args):])
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method)
+
+
+def _verify(password_hash, password, method):
+    # (ok, new_hash); new_hash is set when the stored hash used another
+    # method or cost and should be replaced
+    if not password_hash or not check_password_hash(password_hash, password):
+        return False, None
+    if password_hash.split("$", 1)[0] != method_prefix(method):
+        return True, generate_password_hash(password, method)
+    return True, None
+
+
+class PasswordHasher:
+    def __init__(self, method="pbkdf2", workers=2, max_pending=64):
+        # workers=0 hashes inline on the calling thread
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_seconds = 0.0  # queueing + hashing, summed over completed calls
+
+    def hash(self, password):
+        return self._call(_hash, password, self.method)
+
+    def hash_many(self, passwords):
+        # bulk hashing for imports: spread over every worker, no backpressure
+        if not self.workers:
+            return [_hash(password, self.method) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        hashes = list(self._pool().map(_hash, passwords, itertools.repeat(self.method), chunksize=chunksize))
+        with self._lock:
+            self.completed += len(hashes)
+        return hashes
+
+    def verify(self, password_hash, password):
+        ok, new_hash = self._call(_verify, password_hash, password, self.method)
+        if new_hash:
+            self.rehashed += 1
+        return ok, new_hash
+
+    def _call(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        with self._lock:
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        t0 = time.perf_counter()
+        try:
+            if self.workers:
+                return self._pool().submit(fn, *args).result()
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_seconds += time.perf_counter() - t0
+            self._slots.release()
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: forking a process that runs request threads is unsafe
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def stats(self):
+        return {
+            "method": self.method,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_ms": round(self.total_seconds / self.completed * 1000, 3) if self.completed else 0.0,
+        }
+
+
+def init_app(app):
+    # any werkzeug method string, e.g. "pbkdf2:sha256:600000" or "scrypt:32768:8:1";
+    # hashes made with other parameters are upgraded on the next login
+    app.config.setdefault("PASSWORD_HASH_METHOD", "pbkdf2")
+    app.config.setdefault("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+    app.config.setdefault("PASSWORD_HASH_MAX_PENDING", 64)
+    hasher = PasswordHasher(
+        app.config["PASSWORD_HASH_METHOD"],
+        workers=app.config["PASSWORD_HASH_WORKERS"],
+        max_pending=app.config["PASSWORD_HASH_MAX_PENDING"],
+    )
+    app.extensions["password_hasher"] = hasher
+    app.register_error_handler(
+        PasswordHasherBusy,
+        lambda e: ({"error": "too many password checks in progress, retry shortly"}, 503, {"Retry-After": "1"}),
+    )
+    atexit.register(hasher.close)
+    return hasher
@@ -0,0 +1,98 @@
+# Read-through LRU cache of serialized profiles for GET /profiles/<id> and
+# /profiles/me. Entries are dropped by the routes that write profiles, when
+# buffered positions are flushed, and after PROFILE_CACHE_TTL seconds at the
+# latest (which bounds staleness from writers in other processes).
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+import repository
+
+
+def render_profile(data):
+    # (etag, body) for a profile dict
+    body = json.dumps(data, separators=(",", ":"), sort_keys=True).encode()
+    return hashlib.blake2b(body, digest_size=12).hexdigest(), body
+
+
+class ProfileCache:
+    def __init__(self, max_entries=10000, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # id -> (expires, etag, body, data)
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, db, profile_id, overlay=None):
+        # (etag, body, data) for a profile, or None if it does not exist.
+        # `overlay` applies positions not yet written to the database.
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(profile_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(profile_id)
+                self.hits += 1
+            else:
+                if entry is not None:
+                    del self._entries[profile_id]
+                    self.evictions += 1
+                entry = None
+                self.misses += 1
+                generation = self._generation
+
+        if entry is None:
+            row = repository.get_profile(db, profile_id)
+            if row is None:
+                return None
+            data = dict(row)
+            etag, body = render_profile(data)
+            entry = (now + self.ttl, etag, body, data)
+            with self._lock:
+                # skip caching if the profile may have changed while reading
+                if generation == self._generation:
+                    self._entries[profile_id] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+
+        if overlay:
+            data = overlay(entry[3])
+            if data != entry[3]:
+                return render_profile(data) + (data,)
+        return entry[1], entry[2], entry[3]
+
+    def invalidate(self, profile_id):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(profile_id, None) is not None:
+                self.invalidations += 1
+
+    def on_flush(self, batch):
+        # buffered positions reached the database
+        for profile_id in batch:
+            self.invalidate(profile_id)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def init_app(app):
+    app.config.setdefault("PROFILE_CACHE_SIZE", 10000)
+    app.config.setdefault("PROFILE_CACHE_TTL", 60.0)
+    cache = ProfileCache(app.config["PROFILE_CACHE_SIZE"], app.config["PROFILE_CACHE_TTL"])
+    app.extensions["profile_cache"] = cache
+    buffer = app.extensions.get("location_buffer")
+    if buffer:
+        buffer.flush_listeners.append(cache.on_flush)
+    return cache
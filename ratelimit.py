@@ -0,0 +1,153 @@
+# Token-bucket rate limiting for the profiles blueprint. Each rule in
+# RATE_LIMITS allows `count` requests per `seconds` with bursts of up to
+# `count`, per logged-in user or, for anonymous requests, per client IP.
+# Buckets live in process memory by default; set RATE_LIMIT_STORAGE to a
+# SQLite file to share them between worker processes.
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import request, session
+from db import connect
+
+
+def _take(tokens, updated, now, rate, burst, cost):
+    # refill since `updated`, then try to spend `cost`; returns
+    # (allowed, tokens left, seconds until `cost` would be available)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class MemoryStore:
+    # key -> (tokens, updated, full_at) in least recently used order. A bucket
+    # is dropped once it has refilled completely, as a missing bucket is full.
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated, _ = self._buckets.pop(key, (burst, now, now))
+            allowed, tokens, retry_after = _take(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            while self._buckets:
+                oldest = next(iter(self._buckets.values()))
+                if oldest[2] > now and len(self._buckets) <= self.max_keys:
+                    break
+                self._buckets.popitem(last=False)
+        return allowed, tokens, retry_after
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteStore:
+    # Buckets in a table shared by every process using the same file; each
+    # take() is one IMMEDIATE transaction, so concurrent workers serialize.
+    SWEEP_EVERY = 1000
+
+    CREATE_TABLE = (
+        "CREATE TABLE IF NOT EXISTS rate_limits ("
+        "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL) WITHOUT ROWID"
+    )
+    CREATE_INDEX = "CREATE INDEX IF NOT EXISTS idx_rate_limits_full_at ON rate_limits (full_at)"
+    SELECT_BUCKET = "SELECT tokens, updated FROM rate_limits WHERE key = ?"
+    UPSERT_BUCKET = (
+        "INSERT INTO rate_limits (key, tokens, updated, full_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, full_at = excluded.full_at"
+    )
+    DELETE_FULL = "DELETE FROM rate_limits WHERE full_at <= ?"
+
+    def __init__(self, path):
+        self._conn = connect({"DATABASE": path})
+        self._conn.isolation_level = None  # transactions are managed explicitly
+        self._conn.execute(self.CREATE_TABLE)
+        self._conn.execute(self.CREATE_INDEX)
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key, rate, burst, cost=1, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(self.SELECT_BUCKET, (key,)).fetchone()
+                tokens, updated = row if row else (burst, now)
+                allowed, tokens, retry_after = _take(tokens, updated, now, rate, burst, cost)
+                self._conn.execute(self.UPSERT_BUCKET, (key, tokens, now, now + (burst - tokens) / rate))
+                self._calls += 1
+                if self._calls % self.SWEEP_EVERY == 0:
+                    self._conn.execute(self.DELETE_FULL, (now,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return allowed, tokens, retry_after
+
+    def __len__(self):
+        return self._conn.execute("SELECT count(*) FROM rate_limits").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+class RateLimiter:
+    def __init__(self, rules, store):
+        # rules: {"METHOD blueprint.endpoint": (count, seconds)}
+        self.store = store
+        self.rules = {}
+        for rule, (count, seconds) in rules.items():
+            method, endpoint = rule.split(" ", 1)
+            self.rules[(method.upper(), endpoint)] = (count / seconds, count)
+        self.allowed = 0
+        self.limited = 0
+
+    def check(self):
+        # None, or a 429 response for the current request
+        rule = self.rules.get((request.method, request.endpoint))
+        if rule is None:
+            return None
+        rate, burst = rule
+        user_id = session.get("user_id")
+        identity = f"user:{user_id}" if user_id else f"ip:{request.remote_addr}"
+        allowed, _, retry_after = self.store.take(f"{request.method} {request.endpoint} {identity}", rate, burst)
+        if allowed:
+            self.allowed += 1
+            return None
+        self.limited += 1
+        return {"error": "rate limit exceeded"}, 429, {"Retry-After": str(math.ceil(retry_after))}
+
+    def stats(self):
+        return {"allowed": self.allowed, "limited": self.limited, "buckets": len(self.store)}
+
+
+def init_app(app):
+    app.config.setdefault("RATE_LIMIT_ENABLED", True)
+    app.config.setdefault("RATE_LIMITS", {
+        "POST profiles.login": (10, 60),
+        "POST profiles.register": (5, 60),
+        "POST profiles.create_profile": (5, 60),
+        "PUT profiles.update_profile": (5, 1),
+        "POST profiles.batch_locations": (5, 1),
+        "POST profiles.create_group": (5, 60),
+        "GET profiles.get_route": (10, 1),
+        "GET profiles.route_group": (10, 1),
+        "GET profiles.group_meeting_point": (10, 1),
+    })
+    # None keeps buckets in memory (per process); a path shares them via SQLite
+    app.config.setdefault("RATE_LIMIT_STORAGE", None)
+    app.config.setdefault("RATE_LIMIT_MAX_KEYS", 100000)
+    if not app.config["RATE_LIMIT_ENABLED"]:
+        return None
+    if app.config["RATE_LIMIT_STORAGE"]:
+        store = SQLiteStore(app.config["RATE_LIMIT_STORAGE"])
+    else:
+        store = MemoryStore(app.config["RATE_LIMIT_MAX_KEYS"])
+    limiter = RateLimiter(app.config["RATE_LIMITS"], store)
+    app.extensions["rate_limiter"] = limiter
+    return limiter
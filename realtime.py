@@ -0,0 +1,165 @@
+# In-process pub/sub hub for live location updates. Writers publish through
+# the location_changed signal; every open event stream is a Subscriber with a
+# viewport and a mailbox that coalesces updates per user, so a slow client
+# only ever receives the latest position of each driver instead of a backlog.
+import math
+import threading
+import time
+from signals import location_changed
+
+
+class Subscriber:
+    def __init__(self, bbox=None):
+        self.bbox = bbox
+        self.closed = False
+        self.coalesced = 0
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def contains(self, latitude, longitude):
+        if self.bbox is None:
+            return True
+        west, south, east, north = self.bbox
+        if not south <= latitude <= north:
+            return False
+        if west <= east:
+            return west <= longitude <= east
+        return longitude >= west or longitude <= east  # crosses the antimeridian
+
+    def offer(self, event):
+        with self._cond:
+            if event["id"] in self._pending:
+                self.coalesced += 1
+            self._pending[event["id"]] = event
+            self._cond.notify()
+
+    def drain(self, timeout=None):
+        # wait up to `timeout` seconds for events and return all pending ones
+        with self._cond:
+            if not self._pending and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._pending.values())
+            self._pending.clear()
+        return events
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class LocationHub:
+    # Subscribers are bucketed by the coarse grid cells their viewport covers,
+    # so a publish only visits the viewports around the old and new position.
+    # Very large viewports (or none) go to a global list checked every time.
+
+    def __init__(self, cell_deg=0.1, max_cells=2500):
+        self.cell_deg = cell_deg
+        self.max_cells = max_cells
+        # copy-on-write tuples: publishers read them without taking the lock
+        self._cells = {}
+        self._global = ()
+        self._count = 0
+        self._positions = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.coalesced = 0
+
+    def _cell(self, latitude, longitude):
+        return int(math.floor(latitude / self.cell_deg)), int(math.floor(longitude / self.cell_deg))
+
+    def _cells_for(self, bbox):
+        if bbox is None:
+            return None
+        west, south, east, north = bbox
+        lng_ranges = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        rows = range(self._cell(south, 0)[0], self._cell(north, 0)[0] + 1)
+        cols = [c for lo, hi in lng_ranges for c in range(self._cell(0, lo)[1], self._cell(0, hi)[1] + 1)]
+        if len(rows) * len(cols) > self.max_cells:
+            return None
+        return [(r, c) for r in rows for c in cols]
+
+    def subscribe(self, bbox=None):
+        sub = Subscriber(bbox)
+        sub.cells = self._cells_for(bbox)
+        with self._lock:
+            if sub.cells is None:
+                self._global = self._global + (sub,)
+            else:
+                for cell in sub.cells:
+                    self._cells[cell] = self._cells.get(cell, ()) + (sub,)
+            self._count += 1
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.close()
+        with self._lock:
+            if sub.cells is None:
+                self._global = tuple(s for s in self._global if s is not sub)
+            else:
+                for cell in sub.cells:
+                    remaining = tuple(s for s in self._cells.get(cell, ()) if s is not sub)
+                    if remaining:
+                        self._cells[cell] = remaining
+                    else:
+                        self._cells.pop(cell, None)
+            self._count -= 1
+            self.coalesced += sub.coalesced
+
+    def publish(self, user_id, latitude, longitude, **fields):
+        located = latitude is not None and longitude is not None
+        # before any state changes: a bad position raises here and is not kept
+        cell = self._cell(latitude, longitude) if located else None
+        with self._lock:
+            previous = self._positions.get(user_id)
+            if located:
+                self._positions[user_id] = (latitude, longitude)
+            else:
+                self._positions.pop(user_id, None)
+            self.published += 1
+
+        candidates = set(self._global)
+        if located:
+            candidates.update(self._cells.get(cell, ()))
+        if previous is not None:
+            candidates.update(self._cells.get(self._cell(*previous), ()))
+
+        moved = {"type": "move", "id": user_id, "latitude": latitude, "longitude": longitude, "ts": time.time(), **fields}
+        left = {"type": "leave", "id": user_id, "ts": moved["ts"]}
+        delivered = 0
+        for sub in candidates:
+            if located and sub.contains(latitude, longitude):
+                sub.offer(moved)
+            elif previous is not None and sub.contains(*previous):
+                sub.offer(left)  # moved out of this viewport
+            else:
+                continue
+            delivered += 1
+        self.delivered += delivered
+        return delivered
+
+    def close(self):
+        # end every open stream, e.g. on shutdown
+        for sub in set(self._global).union(*self._cells.values()):
+            sub.close()
+
+    def on_location_changed(self, sender, user_id, latitude, longitude, **fields):
+        self.publish(user_id, latitude, longitude, **fields)
+
+    def stats(self):
+        live = set(self._global).union(*self._cells.values())
+        return {
+            "subscribers": self._count,
+            "published": self.published,
+            "delivered": self.delivered,
+            "coalesced": self.coalesced + sum(s.coalesced for s in live),
+        }
+
+
+def init_app(app):
+    app.config.setdefault("STREAM_KEEPALIVE_SECONDS", 15)
+    hub = LocationHub()
+    app.extensions["location_hub"] = hub
+    location_changed.connect(hub.on_location_changed, sender=app)
+    return hub
@@ -0,0 +1,247 @@
+# Named SQL statements for user_profiles. Every statement is a module-level
+# constant, so sqlite3's per-connection statement cache is hit on each call
+# instead of re-preparing inline strings.
+import sqlite3
+import string
+
+# columns that may be exposed through the API (never password_hash)
+PROFILE_FIELDS = ("id", "username", "email", "full_name", "vehicle_type", "latitude", "longitude", "is_admin", "created_at")
+PROFILE_COLUMNS = ", ".join(PROFILE_FIELDS)
+
+# INSERT/UPDATE ... RETURNING needs SQLite 3.35
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+SELECT_PROFILE = f"SELECT {PROFILE_COLUMNS} FROM user_profiles WHERE id = ?"
+SELECT_CREDENTIALS = "SELECT id, password_hash FROM user_profiles WHERE username = ?"
+SELECT_IS_ADMIN = "SELECT is_admin FROM user_profiles WHERE id = ?"
+SELECT_ID_BY_USERNAME = "SELECT id FROM user_profiles WHERE username = ?"
+SELECT_ID_BY_EMAIL = "SELECT id FROM user_profiles WHERE email = ?"
+SELECT_LOCATION = "SELECT latitude, longitude FROM user_profiles WHERE id = ?"
+SELECT_ANY_LOCATION = (
+    "SELECT p.latitude, p.longitude FROM user_locations AS l "
+    "JOIN user_profiles AS p ON p.id = l.id LIMIT 1"
+)
+
+# Admin listing: keyset pages over one indexed sort key (see db_init),
+# optionally filtered by a username or email prefix.
+# created_at is NULL for rows from before it was recorded; as '' they sort
+# last when newest come first, and a cursor can still point at them
+ADMIN_SORT_KEYS = {"created_at": "ifnull(created_at, '')", "id": "id", "username": "lower(username)", "email": "lower(email)"}
+ADMIN_SEARCH_KEYS = {"username": "lower(username)", "email": "lower(email)"}
+# a prefix matching at least this many users is filtered while walking the
+# sort index instead of sorting every match
+ADMIN_SEARCH_PROBE = 1000
+COUNT_PREFIX = "SELECT count(*) FROM (SELECT 1 FROM user_profiles WHERE {key} >= ? AND {key} < ? LIMIT ?)"
+
+# SQLite's lower() only folds ASCII letters
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+INSERT_PROFILE = (
+    "INSERT INTO user_profiles (username, email, password_hash, full_name, vehicle_type, latitude, longitude, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_PROFILE_RETURNING = INSERT_PROFILE + f" RETURNING {PROFILE_COLUMNS}"
+
+# Partial update in one constant statement: each column is only overwritten
+# when its :set_* flag is true, so an explicit null still clears the value.
+UPDATE_PROFILE = (
+    "UPDATE user_profiles SET "
+    "full_name = IIF(:set_full_name, :full_name, full_name), "
+    "vehicle_type = IIF(:set_vehicle_type, :vehicle_type, vehicle_type), "
+    "latitude = IIF(:set_latitude, :latitude, latitude), "
+    "longitude = IIF(:set_longitude, :longitude, longitude) "
+    "WHERE id = :id"
+)
+UPDATE_PROFILE_RETURNING = UPDATE_PROFILE + f" RETURNING {PROFILE_COLUMNS}"
+UPDATABLE_FIELDS = ("full_name", "vehicle_type", "latitude", "longitude")
+
+ADMIN_UPDATE_PROFILE = (
+    "UPDATE user_profiles SET email = ?, full_name = ?, vehicle_type = ?, latitude = ?, longitude = ?, is_admin = ? "
+    "WHERE id = ?"
+)
+DELETE_PROFILE = "DELETE FROM user_profiles WHERE id = ?"
+
+# bulk imports (flask users import) write these columns, in this order
+IMPORT_FIELDS = ("username", "email", "password_hash", "full_name", "vehicle_type", "latitude", "longitude", "is_admin", "created_at")
+IMPORT_PROFILE = (
+    f"INSERT INTO user_profiles ({', '.join(IMPORT_FIELDS)}) "
+    f"VALUES ({', '.join('?' for _ in IMPORT_FIELDS)})"
+)
+IMPORT_PROFILE_OR_IGNORE = IMPORT_PROFILE.replace("INSERT", "INSERT OR IGNORE", 1)
+UPDATE_PASSWORD_HASH = "UPDATE user_profiles SET password_hash = ? WHERE id = ?"
+UPDATE_LOCATION = "UPDATE user_profiles SET latitude = ?, longitude = ? WHERE id = ?"
+SELECT_NAMES = "SELECT id, username, full_name FROM user_profiles WHERE id IN ({placeholders})"
+
+
+def _one(db, sql, params):
+    cur = db.execute(sql, params)
+    row = cur.fetchone()
+    cur.close()
+    return row
+
+
+def get_profile(db, profile_id):
+    return _one(db, SELECT_PROFILE, (profile_id,))
+
+
+def get_credentials(db, username):
+    return _one(db, SELECT_CREDENTIALS, (username,))
+
+
+def is_admin(db, user_id):
+    row = _one(db, SELECT_IS_ADMIN, (user_id,))
+    return bool(row and row[0])
+
+
+def username_exists(db, username):
+    return _one(db, SELECT_ID_BY_USERNAME, (username,)) is not None
+
+
+def get_user_id(db, username):
+    row = _one(db, SELECT_ID_BY_USERNAME, (username,))
+    return row[0] if row else None
+
+
+def email_exists(db, email):
+    return _one(db, SELECT_ID_BY_EMAIL, (email,)) is not None
+
+
+def get_location(db, user_id):
+    return _one(db, SELECT_LOCATION, (user_id,))
+
+
+def any_location(db):
+    return _one(db, SELECT_ANY_LOCATION, ())
+
+
+def insert_profile(db, username, email, password_hash, full_name=None, vehicle_type=None,
+                   latitude=None, longitude=None, created_at=None):
+    # returns the new row; the caller commits
+    params = (username, email, password_hash, full_name, vehicle_type, latitude, longitude, created_at)
+    if HAS_RETURNING:
+        return _one(db, INSERT_PROFILE_RETURNING, params)
+    cur = db.execute(INSERT_PROFILE, params)
+    return get_profile(db, cur.lastrowid)
+
+
+def update_profile(db, profile_id, changes):
+    # apply the UPDATABLE_FIELDS present in `changes`; returns the updated
+    # row, or None if the profile does not exist. The caller commits.
+    params = {"id": profile_id}
+    for field in UPDATABLE_FIELDS:
+        params["set_" + field] = field in changes
+        params[field] = changes.get(field)
+    if HAS_RETURNING:
+        return _one(db, UPDATE_PROFILE_RETURNING, params)
+    cur = db.execute(UPDATE_PROFILE, params)
+    return get_profile(db, profile_id) if cur.rowcount else None
+
+
+def get_names(db, ids):
+    # {id: (id, username, full_name)} for the ids that exist
+    ids = list(ids)
+    if not ids:
+        return {}
+    cur = db.execute(SELECT_NAMES.format(placeholders=", ".join("?" for _ in ids)), ids)
+    return {row[0]: row for row in cur.fetchall()}
+
+
+def update_locations(db, rows):
+    # rows: (latitude, longitude, id), applied in order; the caller commits
+    db.executemany(UPDATE_LOCATION, rows)
+
+
+def list_profiles(db, columns, after, limit):
+    # keyset page ordered by id (limit -1 for every row); `columns` must be
+    # trusted names, i.e. PROFILE_FIELDS for anything served over HTTP
+    return db.execute(
+        f"SELECT {', '.join(columns)} FROM user_profiles WHERE id > ? ORDER BY id LIMIT ?",
+        (after, limit),
+    )
+
+
+def _prefix_range(prefix):
+    # [start, stop) holds exactly the strings beginning with prefix
+    prefix = prefix.translate(_ASCII_LOWER)
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def list_admin_page(db, sort="created_at", descending=True, prefix=None, search="username",
+                    after=None, after_id=None, limit=100):
+    # Cursor over one page ordered by (sort key, id). Rows carry the sort key
+    # as `sort_key`; pass the last row's sort_key and id as after/after_id to
+    # get the next page.
+    key = ADMIN_SORT_KEYS[sort]
+    conditions, params = [], []
+    low = high = None  # (value, inclusive) bounds on the sort key
+    if prefix:
+        search_key = ADMIN_SEARCH_KEYS[search]
+        start, stop = _prefix_range(prefix)
+        if search_key == key:
+            low, high = (start, True), (stop, False)
+        else:
+            if _one(db, COUNT_PREFIX.format(key=search_key), (start, stop, ADMIN_SEARCH_PROBE))[0] >= ADMIN_SEARCH_PROBE:
+                # unary + keeps SQLite from picking the search index
+                search_key = "+" + search_key
+            conditions.append(f"{search_key} >= ? AND {search_key} < ?")
+            params += [start, stop]
+
+    direction = "DESC" if descending else "ASC"
+    beyond = "<" if descending else ">"
+    select = f"SELECT {PROFILE_COLUMNS}, {key} AS sort_key FROM user_profiles"
+    if after_id is not None and sort == "id":
+        conditions.append(f"id {beyond} ?")
+        params.append(after_id)
+    elif after_id is not None:
+        # Rows tied with the cursor's key come first, then rows strictly past
+        # it. Each branch is one index range seek, however many keys tie.
+        tie_conditions, tie_params = _bounded(key, conditions + [f"{key} = ?", f"id {beyond} ?"], params + [after, after_id], low, high)
+        tie = select + _where(tie_conditions) + f" ORDER BY id {direction} LIMIT ?"
+        if descending and (high is None or after <= high[0]):
+            high = (after, False)
+        elif not descending and (low is None or after >= low[0]):
+            low = (after, False)
+        rest_conditions, rest_params = _bounded(key, conditions, params, low, high)
+        rest = select + _where(rest_conditions) + f" ORDER BY {key} {direction}, id {direction} LIMIT ?"
+        return db.execute(
+            f"SELECT * FROM ({tie}) UNION ALL SELECT * FROM ({rest}) ORDER BY sort_key {direction}, id {direction} LIMIT ?",
+            tie_params + [limit] + rest_params + [limit, limit],
+        )
+
+    conditions, params = _bounded(key, conditions, params, low, high)
+    order = f"{key} {direction}" if sort == "id" else f"{key} {direction}, id {direction}"
+    return db.execute(select + _where(conditions) + f" ORDER BY {order} LIMIT ?", params + [limit])
+
+
+def _bounded(key, conditions, params, low, high):
+    conditions, params = list(conditions), list(params)
+    if low:
+        conditions.append(f"{key} {'>=' if low[1] else '>'} ?")
+        params.append(low[0])
+    if high:
+        conditions.append(f"{key} {'<=' if high[1] else '<'} ?")
+        params.append(high[0])
+    return conditions, params
+
+
+def _where(conditions):
+    return f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def admin_update_profile(db, profile_id, email, full_name, vehicle_type, latitude, longitude, is_admin):
+    db.execute(ADMIN_UPDATE_PROFILE, (email, full_name, vehicle_type, latitude, longitude, is_admin, profile_id))
+
+
+def import_profiles(db, rows, skip_existing=False):
+    # rows: tuples in IMPORT_FIELDS order; returns how many were inserted.
+    # The caller commits.
+    cur = db.executemany(IMPORT_PROFILE_OR_IGNORE if skip_existing else IMPORT_PROFILE, rows)
+    return cur.rowcount
+
+
+def set_password_hash(db, profile_id, password_hash):
+    db.execute(UPDATE_PASSWORD_HASH, (password_hash, profile_id))
+
+
+def delete_profile(db, profile_id):
+    return db.execute(DELETE_PROFILE, (profile_id,)).rowcount
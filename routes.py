@@ -1,46 +1,210 @@
-from flask import Blueprint, request, current_app
+from flask import Blueprint, Response, request, current_app, render_template, stream_template, stream_with_context
 from db import get_db
-from datetime import datetime
+from datetime import datetime, timezone
 import folium
 from folium import IFrame
 import json
 from flask import session
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask import redirect
+import repository
+import history
+import changelog
+import columnar
+import groups
+import meeting
+import time
+from signals import location_changed
+from spatial import BBOX_POSITIONS_QUERY, parse_bbox, users_in_bbox, in_bbox, nearby_users, rank_nearby
+from routing import parse_point
 
 profiles_bp = Blueprint("profiles", __name__)
 
+DEFAULT_PAGE_SIZE = 100
+ADMIN_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_ROWS = 256
+MAX_TRACK_SECONDS = 31 * 24 * 3600
+TS_ERROR = "ts must be a unix timestamp within the last year"
+LOCATION_ERROR = "latitude and longitude must be numbers in range"
+MAX_LOCATION_BATCH = 1000
+MAX_GROUP_NAME = 100
+
+
+def _profile_dict(row):
+    # serve positions that are still waiting in the ingest buffer
+    buffer = current_app.extensions.get("location_buffer")
+    return buffer.overlay(row) if buffer else dict(row)
+
+
+def _cached_profile(profile_id):
+    # (etag, body, data) from the profile cache, or None if there is no such profile
+    buffer = current_app.extensions.get("location_buffer")
+    return current_app.extensions["profile_cache"].get(get_db(), profile_id, overlay=buffer.overlay if buffer else None)
+
+
+def _etag_response(etag, body, mimetype="application/json", cache_control="no-cache"):
+    # answer If-None-Match with a bodiless 304
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def _buffered_positions():
+    buffer = current_app.extensions.get("location_buffer")
+    return buffer.pending() if buffer else {}
+
+
+def _merge_buffered(db, rows, pending, keep):
+    # user rows as dicts with buffered positions applied, dropping those that
+    # `keep(latitude, longitude)` now rejects and adding buffered users that
+    # it accepts but the database query could not find
+    users = []
+    seen = set()
+    for row in rows:
+        user = dict(row)
+        seen.add(user["id"])
+        if user["id"] in pending:
+            user["latitude"], user["longitude"] = pending[user["id"]]
+        if keep(user["latitude"], user["longitude"]):
+            users.append(user)
+    moved_in = [uid for uid, position in pending.items() if uid not in seen and keep(*position)]
+    for uid, row in repository.get_names(db, moved_in).items():
+        latitude, longitude = pending[uid]
+        users.append({"id": uid, "username": row[1], "full_name": row[2], "latitude": latitude, "longitude": longitude})
+    return users
+
+
+def _discard_buffered(user_id):
+    # a direct write supersedes any position still waiting to be flushed;
+    # called before the write, which a flush must not overtake
+    buffer = current_app.extensions.get("location_buffer")
+    if buffer:
+        buffer.discard(user_id)
+
+
+def _parse_ts(value):
+    # unix timestamp or ISO 8601 (naive times are UTC) -> float seconds
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def _is_coordinate(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_position(latitude, longitude):
+    # a profile write's latitude/longitude: numbers in range, or None to
+    # clear; raises ValueError
+    if ((latitude is not None and not (_is_coordinate(latitude) and -90 <= latitude <= 90))
+            or (longitude is not None and not (_is_coordinate(longitude) and -180 <= longitude <= 180))):
+        raise ValueError(LOCATION_ERROR)
+
+
+def _parse_location(item):
+    # {"user_id", "latitude", "longitude", "ts"?} or [user_id, latitude, longitude, ts?]
+    # -> (user_id, latitude, longitude, ts); raises ValueError
+    if isinstance(item, dict):
+        item = [item.get("user_id"), item.get("latitude"), item.get("longitude"), item.get("ts")]
+    if not isinstance(item, list) or not 3 <= len(item) <= 4:
+        raise ValueError("expected {user_id, latitude, longitude, ts} or [user_id, latitude, longitude, ts]")
+    user_id, latitude, longitude, ts = (item + [None])[:4]
+    if not isinstance(user_id, int) or isinstance(user_id, bool):
+        raise ValueError("user_id must be an integer")
+    if latitude is None or longitude is None:
+        raise ValueError(LOCATION_ERROR)
+    _check_position(latitude, longitude)
+    if ts is not None and not (_is_coordinate(ts) and history.valid_ts(ts)):
+        raise ValueError(TS_ERROR)
+    return user_id, latitude, longitude, ts
+
+
+def _location_writable(db, user_id, ids):
+    # the subset of `ids` whose position `user_id` may set: their own, and
+    # that of members who have joined a group they lead
+    if repository.is_admin(db, user_id):
+        return set(ids)
+    ids = set(ids)
+    return ({user_id} & ids) | groups.led_members(db, user_id, ids - {user_id})
+
+
+def _wants_columns():
+    # opt-in compact binary locations (see columnar.py)
+    return request.accept_mimetypes.best == columnar.MIMETYPE
+
+
+def _columns_response(payload, headers=None):
+    return Response(payload, mimetype=columnar.MIMETYPE, headers=headers)
+
+
+def _nearby_args():
+    # (k, radius_km) from ?k=&radius_km=, k=10 when neither is given; raises ValueError
+    k = request.args.get("k")
+    radius_km = request.args.get("radius_km")
+    try:
+        k = int(k) if k is not None else None
+        radius_km = float(radius_km) if radius_km is not None else None
+    except ValueError:
+        raise ValueError("invalid k or radius_km")
+    if k is None and radius_km is None:
+        k = 10
+    if k is not None and not 1 <= k <= 1000:
+        raise ValueError("k must be between 1 and 1000")
+    if radius_km is not None and not 0 < radius_km <= 20000:
+        raise ValueError("radius_km must be between 0 and 20000")
+    return k, radius_km
+
+
+def _group_access(group_id, leader=False):
+    # ((user_id, role), None) for a logged-in member of the group, else
+    # (None, error response). Admins act as leaders of every group.
+    user_id = session.get('user_id')
+    if not user_id:
+        return None, ({"error": "not logged in"}, 401)
+    db = get_db()
+    role = groups.get_role(db, group_id, user_id)
+    if role is None:
+        if not groups.get_group(db, group_id):
+            return None, ({"error": "group not found"}, 404)
+        if not repository.is_admin(db, user_id):
+            return None, ({"error": "not a member of this group"}, 403)
+        role = groups.LEADER
+    if leader and role != groups.LEADER:
+        return None, ({"error": "only group leaders can do that"}, 403)
+    return (user_id, role), None
+
+
+def _member_locations(group_id):
+    buffer = current_app.extensions.get("location_buffer")
+    return groups.member_locations(get_db(), group_id, overlay=buffer.overlay if buffer else dict)
+
+
+def _location_changed(user_id, latitude, longitude, **fields):
+    # notify live listeners (the realtime hub, ...) after a committed write
+    location_changed.send(current_app._get_current_object(), user_id=user_id, latitude=latitude, longitude=longitude, **fields)
+
+
+@profiles_bp.before_request
+def _rate_limit():
+    limiter = current_app.extensions.get("rate_limiter")
+    if limiter:
+        return limiter.check()
+
 
 @profiles_bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "GET":
-        return """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Login</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 50px; }
-                .container { max-width: 400px; }
-                a { color: blue; text-decoration: none; }
-                a:hover { text-decoration: underline; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Login</h1>
-                <form action="/profiles/login" method="post">
-                    <label for="username">Username:</label><br>
-                    <input type="text" id="username" name="username" required><br><br>
-                    <label for="password">Password:</label><br>
-                    <input type="password" id="password" name="password" required><br><br>
-                    <button type="submit">Login</button>
-                </form>
-                <p>Don't have an account? <a href="/profiles/register">Create one here</a></p>
-            </div>
-        </body>
-        </html>
-        """
+        return render_template("login.html")
     
     # POST
     if request.is_json:
@@ -53,11 +217,14 @@ def login():
         return {"error": "username and password required"}, 400
     
     db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT id, password_hash FROM user_profiles WHERE username = ?", (username,))
-    row = cur.fetchone()
-    if not row or not check_password_hash(row[1], password):
+    row = repository.get_credentials(db, username)
+    ok, new_hash = current_app.extensions["password_hasher"].verify(row[1], password) if row else (False, None)
+    if not ok:
         return {"error": "invalid credentials"}, 401
+    if new_hash:
+        # stored with an older method or cost
+        repository.set_password_hash(db, row[0], new_hash)
+        db.commit()
     
     session['user_id'] = row[0]
     if request.is_json:
@@ -75,48 +242,7 @@ def logout():
 @profiles_bp.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "GET":
-        return """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Create Account</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 50px; }
-                .container { max-width: 400px; }
-                input { padding: 5px; margin: 5px 0 15px 0; width: 100%; }
-                button { padding: 10px 20px; background-color: #4CAF50; color: white; border: none; cursor: pointer; }
-                button:hover { background-color: #45a049; }
-                .error { color: red; }
-                a { color: blue; text-decoration: none; }
-                a:hover { text-decoration: underline; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Create Account</h1>
-                <form action="/profiles/register" method="post">
-                    <label for="username">Username:</label><br>
-                    <input type="text" id="username" name="username" required><br>
-                    
-                    <label for="email">Email:</label><br>
-                    <input type="email" id="email" name="email" required><br>
-                    
-                    <label for="password">Password:</label><br>
-                    <input type="password" id="password" name="password" required><br>
-                    
-                    <label for="full_name">Full Name (optional):</label><br>
-                    <input type="text" id="full_name" name="full_name"><br>
-                    
-                    <label for="vehicle_type">Vehicle Type (optional):</label><br>
-                    <input type="text" id="vehicle_type" name="vehicle_type" placeholder="e.g., Car, Truck, Motorcycle"><br>
-                    
-                    <button type="submit">Create Account</button>
-                </form>
-                <p>Already have an account? <a href="/profiles/login">Login here</a></p>
-            </div>
-        </body>
-        </html>
-        """
+        return render_template("register.html")
     
     # POST - Register new user
     if request.is_json:
@@ -135,64 +261,36 @@ def register():
         if request.is_json:
             return {"error": "username, email, and password are required"}, 400
         else:
-            return """
-            <!DOCTYPE html>
-            <html>
-            <body>
-                <h1 class="error">Error: username, email, and password are required</h1>
-                <a href="/profiles/register">Go back</a>
-            </body>
-            </html>
-            """, 400
+            return render_template("register_error.html", message="Error: username, email, and password are required"), 400
     
     db = get_db()
-    cur = db.cursor()
     
     # Check if username already exists
-    cur.execute("SELECT id FROM user_profiles WHERE username = ?", (username,))
-    if cur.fetchone():
+    if repository.username_exists(db, username):
         error_msg = "username already exists"
         if request.is_json:
             return {"error": error_msg}, 400
         else:
-            return f"""
-            <!DOCTYPE html>
-            <html>
-            <body>
-                <h1 style="color: red;">{error_msg}</h1>
-                <a href="/profiles/register">Go back</a>
-            </body>
-            </html>
-            """, 400
+            return render_template("register_error.html", message=error_msg), 400
     
     # Check if email already exists
-    cur.execute("SELECT id FROM user_profiles WHERE email = ?", (email,))
-    if cur.fetchone():
+    if repository.email_exists(db, email):
         error_msg = "email already exists"
         if request.is_json:
             return {"error": error_msg}, 400
         else:
-            return f"""
-            <!DOCTYPE html>
-            <html>
-            <body>
-                <h1 style="color: red;">{error_msg}</h1>
-                <a href="/profiles/register">Go back</a>
-            </body>
-            </html>
-            """, 400
+            return render_template("register_error.html", message=error_msg), 400
     
     # Create new user
-    password_hash = generate_password_hash(password)
+    password_hash = current_app.extensions["password_hasher"].hash(password)
     created_at = datetime.utcnow().isoformat()
     
     try:
-        cur.execute(
-            "INSERT INTO user_profiles (username, email, password_hash, full_name, vehicle_type, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-            (username, email, password_hash, full_name, vehicle_type, created_at),
+        row = repository.insert_profile(
+            db, username, email, password_hash, full_name=full_name, vehicle_type=vehicle_type, created_at=created_at
         )
         db.commit()
-        user_id = cur.lastrowid
+        user_id = row["id"]
         
         if request.is_json:
             return {"message": "account created successfully", "user_id": user_id}, 201
@@ -205,15 +303,7 @@ def register():
         if request.is_json:
             return {"error": str(e)}, 500
         else:
-            return f"""
-            <!DOCTYPE html>
-            <html>
-            <body>
-                <h1 style="color: red;">Error creating account: {str(e)}</h1>
-                <a href="/profiles/register">Go back</a>
-            </body>
-            </html>
-            """, 500
+            return render_template("register_error.html", message=f"Error creating account: {e}"), 500
 
 
 @profiles_bp.route("/me")
@@ -222,13 +312,10 @@ def get_me():
     if not user_id:
         return {"error": "not logged in"}, 401
     
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM user_profiles WHERE id = ?", (user_id,))
-    row = cur.fetchone()
-    if not row:
+    profile = _cached_profile(user_id)
+    if not profile:
         return {"error": "user not found"}, 404
-    return dict(row)
+    return _etag_response(profile[0], profile[1], cache_control="private, no-cache")
 
 
 @profiles_bp.route("/", methods=["POST"])
@@ -240,48 +327,98 @@ def create_profile():
 
     if not username or not email or not password:
         return {"error": "username, email, and password are required"}, 400
+    try:
+        _check_position(data.get("latitude"), data.get("longitude"))
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
     db = get_db()
-    cur = db.cursor()
     # simple uniqueness checks
-    cur.execute("SELECT id FROM user_profiles WHERE username = ?", (username,))
-    if cur.fetchone():
+    if repository.username_exists(db, username):
         return {"error": "username already exists"}, 400
-    cur.execute("SELECT id FROM user_profiles WHERE email = ?", (email,))
-    if cur.fetchone():
+    if repository.email_exists(db, email):
         return {"error": "email already exists"}, 400
 
-    password_hash = generate_password_hash(password)
+    password_hash = current_app.extensions["password_hasher"].hash(password)
     created_at = datetime.utcnow().isoformat()
-    cur.execute(
-        "INSERT INTO user_profiles (username, email, password_hash, full_name, vehicle_type, latitude, longitude, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (username, email, password_hash, data.get("full_name"), data.get("vehicle_type"), data.get("latitude"), data.get("longitude"), created_at),
+    row = repository.insert_profile(
+        db, username, email, password_hash,
+        full_name=data.get("full_name"), vehicle_type=data.get("vehicle_type"),
+        latitude=data.get("latitude"), longitude=data.get("longitude"), created_at=created_at,
     )
     db.commit()
-    pid = cur.lastrowid
-    cur.execute("SELECT id, username, email, full_name, vehicle_type, latitude, longitude, created_at FROM user_profiles WHERE id = ?", (pid,))
-    row = cur.fetchone()
+    if row["latitude"] is not None and row["longitude"] is not None:
+        _location_changed(row["id"], row["latitude"], row["longitude"], username=row["username"], full_name=row["full_name"])
     return dict(row), 201
 
 
 @profiles_bp.route("/", methods=["GET"])
 def list_profiles():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM user_profiles")
-    rows = cur.fetchall()
-    return {"profiles": [dict(r) for r in rows]}
+    # keyset pagination: ?after=<last id seen>&limit=N, optional ?fields=a,b
+    # projection and NDJSON streaming via ?format=ndjson or the Accept header;
+    # positions only, in the columnar binary format, by Accept header
+    try:
+        after = int(request.args.get("after", 0))
+        limit = request.args.get("limit")
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return {"error": "after and limit must be integers"}, 400
+
+    fields = request.args.get("fields")
+    if fields:
+        columns = [f for f in fields.split(",") if f]
+        unknown = [f for f in columns if f not in repository.PROFILE_FIELDS]
+        if unknown:
+            return {"error": f"unknown fields: {', '.join(unknown)}"}, 400
+        if "id" not in columns:
+            columns.insert(0, "id")  # the cursor needs the id
+    else:
+        columns = list(repository.PROFILE_FIELDS)
+
+    if _wants_columns():
+        # every position after the cursor, or the next `limit`; the binary
+        # body has no room for the cursor, so it goes in X-Next-After
+        if limit is not None and limit < 1:
+            return {"error": "limit must be positive"}, 400
+        rows = repository.list_profiles(get_db(), ["id", "latitude", "longitude"], after, limit or -1).fetchall()
+        pending = _buffered_positions()
+        if pending:
+            rows = [(row[0],) + pending.get(row[0], (row[1], row[2])) for row in rows]
+        headers = {"X-Next-After": str(rows[-1][0])} if limit and len(rows) == limit else None
+        return _columns_response(columnar.encode_rows(rows), headers)
+
+    stream = request.args.get("format") == "ndjson" or (
+        request.accept_mimetypes.best == "application/x-ndjson"
+    )
+    if limit is None:
+        limit = -1 if stream else DEFAULT_PAGE_SIZE
+    elif limit < 1 or (not stream and limit > MAX_PAGE_SIZE):
+        return {"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}, 400
+
+    cur = repository.list_profiles(get_db(), columns, after, limit)
+
+    if stream:
+        def generate():
+            # rows are pulled from the cursor as the client consumes them
+            while True:
+                rows = cur.fetchmany(STREAM_CHUNK_ROWS)
+                if not rows:
+                    break
+                yield "".join(json.dumps(_profile_dict(r)) + "\n" for r in rows)
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    profiles = [_profile_dict(r) for r in cur.fetchall()]
+    next_after = profiles[-1]["id"] if len(profiles) == limit else None
+    return {"profiles": profiles, "next_after": next_after}
 
 
 @profiles_bp.route("/<int:profile_id>", methods=["GET"])
 def get_profile(profile_id):
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM user_profiles WHERE id = ?", (profile_id,))
-    row = cur.fetchone()
-    if not row:
+    profile = _cached_profile(profile_id)
+    if not profile:
         return {"error": "not found"}, 404
-    return dict(row)
+    return _etag_response(profile[0], profile[1], cache_control="private, no-cache")
 
 
 @profiles_bp.route("/<int:profile_id>", methods=["PUT"])
@@ -291,128 +428,670 @@ def update_profile(profile_id):
         return {"error": "unauthorized"}, 403
     
     db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM user_profiles WHERE id = ?", (profile_id,))
-    row = cur.fetchone()
-    if not row:
-        return {"error": "not found"}, 404
     data = request.get_json() or {}
-    full_name = data.get("full_name", row[3])
-    vehicle_type = data.get("vehicle_type", row[4])
-    latitude = data.get("latitude", row[5])
-    longitude = data.get("longitude", row[6])
-    cur.execute(
-        "UPDATE user_profiles SET full_name = ?, vehicle_type = ?, latitude = ?, longitude = ? WHERE id = ?",
-        (full_name, vehicle_type, latitude, longitude, profile_id),
-    )
+    ts = data.pop("ts", None)
+    if ts is not None and not (_is_coordinate(ts) and history.valid_ts(ts)):
+        return {"error": TS_ERROR}, 400
+    try:
+        _check_position(data.get("latitude"), data.get("longitude"))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    buffer = current_app.extensions.get("location_buffer")
+    if buffer and data.keys() == {"latitude", "longitude"} and data["latitude"] is not None and data["longitude"] is not None:
+        # plain position fix: coalesce in memory, flushed to SQLite in batches
+        profile = _cached_profile(profile_id)
+        if not profile:
+            return {"error": "not found"}, 404
+        row = profile[2]
+        buffer.put(profile_id, data["latitude"], data["longitude"], ts)
+        _location_changed(profile_id, data["latitude"], data["longitude"], username=row["username"], full_name=row["full_name"])
+        return buffer.overlay(row)
+
+    if "latitude" in data or "longitude" in data:
+        _discard_buffered(profile_id)
+    updated = repository.update_profile(db, profile_id, data)
+    if not updated:
+        return {"error": "not found"}, 404
+    if (current_app.config["LOCATION_HISTORY_ENABLED"] and ("latitude" in data or "longitude" in data)
+            and updated["latitude"] is not None and updated["longitude"] is not None):
+        history.append_points(db, [(profile_id, ts or time.time(), updated["latitude"], updated["longitude"])])
     db.commit()
-    cur.execute("SELECT id, username, email, full_name, vehicle_type, latitude, longitude, created_at FROM user_profiles WHERE id = ?", (profile_id,))
-    updated = cur.fetchone()
-    return dict(updated)
+    current_app.extensions["profile_cache"].invalidate(profile_id)
+    if "latitude" in data or "longitude" in data:
+        _location_changed(updated["id"], updated["latitude"], updated["longitude"], username=updated["username"], full_name=updated["full_name"])
+    return _profile_dict(updated)
+
+
+@profiles_bp.route("/<int:profile_id>/track")
+def get_track(profile_id):
+    # ?from=&to= as unix timestamps or ISO 8601 (default: the last hour);
+    # ?tolerance=<metres> simplifies the track with Douglas-Peucker
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "not logged in"}, 401
+    db = get_db()
+    if user_id != profile_id and not repository.is_admin(db, user_id):
+        return {"error": "unauthorized"}, 403
+
+    try:
+        to_ts = _parse_ts(request.args.get("to")) or time.time()
+        from_ts = _parse_ts(request.args.get("from")) or to_ts - 3600
+        tolerance = float(request.args.get("tolerance", 0))
+    except ValueError:
+        return {"error": "from/to must be timestamps and tolerance a number"}, 400
+    # also rules out inf, NaN and times datetime cannot represent
+    if not 0 <= from_ts <= to_ts <= time.time() + history.MAX_CLOCK_SKEW or to_ts - from_ts > MAX_TRACK_SECONDS:
+        return {"error": "invalid time range"}, 400
+
+    points = history.iter_track(db, profile_id, from_ts, to_ts)
+    if tolerance > 0:
+        points = history.simplify(list(points), tolerance).tolist()
+
+    def generate():
+        yield f'{{"user_id": {profile_id}, "points": ['
+        separator = ""
+        chunk = []
+        for point in points:
+            chunk.append(json.dumps(list(point)))
+            if len(chunk) == STREAM_CHUNK_ROWS:
+                yield separator + ", ".join(chunk)
+                separator, chunk = ", ", []
+        if chunk:
+            yield separator + ", ".join(chunk)
+        yield "]}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+@profiles_bp.route("/locations")
+def list_locations():
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    if not bbox:
+        return {"error": "bbox is required"}, 400
+
+    db = get_db()
+    pending = _buffered_positions()
+    if _wants_columns():
+        rows = users_in_bbox(db, bbox, query=BBOX_POSITIONS_QUERY)
+        if pending:
+            users = _merge_buffered(db, rows, pending, lambda lat, lng: in_bbox(bbox, lat, lng))
+            rows = [(u["id"], u["latitude"], u["longitude"]) for u in users]
+        return _columns_response(columnar.encode_rows(rows))
+    users = _merge_buffered(db, users_in_bbox(db, bbox), pending, lambda lat, lng: in_bbox(bbox, lat, lng))
+    return {"users": users}
+
+
+@profiles_bp.route("/locations:batch", methods=["POST"])
+def batch_locations():
+    # {"locations": [...]} of up to MAX_LOCATION_BATCH positions, e.g. a relay
+    # forwarding a convoy. Valid, permitted items are applied together in one
+    # transaction; "results" holds a status per item in request order.
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "not logged in"}, 401
+    items = (request.get_json(silent=True) or {}).get("locations")
+    if not isinstance(items, list) or not items:
+        return {"error": "locations must be a non-empty list"}, 400
+    if len(items) > MAX_LOCATION_BATCH:
+        return {"error": f"at most {MAX_LOCATION_BATCH} locations per batch"}, 400
+
+    results = []
+    parsed = {}
+    for index, item in enumerate(items):
+        try:
+            parsed[index] = _parse_location(item)
+            results.append(None)
+        except ValueError as e:
+            results.append({"status": 400, "error": str(e)})
+
+    db = get_db()
+    ids = {p[0] for p in parsed.values()}
+    writable = _location_writable(db, user_id, ids)
+    names = repository.get_names(db, writable)
+    accepted = []
+    for index, (target, latitude, longitude, ts) in parsed.items():
+        if target not in writable:
+            results[index] = {"user_id": target, "status": 403, "error": "unauthorized"}
+        elif target not in names:
+            results[index] = {"user_id": target, "status": 404, "error": "not found"}
+        else:
+            results[index] = {"user_id": target, "status": 200}
+            accepted.append((target, latitude, longitude, ts))
+
+    buffer = current_app.extensions.get("location_buffer")
+    if buffer:
+        for target, latitude, longitude, ts in accepted:
+            buffer.put(target, latitude, longitude, ts)
+    elif accepted:
+        now = time.time()
+        repository.update_locations(db, [(latitude, longitude, target) for target, latitude, longitude, _ in accepted])
+        if current_app.config["LOCATION_HISTORY_ENABLED"]:
+            history.append_points(db, [(target, ts or now, latitude, longitude) for target, latitude, longitude, ts in accepted])
+        db.commit()
+        cache = current_app.extensions["profile_cache"]
+        for target in {a[0] for a in accepted}:
+            cache.invalidate(target)
+    for target, latitude, longitude, _ in accepted:
+        row = names[target]
+        _location_changed(target, latitude, longitude, username=row["username"], full_name=row["full_name"])
+    return {"results": results, "applied": len(accepted)}
+
+
+@profiles_bp.route("/nearby")
+def list_nearby():
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "not logged in"}, 401
+
+    try:
+        k, radius_km = _nearby_args()
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    db = get_db()
+    me = repository.get_location(db, user_id)
+    if not me:
+        return {"error": "user not found"}, 404
+    pending = _buffered_positions()
+    latitude, longitude = pending.pop(user_id, me)
+    if latitude is None or longitude is None:
+        return {"error": "your location is unknown"}, 400
+
+    if not pending:
+        results = nearby_users(db, latitude, longitude, k=k, radius_km=radius_km, exclude_id=user_id)
+    else:
+        # each buffered user may now be closer than a stored position: take
+        # that many more candidates, overlay them and rank again
+        wide = k + len(pending) if k is not None else None
+        rows = [row for row, _ in nearby_users(db, latitude, longitude, k=wide, radius_km=radius_km, exclude_id=user_id)]
+        users = _merge_buffered(db, rows, pending, lambda lat, lng: True)
+        results = rank_nearby(latitude, longitude, users, k=k, radius_km=radius_km)
+    return {"users": [dict(row, distance_km=round(distance, 3)) for row, distance in results]}
+
+
+@profiles_bp.route("/stream")
+def stream_locations():
+    # Server-Sent Events: batches of "move"/"leave" deltas for the viewport
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    hub = current_app.extensions["location_hub"]
+    keepalive = current_app.config["STREAM_KEEPALIVE_SECONDS"]
+    # under asgi.py: registers a callback for when the client disconnects
+    on_disconnect = request.environ.get("group_navigation.on_disconnect")
+
+    def generate():
+        sub = hub.subscribe(bbox)
+        if on_disconnect:
+            on_disconnect(sub.close)
+        try:
+            yield ": connected\n\n"
+            while True:
+                events = sub.drain(timeout=keepalive)
+                if sub.closed:
+                    break
+                if events:
+                    yield f"event: locations\ndata: {json.dumps(events)}\n\n"
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            hub.unsubscribe(sub)
+
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@profiles_bp.route("/stats")
+def show_stats():
+    stats = {"stream": current_app.extensions["location_hub"].stats()}
+    buffer = current_app.extensions.get("location_buffer")
+    if buffer:
+        stats["ingest"] = buffer.stats()
+    stats["clusters"] = current_app.extensions["cluster_index"].stats()
+    stats["tiles"] = current_app.extensions["tile_cache"].stats()
+    stats["profiles"] = current_app.extensions["profile_cache"].stats()
+    stats["passwords"] = current_app.extensions["password_hasher"].stats()
+    router = current_app.extensions["router"]
+    if router.available:
+        stats["routes"] = router.stats()
+    limiter = current_app.extensions.get("rate_limiter")
+    if limiter:
+        stats["rate_limit"] = limiter.stats()
+    return stats
+
+
+@profiles_bp.route("/map/clusters")
+def map_clusters():
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+        zoom = int(request.args.get("z", ""))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    if not bbox or not 0 <= zoom <= 22:
+        return {"error": "z (0-22) and bbox are required"}, 400
+
+    index = current_app.extensions["cluster_index"]
+    if zoom > index.max_zoom:
+        # close enough to show every user individually
+        clusters = [dict(u, count=1) for u in users_in_bbox(get_db(), bbox)]
+    else:
+        buffer = current_app.extensions.get("location_buffer")
+        index.refresh(get_db(), overlay=buffer.overlay if buffer else dict)
+        clusters = index.query(zoom, bbox)
+    return {"zoom": zoom, "clusters": clusters}
+
+
+@profiles_bp.route("/tiles/<int:z>/<int:x>/<int:y>.json")
+def location_tile(z, x, y):
+    cache = current_app.extensions["tile_cache"]
+    if not cache.min_zoom <= z <= cache.max_zoom or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return {"error": f"tiles are served for zoom {cache.min_zoom}-{cache.max_zoom}; use /profiles/map/clusters below that"}, 404
+
+    buffer = current_app.extensions.get("location_buffer")
+    db = get_db()
+    cache.refresh(db)
+    etag, body = cache.get(db, z, x, y, overlay=buffer.overlay if buffer else None)
+    # always revalidated, usually a 304
+    return _etag_response(etag, body, mimetype="application/geo+json")
 
 
 @profiles_bp.route("/map")
 def show_map():
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
     db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT id, username, full_name, latitude, longitude FROM user_profiles WHERE latitude IS NOT NULL AND longitude IS NOT NULL")
-    users = cur.fetchall()
-    
     user_id = session.get('user_id')
-    current_user = None
-    if user_id:
-        for u in users:
-            if u[0] == user_id:
-                current_user = u
-                break
-    
-    # Build markers JavaScript
-    markers_js = ""
-    for user in users:
-        uid, username, full_name, lat, lng = user
-        name = full_name or username
-        popup_text = f'{name} ({username})'
-        if uid == user_id:
-            popup_text += ' - YOU'
-        markers_js += f"""
-        L.marker([{lat}, {lng}]).addTo(map)
-            .bindPopup('{popup_text}');
-        """
-    
-    # Default center: current user, or first user, or New York
-    if current_user:
-        center_lat, center_lng = current_user[3], current_user[4]
-    elif users:
-        center_lat, center_lng = users[0][3], users[0][4]
+    profile = _cached_profile(user_id) if user_id else None
+    if profile is None:
+        # not logged in, or the account has since been deleted
+        user_id = None
+    current_user = profile[2] if profile else None
+
+    # Only users inside the requested viewport are inlined; the page fetches
+    # the rest from /profiles/locations as the viewport moves. The version is
+    # read first, so the page's first /map/changes covers anything newer.
+    version = changelog.current_version(db)
+    users = users_in_bbox(db, bbox) if bbox else []
+
+    # Default center: current user, or first located user, or New York
+    if current_user and current_user["latitude"] is not None and current_user["longitude"] is not None:
+        center_lat, center_lng = current_user["latitude"], current_user["longitude"]
+    else:
+        first = repository.any_location(db)
+        if first:
+            center_lat, center_lng = first[0], first[1]
+        else:
+            center_lat, center_lng = 40.7128, -74.0060
+    return render_template(
+        "map.html",
+        user_id=user_id,
+        users=[dict(u) for u in users],
+        bbox=bbox,
+        center_lat=center_lat,
+        center_lng=center_lng,
+        map_version=version,
+        cluster_max_zoom=current_app.extensions["cluster_index"].max_zoom,
+        tile_max_zoom=current_app.extensions["tile_cache"].max_zoom,
+    )
+
+
+@profiles_bp.route("/map/changes")
+def map_changes():
+    # users inserted, moved or removed since ?since=<version>, optionally
+    # limited to a viewport (users who left it count as removed). Pages of
+    # ?limit= changes; ask again from "version" while "more" is true.
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    try:
+        since = int(request.args.get("since", ""))
+        limit = int(request.args.get("limit", MAX_PAGE_SIZE))
+    except ValueError:
+        return {"error": "since and limit must be integers"}, 400
+    if since < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        return {"error": f"since must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}"}, 400
+
+    db = get_db()
+    buffer = current_app.extensions.get("location_buffer")
+    inserted, moved, removed, version, more = changelog.changes_since(
+        db, since, limit, overlay=buffer.overlay if buffer else dict, bbox=bbox)
+    if version == since and since > changelog.current_version(db):
+        # e.g. the database was replaced; the client has to start over
+        return {"error": "unknown version, reload the map"}, 410
+    return {"version": version, "inserted": inserted, "moved": moved, "removed": removed, "more": more}
+
+
+@profiles_bp.route("/groups", methods=["POST"])
+def create_group():
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "not logged in"}, 401
+    name = ((request.get_json(silent=True) or {}).get("name") or "")
+    if not isinstance(name, str) or not name.strip() or len(name) > MAX_GROUP_NAME:
+        return {"error": f"name is required (at most {MAX_GROUP_NAME} characters)"}, 400
+
+    db = get_db()
+    group_id = groups.create_group(db, name.strip(), user_id, datetime.utcnow().isoformat())
+    db.commit()
+    return dict(groups.get_group(db, group_id), role=groups.LEADER), 201
+
+
+@profiles_bp.route("/groups", methods=["GET"])
+def list_groups():
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "not logged in"}, 401
+    return {"groups": [dict(g) for g in groups.user_groups(get_db(), user_id)]}
+
+
+@profiles_bp.route("/groups/<int:group_id>", methods=["GET"])
+def get_group(group_id):
+    access, error = _group_access(group_id)
+    if error:
+        return error
+    return dict(groups.get_group(get_db(), group_id), role=access[1])
+
+
+@profiles_bp.route("/groups/<int:group_id>", methods=["DELETE"])
+def delete_group(group_id):
+    access, error = _group_access(group_id, leader=True)
+    if error:
+        return error
+    db = get_db()
+    if groups.get_group(db, group_id)["owner_id"] != access[0] and not repository.is_admin(db, access[0]):
+        return {"error": "only the owner can delete a group"}, 403
+    groups.delete_group(db, group_id)
+    db.commit()
+    return {"message": "group deleted"}
+
+
+@profiles_bp.route("/groups/<int:group_id>/members", methods=["GET"])
+def list_group_members(group_id):
+    # keyset pagination like list_profiles: ?after=<last id seen>&limit=N
+    access, error = _group_access(group_id)
+    if error:
+        return error
+    try:
+        after = int(request.args.get("after", 0))
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return {"error": "after and limit must be integers"}, 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return {"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}, 400
+
+    members = [_profile_dict(m) for m in groups.list_members(get_db(), group_id, after, limit)]
+    next_after = members[-1]["id"] if len(members) == limit else None
+    return {"members": members, "next_after": next_after}
+
+
+@profiles_bp.route("/groups/<int:group_id>/members", methods=["POST"])
+def add_group_member(group_id):
+    # {"user_id" or "username", "role"?}: invites the user, who becomes a
+    # member once they accept; also changes an existing member's role
+    access, error = _group_access(group_id, leader=True)
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    role = data.get("role", groups.MEMBER)
+    if role not in groups.ROLES:
+        return {"error": f"role must be one of {', '.join(groups.ROLES)}"}, 400
+
+    db = get_db()
+    member_id = data.get("user_id")
+    if member_id is None and data.get("username"):
+        member_id = repository.get_user_id(db, data["username"])
+    if not isinstance(member_id, int) or isinstance(member_id, bool) or not repository.get_names(db, [member_id]):
+        return {"error": "user not found"}, 404
+    if member_id == groups.get_group(db, group_id)["owner_id"] and role != groups.LEADER:
+        return {"error": "the owner is always a leader"}, 400
+    invited = groups.get_role(db, group_id, member_id) is None
+    groups.add_member(db, group_id, member_id, role)
+    db.commit()
+    return {"group_id": group_id, "user_id": member_id, "role": role, "invited": invited}, 201
+
+
+@profiles_bp.route("/groups/<int:group_id>/invitation", methods=["POST", "DELETE"])
+def answer_group_invitation(group_id):
+    # accept (POST) or decline (DELETE) your invitation to the group
+    user_id = session.get('user_id')
+    if not user_id:
+        return {"error": "not logged in"}, 401
+    db = get_db()
+    if request.method == "POST":
+        answered = groups.accept_invite(db, group_id, user_id, datetime.utcnow().isoformat())
+    else:
+        answered = groups.decline_invite(db, group_id, user_id)
+    if not answered:
+        return {"error": "no invitation to this group"}, 404
+    db.commit()
+    if request.method == "DELETE":
+        return {"message": "invitation declined"}
+    return dict(groups.get_group(db, group_id), role=groups.get_role(db, group_id, user_id))
+
+
+@profiles_bp.route("/groups/<int:group_id>/members/<int:member_id>", methods=["DELETE"])
+def remove_group_member(group_id, member_id):
+    # leaders remove anyone; members can remove themselves (leave)
+    access, error = _group_access(group_id, leader=member_id != session.get('user_id'))
+    if error:
+        return error
+    db = get_db()
+    if member_id == groups.get_group(db, group_id)["owner_id"]:
+        return {"error": "the owner cannot leave; delete the group instead"}, 400
+    if not groups.remove_member(db, group_id, member_id):
+        return {"error": "not a member"}, 404
+    db.commit()
+    return {"message": "member removed"}
+
+
+@profiles_bp.route("/groups/<int:group_id>/locations")
+def list_group_locations(group_id):
+    # the group's located members, optionally only those inside ?bbox=
+    access, error = _group_access(group_id)
+    if error:
+        return error
+    try:
+        bbox = parse_bbox(request.args.get("bbox"))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    users = _member_locations(group_id)
+    if bbox:
+        users = [u for u in users if groups.in_bbox(u, bbox)]
+    if _wants_columns():
+        return _columns_response(columnar.encode(
+            [u["id"] for u in users], [u["latitude"] for u in users], [u["longitude"] for u in users]))
+    return {"users": users}
+
+
+@profiles_bp.route("/groups/<int:group_id>/nearby")
+def list_group_nearby(group_id):
+    access, error = _group_access(group_id)
+    if error:
+        return error
+    try:
+        k, radius_km = _nearby_args()
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    user_id = access[0]
+    members = _member_locations(group_id)
+    me = next((m for m in members if m["id"] == user_id), None)
+    if me is None:
+        # an admin looking at a group they are not in
+        me = repository.get_location(get_db(), user_id)
+        me = {"latitude": me[0], "longitude": me[1]} if me else None
+    if me is None or me["latitude"] is None or me["longitude"] is None:
+        return {"error": "your location is unknown"}, 400
+
+    results = groups.nearby_members(members, me["latitude"], me["longitude"], k=k, radius_km=radius_km, exclude_id=user_id)
+    return {"users": [dict(row, distance_km=round(distance, 3)) for row, distance in results]}
+
+
+@profiles_bp.route("/groups/<int:group_id>/map")
+def show_group_map(group_id):
+    # map.html showing only the group; the whole group is inlined and the
+    # page refreshes it from /profiles/groups/<id>/locations
+    access, error = _group_access(group_id)
+    if error:
+        return error
+    user_id = access[0]
+    version = changelog.current_version(get_db())
+    users = _member_locations(group_id)
+    me = next((u for u in users if u["id"] == user_id), None)
+    if me or users:
+        center_lat, center_lng = (me or users[0])["latitude"], (me or users[0])["longitude"]
     else:
         center_lat, center_lng = 40.7128, -74.0060
-    
-    # Simple HTML with Leaflet map
-    logged_in_html = ""
-    if user_id:
-        logged_in_html = f"""
-        <button id="updateLocationBtn">Update My Location</button>
-        <p id="locationStatus"></p>
-        """
-    
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Group Navigation Map</title>
-        <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
-        <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-        <style>
-            #map {{ height: 600px; }}
-        </style>
-    </head>
-    <body>
-        <h1>Group Navigation Map</h1>
-        <p>Showing locations of users with coordinates.</p>
-        {logged_in_html}
-        <div id="map"></div>
-        <script>
-            var map = L.map('map').setView([{center_lat}, {center_lng}], 10);
-            L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
-                attribution: '© OpenStreetMap contributors'
-            }}).addTo(map);
-            {markers_js}
-            
-            // Update location function
-            document.getElementById('updateLocationBtn')?.addEventListener('click', function() {{
-                if (navigator.geolocation) {{
-                    navigator.geolocation.getCurrentPosition(function(position) {{
-                        const lat = position.coords.latitude;
-                        const lng = position.coords.longitude;
-                        document.getElementById('locationStatus').textContent = 'Updating location...';
-                        
-                        fetch('/profiles/{user_id}', {{
-                            method: 'PUT',
-                            headers: {{
-                                'Content-Type': 'application/json',
-                            }},
-                            body: JSON.stringify({{ latitude: lat, longitude: lng }}),
-                        }})
-                        .then(response => response.json())
-                        .then(data => {{
-                            document.getElementById('locationStatus').textContent = 'Location updated! Refresh the page to see changes.';
-                        }})
-                        .catch(error => {{
-                            document.getElementById('locationStatus').textContent = 'Error updating location.';
-                            console.error('Error:', error);
-                        }});
-                    }}, function(error) {{
-                        document.getElementById('locationStatus').textContent = 'Unable to retrieve your location.';
-                    }});
-                }} else {{
-                    document.getElementById('locationStatus').textContent = 'Geolocation is not supported by this browser.';
-                }}
-            }});
-        </script>
-    </body>
-    </html>
-    """
-    return html
+    # fit the view to the whole group
+    bbox = None
+    if len(users) > 1:
+        lats, lngs = [u["latitude"] for u in users], [u["longitude"] for u in users]
+        bbox = (min(lngs), min(lats), max(lngs), max(lats))
+    return render_template(
+        "map.html",
+        user_id=user_id,
+        users=users,
+        bbox=bbox,
+        group=dict(groups.get_group(get_db(), group_id)),
+        center_lat=center_lat,
+        center_lng=center_lng,
+        map_version=version,
+        cluster_max_zoom=current_app.extensions["cluster_index"].max_zoom,
+        tile_max_zoom=current_app.extensions["tile_cache"].max_zoom,
+    )
+
+
+@profiles_bp.route("/routes")
+def get_route():
+    # fastest road route from ?from=lat,lng to ?to=lat,lng
+    router = current_app.extensions["router"]
+    if not router.available:
+        return {"error": "routing is not configured"}, 503
+    try:
+        origin = parse_point(request.args.get("from"))
+        destination = parse_point(request.args.get("to"))
+    except ValueError as e:
+        return {"error": f"from and to: {e}"}, 400
+
+    route = router.route(origin, destination)
+    if route is None:
+        return {"error": "from or to is too far from a road"}, 404
+    return route
+
+
+def _road_meeting_point(members, objective):
+    # (lat, lng, {member id: travel time in seconds or None}) of the road
+    # node where the members should meet, or None
+    router = current_app.extensions["router"]
+    found = meeting.road_meeting_point(router, {m["id"]: (m["latitude"], m["longitude"]) for m in members}, objective)
+    if found is None:
+        return None
+    node, times = found
+    return float(router.graph.lat[node]), float(router.graph.lng[node]), times
+
+
+@profiles_bp.route("/groups/<int:group_id>/route")
+def route_group(group_id):
+    # every located member's route to the meeting point ?to=lat,lng, or by
+    # default to the road meeting point for ?objective=sum|max
+    access, error = _group_access(group_id)
+    if error:
+        return error
+    router = current_app.extensions["router"]
+    if not router.available:
+        return {"error": "routing is not configured"}, 503
+    objective = request.args.get("objective", meeting.SUM)
+    if objective not in meeting.OBJECTIVES:
+        return {"error": "objective must be sum or max"}, 400
+    members = _member_locations(group_id)
+    if request.args.get("to") is None:
+        found = _road_meeting_point(members, objective)
+        if found is None:
+            return {"error": "no member is near a road"}, 404
+        destination = found[:2]
+    else:
+        try:
+            destination = parse_point(request.args.get("to"))
+        except ValueError as e:
+            return {"error": f"to: {e}"}, 400
+
+    routes = router.routes_to({m["id"]: (m["latitude"], m["longitude"]) for m in members}, destination)
+    if routes is None:
+        return {"error": "to is too far from a road"}, 404
+    return {
+        "to": {"latitude": destination[0], "longitude": destination[1]},
+        "routes": [
+            dict(routes[m["id"]], user_id=m["id"], username=m["username"], full_name=m["full_name"])
+            for m in members if routes[m["id"]]
+        ],
+        # members too far from a road to be routed
+        "unrouted": [m["id"] for m in members if not routes[m["id"]]],
+    }
+
+
+@profiles_bp.route("/groups/<int:group_id>/meeting-point")
+def group_meeting_point(group_id):
+    # where the group should meet: ?objective=sum (least total travel) or max
+    # (shortest longest trip), over ?metric=geodesic distance or road travel time
+    access, error = _group_access(group_id)
+    if error:
+        return error
+    objective = request.args.get("objective", meeting.SUM)
+    metric = request.args.get("metric", "geodesic")
+    if objective not in meeting.OBJECTIVES:
+        return {"error": "objective must be sum or max"}, 400
+    if metric not in ("geodesic", "road"):
+        return {"error": "metric must be geodesic or road"}, 400
+    members = _member_locations(group_id)
+    if not members:
+        return {"error": "no member has a location"}, 404
+
+    if metric == "geodesic":
+        lat, lng, distances = meeting.meeting_point(
+            [m["latitude"] for m in members], [m["longitude"] for m in members], objective)
+        return {
+            "latitude": round(lat, 6),
+            "longitude": round(lng, 6),
+            "objective": objective,
+            "metric": metric,
+            "total_km": round(float(distances.sum()), 3),
+            "max_km": round(float(distances.max()), 3),
+            "members": [
+                {"user_id": m["id"], "username": m["username"], "distance_km": round(float(d), 3)}
+                for m, d in zip(members, distances)
+            ],
+        }
+
+    if not current_app.extensions["router"].available:
+        return {"error": "routing is not configured"}, 503
+    found = _road_meeting_point(members, objective)
+    if found is None:
+        return {"error": "no member is near a road"}, 404
+    lat, lng, times = found
+    reached = [t for t in times.values() if t is not None]
+    return {
+        "latitude": lat,
+        "longitude": lng,
+        "objective": objective,
+        "metric": metric,
+        "total_s": round(sum(reached), 1),
+        "max_s": round(max(reached), 1),
+        "members": [
+            {"user_id": m["id"], "username": m["username"], "duration_s": round(times[m["id"]], 1)}
+            for m in members if times[m["id"]] is not None
+        ],
+        # members too far from a road to be routed
+        "unrouted": [m["id"] for m in members if times[m["id"]] is None],
+    }
 
 
 @profiles_bp.route("/test")
@@ -427,75 +1106,37 @@ def admin_dashboard():
         return redirect("/profiles/login")
     
     db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT is_admin FROM user_profiles WHERE id = ?", (user_id,))
-    user = cur.fetchone()
-    if not user or not user[0]:
+    if not repository.is_admin(db, user_id):
         return {"error": "access denied - admin only"}, 403
     
-    # Get all users
-    cur.execute("SELECT id, username, email, full_name, vehicle_type, latitude, longitude, is_admin, created_at FROM user_profiles ORDER BY created_at DESC")
-    users = cur.fetchall()
-    users_list = [dict(u) for u in users]
-    
-    # Build HTML table
-    users_html = ""
-    for u in users_list:
-        admin_badge = " (ADMIN)" if u['is_admin'] else ""
-        users_html += f"""
-        <tr>
-            <td>{u['id']}</td>
-            <td>{u['username']}{admin_badge}</td>
-            <td>{u['email']}</td>
-            <td>{u['full_name'] or 'N/A'}</td>
-            <td>{u['vehicle_type'] or 'N/A'}</td>
-            <td>
-                <a href="/profiles/admin/edit/{u['id']}">Edit</a> |
-                <a href="/profiles/admin/delete/{u['id']}" onclick="return confirm('Are you sure you want to delete this user?')">Delete</a>
-            </td>
-        </tr>
-        """
-    
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Admin Dashboard</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; }}
-            table {{ border-collapse: collapse; width: 100%; }}
-            table, th, td {{ border: 1px solid black; padding: 8px; text-align: left; }}
-            th {{ background-color: #4CAF50; color: white; }}
-            tr:nth-child(even) {{ background-color: #f2f2f2; }}
-            a {{ color: blue; text-decoration: none; margin: 0 5px; }}
-            a:hover {{ text-decoration: underline; }}
-            .header {{ display: flex; justify-content: space-between; align-items: center; margin-bottom: 20px; }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>Admin Dashboard</h1>
-            <div>
-                <a href="/profiles/map">View Map</a> | 
-                <a href="/profiles/logout" onclick="this.form.submit()">Logout</a>
-            </div>
-        </div>
-        
-        <h2>User Management</h2>
-        <table>
-            <tr>
-                <th>ID</th>
-                <th>Username</th>
-                <th>Email</th>
-                <th>Full Name</th>
-                <th>Vehicle Type</th>
-                <th>Actions</th>
-            </tr>
-            {users_html}
-        </table>
-    </body>
-    </html>
-    """
+    # ?q=<username or email prefix>&sort=created_at|id|username|email&order=asc|desc,
+    # paged with ?after=<sort key>&after_id=<id> from the previous page's last row
+    q = request.args.get("q", "").strip()
+    sort = request.args.get("sort", "created_at")
+    order = request.args.get("order", "desc")
+    if sort not in repository.ADMIN_SORT_KEYS or order not in ("asc", "desc"):
+        return {"error": f"sort must be one of {', '.join(repository.ADMIN_SORT_KEYS)} and order asc or desc"}, 400
+    try:
+        limit = int(request.args.get("limit", ADMIN_PAGE_SIZE))
+        after_id = request.args.get("after_id")
+        after_id = int(after_id) if after_id else None
+    except ValueError:
+        return {"error": "limit and after_id must be integers"}, 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return {"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}, 400
+    after = request.args.get("after")
+    if after_id is not None and sort != "id" and after is None:
+        return {"error": "after is required with after_id"}, 400
+
+    users = repository.list_admin_page(
+        db, sort, order == "desc", prefix=q or None, search="email" if "@" in q else "username",
+        after=after, after_id=after_id, limit=limit,
+    )
+    # rows go out as they are read from the cursor
+    return Response(
+        stream_template("admin.html", users=users, q=q, sort=sort, order=order, limit=limit, paged=after_id is not None),
+        mimetype="text/html",
+    )
 
 
 @profiles_bp.route("/admin/edit/<int:profile_id>", methods=["GET", "POST"])
@@ -505,83 +1146,34 @@ def admin_edit_user(profile_id):
         return redirect("/profiles/login")
     
     db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT is_admin FROM user_profiles WHERE id = ?", (user_id,))
-    user = cur.fetchone()
-    if not user or not user[0]:
+    if not repository.is_admin(db, user_id):
         return {"error": "access denied - admin only"}, 403
     
     if request.method == "GET":
-        cur.execute("SELECT id, username, email, full_name, vehicle_type, latitude, longitude, is_admin FROM user_profiles WHERE id = ?", (profile_id,))
-        target_user = cur.fetchone()
+        target_user = repository.get_profile(db, profile_id)
         if not target_user:
             return {"error": "user not found"}, 404
         
-        user_data = dict(target_user)
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Edit User</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 50px; }}
-                .container {{ max-width: 500px; }}
-                input, textarea {{ width: 100%; padding: 8px; margin: 5px 0 15px 0; box-sizing: border-box; }}
-                button {{ padding: 10px 20px; background-color: #4CAF50; color: white; border: none; cursor: pointer; }}
-                button:hover {{ background-color: #45a049; }}
-                label {{ display: block; font-weight: bold; margin-top: 10px; }}
-                .checkbox {{ width: auto; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Edit User: {user_data['username']}</h1>
-                <form action="/profiles/admin/edit/{profile_id}" method="post">
-                    <label>Username:</label>
-                    <input type="text" name="username" value="{user_data['username']}" readonly>
-                    
-                    <label>Email:</label>
-                    <input type="email" name="email" value="{user_data['email']}" required>
-                    
-                    <label>Full Name:</label>
-                    <input type="text" name="full_name" value="{user_data['full_name'] or ''}">
-                    
-                    <label>Vehicle Type:</label>
-                    <input type="text" name="vehicle_type" value="{user_data['vehicle_type'] or ''}">
-                    
-                    <label>Latitude:</label>
-                    <input type="number" name="latitude" step="0.0001" value="{user_data['latitude'] or ''}">
-                    
-                    <label>Longitude:</label>
-                    <input type="number" name="longitude" step="0.0001" value="{user_data['longitude'] or ''}">
-                    
-                    <label>
-                        <input type="checkbox" name="is_admin" class="checkbox" {"checked" if user_data['is_admin'] else ""}>
-                        Admin User
-                    </label><br>
-                    
-                    <button type="submit">Save Changes</button>
-                    <a href="/profiles/admin">Cancel</a>
-                </form>
-            </div>
-        </body>
-        </html>
-        """
+        return render_template("admin_edit.html", user=target_user)
     
     # POST - Update user
     data = request.form
     email = data.get("email")
     full_name = data.get("full_name", "")
     vehicle_type = data.get("vehicle_type", "")
-    latitude = data.get("latitude") or None
-    longitude = data.get("longitude") or None
+    try:
+        latitude = float(data["latitude"]) if data.get("latitude") else None
+        longitude = float(data["longitude"]) if data.get("longitude") else None
+        _check_position(latitude, longitude)
+    except ValueError:
+        return {"error": LOCATION_ERROR}, 400
     is_admin = 1 if data.get("is_admin") else 0
     
-    cur.execute(
-        "UPDATE user_profiles SET email = ?, full_name = ?, vehicle_type = ?, latitude = ?, longitude = ?, is_admin = ? WHERE id = ?",
-        (email, full_name, vehicle_type, latitude, longitude, is_admin, profile_id),
-    )
+    _discard_buffered(profile_id)
+    repository.admin_update_profile(db, profile_id, email, full_name, vehicle_type, latitude, longitude, is_admin)
     db.commit()
+    current_app.extensions["profile_cache"].invalidate(profile_id)
+    _location_changed(profile_id, latitude, longitude, full_name=full_name)
     return redirect("/profiles/admin")
 
 
@@ -592,16 +1184,16 @@ def admin_delete_user(profile_id):
         return redirect("/profiles/login")
     
     db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT is_admin FROM user_profiles WHERE id = ?", (user_id,))
-    user = cur.fetchone()
-    if not user or not user[0]:
+    if not repository.is_admin(db, user_id):
         return {"error": "access denied - admin only"}, 403
     
     # Prevent self-deletion
     if profile_id == user_id:
         return {"error": "cannot delete your own account"}, 400
     
-    cur.execute("DELETE FROM user_profiles WHERE id = ?", (profile_id,))
+    _discard_buffered(profile_id)
+    repository.delete_profile(db, profile_id)
     db.commit()
+    current_app.extensions["profile_cache"].invalidate(profile_id)
+    _location_changed(profile_id, None, None)
     return redirect("/profiles/admin")
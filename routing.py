@@ -0,0 +1,614 @@
+# Road routing over a local OpenStreetMap extract. The drivable ways are
+# compiled into a compact CSR graph: for node i, its outgoing edges are
+# targets[indptr[i]:indptr[i + 1]] with their travel times in seconds[...],
+# all in flat numpy arrays. Routes are found with A* on travel time, guided
+# by the great-circle distance at the network's top speed, and a whole group
+# is routed to one destination with a single search over the reversed graph.
+# Recent routes are kept in an LRU cache keyed by the snapped end nodes.
+#
+# ROUTING_GRAPH is an .osm / .osm.gz / .osm.bz2 extract, parsed with the
+# standard library (slow for a large region), or an .npz compiled from one
+# with `flask routing build`, which loads in milliseconds. Without it the
+# routing endpoints answer 503.
+import bz2
+import gzip
+import heapq
+import math
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from collections import OrderedDict
+import numpy as np
+from spatial import EARTH_RADIUS_KM, KM_PER_DEG_LAT
+
+# km/h by highway=* when a way has no usable maxspeed
+ROAD_SPEEDS = {
+    "motorway": 100, "motorway_link": 60,
+    "trunk": 80, "trunk_link": 50,
+    "primary": 65, "primary_link": 45,
+    "secondary": 55, "secondary_link": 40,
+    "tertiary": 45, "tertiary_link": 35,
+    "unclassified": 35, "residential": 30, "road": 30,
+    "living_street": 10, "service": 15,
+}
+IMPLIED_ONEWAY = ("motorway", "motorway_link")
+NO_ACCESS = ("no", "private")
+SNAP_CELL_DEG = 0.01  # ~1.1 km north-south
+DEFAULT_LANDMARKS = 8
+ACTIVE_LANDMARKS = 4  # per query, the ones giving the best bound at the start
+GRAPH_ARRAYS = ("lat", "lng", "indptr", "targets", "seconds", "landmarks", "from_landmarks", "to_landmarks")
+
+
+def parse_point(value):
+    # "lat,lng" -> (lat, lng); raises ValueError
+    try:
+        lat, lng = (float(v) for v in value.split(","))
+    except (AttributeError, ValueError):
+        raise ValueError("expected 'latitude,longitude'")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("latitude or longitude out of range")
+    return lat, lng
+
+
+def _speed(tags):
+    maxspeed = tags.get("maxspeed", "")
+    number = maxspeed.split()[0] if maxspeed else ""
+    try:
+        speed = float(number)
+    except ValueError:
+        return ROAD_SPEEDS[tags["highway"]]
+    return speed * 1.609344 if maxspeed.endswith("mph") else speed
+
+
+def _direction(tags):
+    # 1 forward only, -1 backward only, 0 both ways
+    oneway = tags.get("oneway")
+    if oneway in ("yes", "true", "1"):
+        return 1
+    if oneway in ("-1", "reverse"):
+        return -1
+    if oneway == "no":
+        return 0
+    return 1 if tags["highway"] in IMPLIED_ONEWAY or tags.get("junction") in ("roundabout", "circular") else 0
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_osm(path):
+    # Drivable ways of an OSM XML extract as (lat, lng, src, dst, speed_kmh)
+    # arrays; src/dst index into lat/lng. Nodes are held in flat arrays, not
+    # one Python object each, so a city-sized extract fits comfortably.
+    node_ids, node_lat, node_lng = array("q"), array("d"), array("d")
+    refs, way_ends = array("q"), array("q")  # way k is refs[way_ends[k - 1]:way_ends[k]]
+    way_speed, way_direction = array("d"), array("b")
+    with _open(path) as source:
+        for _, elem in ET.iterparse(source):
+            if elem.tag == "node":
+                node_ids.append(int(elem.get("id")))
+                node_lat.append(float(elem.get("lat")))
+                node_lng.append(float(elem.get("lon")))
+                elem.clear()
+            elif elem.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                if tags.get("highway") in ROAD_SPEEDS and tags.get("access") not in NO_ACCESS \
+                        and tags.get("motor_vehicle") not in NO_ACCESS:
+                    refs.extend(int(nd.get("ref")) for nd in elem.iter("nd"))
+                    way_ends.append(len(refs))
+                    way_speed.append(_speed(tags))
+                    way_direction.append(_direction(tags))
+                elem.clear()
+            elif elem.tag == "relation":
+                elem.clear()
+
+    node_ids = np.frombuffer(node_ids, dtype=np.int64)
+    order = np.argsort(node_ids, kind="stable")
+    sorted_ids = node_ids[order]
+    refs = np.frombuffer(refs, dtype=np.int64)
+    if not len(refs):
+        return np.empty(0), np.empty(0), np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    position = np.minimum(np.searchsorted(sorted_ids, refs), len(sorted_ids) - 1)
+    known = sorted_ids[position] == refs if len(sorted_ids) else np.zeros(len(refs), bool)
+    index = order[position] if len(sorted_ids) else position
+
+    # consecutive refs within a way are road segments
+    ends = np.frombuffer(way_ends, dtype=np.int64)
+    way_of = np.repeat(np.arange(len(ends)), np.diff(np.concatenate(([0], ends))))
+    a = np.arange(len(refs) - 1)
+    segment = (way_of[a] == way_of[a + 1]) & known[a] & known[a + 1]
+    a = a[segment]
+    speed = np.frombuffer(way_speed, dtype=np.float64)[way_of[a]]
+    direction = np.frombuffer(way_direction, dtype=np.int8)[way_of[a]]
+    forward, backward = direction >= 0, direction <= 0
+    src = np.concatenate((index[a][forward], index[a + 1][backward]))
+    dst = np.concatenate((index[a + 1][forward], index[a][backward]))
+    speed = np.concatenate((speed[forward], speed[backward]))
+    return np.frombuffer(node_lat), np.frombuffer(node_lng), src, dst, speed
+
+
+def build_graph(lat, lng, src, dst, speed_kmh, landmarks=DEFAULT_LANDMARKS):
+    # CSR graph from directed edges, keeping only the nodes and edges of the
+    # network's largest strongly connected part
+    keep = src != dst
+    src, dst, speed_kmh = src[keep], dst[keep], speed_kmh[keep]
+    used = np.unique(np.concatenate((src, dst)))
+    renumber = np.full(len(lat), -1, dtype=np.int64)
+    renumber[used] = np.arange(len(used))
+    lat, lng, src, dst = lat[used], lng[used], renumber[src], renumber[dst]
+
+    component = _strong_component(len(lat), src, dst)
+    keep = component[src] & component[dst]
+    src, dst, speed_kmh = src[keep], dst[keep], speed_kmh[keep]
+    renumber = np.cumsum(component) - 1
+    lat, lng, src, dst = lat[component], lng[component], renumber[src], renumber[dst]
+
+    seconds = _segment_meters(lat[src], lng[src], lat[dst], lng[dst]) / (speed_kmh / 3.6)
+    order = np.lexsort((dst, src))
+    graph = Graph(lat, lng, _offsets(src, len(lat)), dst[order], seconds[order])
+    if landmarks:
+        graph.compute_landmarks(landmarks)
+    return graph
+
+
+def _segment_meters(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2000 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _offsets(keys, n):
+    # CSR row offsets for edges sorted by `keys`
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return indptr
+
+
+def _reachable(n, indptr, neighbours, root):
+    seen = bytearray(n)
+    seen[root] = 1
+    stack = [root]
+    while stack:
+        u = stack.pop()
+        for v in neighbours[indptr[u]:indptr[u + 1]]:
+            if not seen[v]:
+                seen[v] = 1
+                stack.append(v)
+    return np.frombuffer(seen, dtype=np.uint8).astype(bool)
+
+
+def _strong_component(n, src, dst, attempts=5):
+    # Mask of the largest strongly connected component found from a few
+    # well-connected roots (reachable both from and to the root). Islands and
+    # dead-end one-ways are dropped, so any two kept nodes have a route.
+    if n == 0:
+        return np.zeros(0, bool)
+    forward = _offsets(src, n).tolist(), dst[np.argsort(src, kind="stable")].tolist()
+    backward = _offsets(dst, n).tolist(), src[np.argsort(dst, kind="stable")].tolist()
+    best = np.zeros(n, bool)
+    degree = np.bincount(src, minlength=n) + np.bincount(dst, minlength=n)
+    for root in np.argsort(-degree, kind="stable").tolist():
+        if best[root]:
+            continue
+        component = _reachable(n, *forward, root) & _reachable(n, *backward, root)
+        if component.sum() > best.sum():
+            best = component
+        attempts -= 1
+        if attempts == 0 or best.sum() * 2 >= n:
+            break
+    return best
+
+
+def _travel_times(n, indptr, targets, seconds, source):
+    # seconds from `source` to every node (one full Dijkstra)
+    dist = [math.inf] * n
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    push, pop = heapq.heappush, heapq.heappop
+    while heap:
+        d, u = pop(heap)
+        if d > dist[u]:
+            continue
+        for e in range(indptr[u], indptr[u + 1]):
+            v = targets[e]
+            nd = d + seconds[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                push(heap, (nd, v))
+    return np.array(dist)
+
+
+class Graph:
+    def __init__(self, lat, lng, indptr, targets, seconds, landmarks=None, from_landmarks=None, to_landmarks=None):
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.lng = np.ascontiguousarray(lng, dtype=np.float64)
+        self.indptr = np.ascontiguousarray(indptr, dtype=np.int64)
+        self.targets = np.ascontiguousarray(targets, dtype=np.int32)
+        self.seconds = np.ascontiguousarray(seconds, dtype=np.float32)
+        # the search loops index memoryviews: plain Python numbers, no copies
+        self._indptr = memoryview(self.indptr)
+        self._targets = memoryview(self.targets)
+        self._seconds = memoryview(self.seconds)
+        meters = self._edge_meters()
+        # fastest edge, in m/s, so distance / top_speed never overestimates
+        self.top_speed = float((meters / np.maximum(self.seconds, 1e-6)).max()) if len(meters) else 1.0
+        self._rlat = np.radians(self.lat)
+        self._rlng = np.radians(self.lng)
+        self._cos = np.cos(self._rlat)
+        self._set_landmarks(landmarks, from_landmarks, to_landmarks)
+        self._reverse = None
+        self._reverse_lock = threading.Lock()
+        self._build_snap_index()
+
+    @property
+    def node_count(self):
+        return len(self.lat)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def _edge_meters(self):
+        src = np.repeat(np.arange(len(self.lat)), np.diff(self.indptr))
+        return _segment_meters(self.lat[src], self.lng[src], self.lat[self.targets], self.lng[self.targets])
+
+    def _set_landmarks(self, landmarks, from_landmarks, to_landmarks):
+        # ALT: travel times from and to a few landmark nodes give, by the
+        # triangle inequality, far tighter A* bounds than straight-line
+        # distance. Rows are float32 (8 bytes per node and landmark).
+        if landmarks is None or not len(landmarks):
+            self.landmarks = np.zeros(0, dtype=np.int32)
+            self.from_landmarks = self.to_landmarks = np.zeros((0, self.node_count), dtype=np.float32)
+        else:
+            self.landmarks = np.asarray(landmarks, dtype=np.int32)
+            self.from_landmarks = np.ascontiguousarray(from_landmarks, dtype=np.float32)
+            self.to_landmarks = np.ascontiguousarray(to_landmarks, dtype=np.float32)
+        self._from = [memoryview(row) for row in self.from_landmarks]
+        self._to = [memoryview(row) for row in self.to_landmarks]
+
+    def compute_landmarks(self, count=DEFAULT_LANDMARKS):
+        # "farthest" selection: each landmark is the node farthest (in travel
+        # time) from the ones already chosen, starting from the node farthest
+        # from the network's centre. Two full Dijkstras per landmark.
+        n = self.node_count
+        count = min(count, n)
+        forward = self.indptr.tolist(), self.targets.tolist(), self.seconds.tolist()
+        reverse_indptr, origins, reverse_seconds = (np.asarray(view) for view in self._reversed())
+        backward = reverse_indptr.tolist(), origins.tolist(), reverse_seconds.tolist()
+        centre = _segment_meters(self.lat.mean(), self.lng.mean(), self.lat, self.lng)
+        landmarks, from_rows, to_rows = [], [], []
+        nearest = None
+        node = int(np.argmax(centre))
+        for _ in range(count):
+            landmarks.append(node)
+            from_rows.append(_travel_times(n, *forward, node))
+            to_rows.append(_travel_times(n, *backward, node))
+            nearest = from_rows[-1] if nearest is None else np.minimum(nearest, from_rows[-1])
+            node = int(np.argmax(nearest))
+        self._set_landmarks(landmarks, from_rows, to_rows)
+
+    def save(self, path):
+        np.savez(
+            path, lat=self.lat, lng=self.lng, indptr=self.indptr, targets=self.targets, seconds=self.seconds,
+            landmarks=self.landmarks, from_landmarks=self.from_landmarks, to_landmarks=self.to_landmarks,
+        )
+
+    @classmethod
+    def load(cls, path, landmarks=DEFAULT_LANDMARKS):
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                return cls(*(data[name] for name in GRAPH_ARRAYS))
+        return build_graph(*read_osm(path), landmarks=landmarks)
+
+    # nearest node: nodes sorted by the grid cell they fall in, so the nodes
+    # of one cell are a contiguous slice found with searchsorted
+
+    def _cell_keys(self, rows, cols):
+        return rows * 40000 + cols
+
+    def _build_snap_index(self):
+        rows = np.floor((self.lat + 90) / SNAP_CELL_DEG).astype(np.int64)
+        cols = np.floor((self.lng + 180) / SNAP_CELL_DEG).astype(np.int64)
+        keys = self._cell_keys(rows, cols)
+        self._snap_order = np.argsort(keys, kind="stable")
+        self._snap_keys = keys[self._snap_order]
+
+    def nearest(self, lat, lng, max_meters):
+        # (node, meters) of the closest node within max_meters, else None
+        if not self.node_count:
+            return None
+        row, col = int((lat + 90) // SNAP_CELL_DEG), int((lng + 180) // SNAP_CELL_DEG)
+        cell_meters = SNAP_CELL_DEG * KM_PER_DEG_LAT * 1000 * max(math.cos(math.radians(min(abs(lat) + SNAP_CELL_DEG, 90))), 0.01)
+        rings = int(max_meters // cell_meters) + 1
+        best = None
+        for ring in range(rings + 1):
+            # cells on the border of the (2 * ring + 1)^2 square
+            candidates = []
+            for r in range(row - ring, row + ring + 1):
+                step = 1 if r in (row - ring, row + ring) else 2 * ring or 1
+                for c in range(col - ring, col + ring + 1, step):
+                    key = self._cell_keys(r, c)
+                    lo, hi = np.searchsorted(self._snap_keys, [key, key + 1])
+                    if hi > lo:
+                        candidates.append(self._snap_order[lo:hi])
+            if candidates:
+                nodes = np.concatenate(candidates)
+                meters = _segment_meters(lat, lng, self.lat[nodes], self.lng[nodes])
+                i = int(np.argmin(meters))
+                if best is None or meters[i] < best[1]:
+                    best = (int(nodes[i]), float(meters[i]))
+            # everything beyond this ring is at least ring cells away
+            if best is not None and best[1] <= ring * cell_meters:
+                break
+        if best is None or best[1] > max_meters:
+            return None
+        return best
+
+    def _estimator(self, source, target):
+        # lower bound on the seconds from a node to `target`
+        if not len(self.landmarks):
+            # great-circle distance at the top speed
+            lat, lng, cos = memoryview(self._rlat), memoryview(self._rlng), memoryview(self._cos)
+            t_lat, t_lng, t_cos = lat[target], lng[target], cos[target]
+            scale = 2000 * EARTH_RADIUS_KM / self.top_speed
+            sin, asin, sqrt = math.sin, math.asin, math.sqrt
+
+            def estimate(v):
+                a = sin((lat[v] - t_lat) / 2) ** 2 + cos[v] * t_cos * sin((lng[v] - t_lng) / 2) ** 2
+                return scale * asin(sqrt(min(a, 1.0)))
+            return estimate
+
+        # d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L)
+        from_t, to_t = self.from_landmarks[:, target], self.to_landmarks[:, target]
+        bounds = np.maximum(from_t - self.from_landmarks[:, source], self.to_landmarks[:, source] - to_t)
+        rows = [(float(from_t[i]), self._from[i], self._to[i], float(to_t[i]))
+                for i in np.argsort(-bounds)[:ACTIVE_LANDMARKS].tolist()]
+
+        def estimate(v):
+            best = 0.0
+            for from_target, from_landmark, to_landmark, to_target in rows:
+                bound = from_target - from_landmark[v]
+                if bound > best:
+                    best = bound
+                bound = to_landmark[v] - to_target
+                if bound > best:
+                    best = bound
+            return best
+        return estimate
+
+    def lower_bounds(self, sources, target):
+        # the estimator's bound for an array of sources, vectorized
+        sources = np.asarray(sources, dtype=np.intp)
+        if not len(self.landmarks):
+            meters = _segment_meters(self.lat[sources], self.lng[sources], self.lat[target], self.lng[target])
+            return meters / self.top_speed
+        bounds = np.maximum(
+            self.from_landmarks[:, target, None] - self.from_landmarks[:, sources],
+            self.to_landmarks[:, sources] - self.to_landmarks[:, target, None],
+        )
+        return np.maximum(bounds.max(axis=0), 0.0)
+
+    def shortest_path(self, source, target):
+        # (nodes, seconds) of the fastest path, or None if unreachable
+        if source == target:
+            return [source], 0.0
+        indptr, targets, seconds = self._indptr, self._targets, self._seconds
+        estimate = self._estimator(source, target)
+        best = {source: 0.0}
+        parent = {source: -1}
+        heap = [(estimate(source), 0.0, source)]
+        push, pop = heapq.heappush, heapq.heappop
+        while heap:
+            _, d, u = pop(heap)
+            if u == target:
+                return _walk(parent, target)[::-1], d
+            if d > best[u]:
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = targets[e]
+                nd = d + seconds[e]
+                if nd < best.get(v, math.inf):
+                    best[v] = nd
+                    parent[v] = u
+                    push(heap, (nd + estimate(v), nd, v))
+        return None
+
+    def _reversed(self):
+        with self._reverse_lock:
+            if self._reverse is None:
+                # the same edges in CSR form keyed by target
+                src = np.repeat(np.arange(self.node_count, dtype=np.int32), np.diff(self.indptr))
+                order = np.argsort(self.targets, kind="stable")
+                self._reverse = (
+                    memoryview(_offsets(self.targets, self.node_count)),
+                    memoryview(np.ascontiguousarray(src[order])),
+                    memoryview(np.ascontiguousarray(self.seconds[order])),
+                )
+            return self._reverse
+
+    def paths_to(self, sources, target):
+        # {source: (nodes, seconds)} for every reachable source: one Dijkstra
+        # outwards from the target over reversed edges, stopped once all
+        # sources are settled
+        indptr, origins, seconds = self._reversed()
+        pending = set(sources)
+        best = {target: 0.0}
+        parent = {target: -1}
+        heap = [(0.0, target)]
+        results = {}
+        push, pop = heapq.heappush, heapq.heappop
+        while heap and pending:
+            d, u = pop(heap)
+            if d > best[u]:
+                continue
+            if u in pending:
+                pending.discard(u)
+                results[u] = (_walk(parent, u), d)
+            for e in range(indptr[u], indptr[u + 1]):
+                v = origins[e]
+                nd = d + seconds[e]
+                if nd < best.get(v, math.inf):
+                    best[v] = nd
+                    parent[v] = u
+                    push(heap, (nd, v))
+        return results
+
+    def times_to(self, sources, target, max_total=math.inf, max_seconds=math.inf):
+        # {source: seconds} for a {source: count} mapping, like paths_to but
+        # without the paths. Gives up (None) as soon as the count-weighted
+        # total is bound to exceed max_total, or a source is farther than
+        # max_seconds: the unsettled sources are at least as far as the
+        # search frontier.
+        indptr, origins, seconds = self._reversed()
+        pending = dict(sources)
+        waiting = sum(pending.values())
+        spent = 0.0
+        best = {target: 0.0}
+        heap = [(0.0, target)]
+        results = {}
+        push, pop = heapq.heappush, heapq.heappop
+        while heap and pending:
+            d, u = pop(heap)
+            if d > best[u]:
+                continue
+            if d > max_seconds or spent + d * waiting > max_total:
+                return None
+            if u in pending:
+                count = pending.pop(u)
+                waiting -= count
+                spent += d * count
+                results[u] = d
+            for e in range(indptr[u], indptr[u + 1]):
+                v = origins[e]
+                nd = d + seconds[e]
+                if nd < best.get(v, math.inf):
+                    best[v] = nd
+                    push(heap, (nd, v))
+        return results
+
+    def describe(self, nodes, seconds):
+        points = np.column_stack((self.lat[nodes], self.lng[nodes]))
+        meters = _segment_meters(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1]).sum() if len(nodes) > 1 else 0.0
+        return {
+            "distance_m": round(float(meters), 1),
+            "duration_s": round(float(seconds), 1),
+            "points": np.round(points, 6).tolist(),
+        }
+
+
+def _walk(parent, node):
+    path = []
+    while node != -1:
+        path.append(node)
+        node = parent[node]
+    return path
+
+
+class Router:
+    # The graph is loaded on first use. Routes are cached by (from node, to
+    # node), so requests from nearby positions share an entry.
+
+    def __init__(self, path=None, cache_size=1024, max_snap_meters=2000):
+        self.path = path
+        self.cache_size = cache_size
+        self.max_snap_meters = max_snap_meters
+        self._graph = None
+        self._load_lock = threading.Lock()
+        self._cache = OrderedDict()  # (source, target) -> (nodes, seconds) or None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def available(self):
+        return self.path is not None or self._graph is not None
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            with self._load_lock:
+                if self._graph is None:
+                    self._graph = Graph.load(self.path)
+        return self._graph
+
+    def set_graph(self, graph):
+        with self._lock:
+            self._graph = graph
+            self._cache.clear()
+
+    def _cached(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return True, self._cache[key]
+            self.misses += 1
+            return False, None
+
+    def _store(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def snap(self, lat, lng):
+        found = self.graph.nearest(lat, lng, self.max_snap_meters)
+        return found[0] if found else None
+
+    def route(self, origin, destination):
+        # route dict between two (lat, lng) points; None when either is off
+        # the network or no road connects them
+        graph = self.graph
+        source, target = self.snap(*origin), self.snap(*destination)
+        if source is None or target is None:
+            return None
+        key = (source, target)
+        found, path = self._cached(key)
+        if not found:
+            path = graph.shortest_path(source, target)
+            self._store(key, path)
+        return graph.describe(*path) if path else None
+
+    def routes_to(self, origins, destination):
+        # {key: route dict, or None when off the network} for a {key: (lat,
+        # lng)} mapping, all to one destination; uncached origins share a
+        # single search. None if the destination is off the network.
+        graph = self.graph
+        target = self.snap(*destination)
+        if target is None:
+            return None
+        sources = {key: self.snap(*point) for key, point in origins.items()}
+        paths, missing = {}, set()
+        for source in set(s for s in sources.values() if s is not None):
+            found, path = self._cached((source, target))
+            if found:
+                paths[source] = path
+            else:
+                missing.add(source)
+        if missing:
+            found = graph.paths_to(missing, target)
+            for source in missing:
+                paths[source] = found.get(source)
+                self._store((source, target), paths[source])
+        return {key: graph.describe(*paths[s]) if s is not None and paths[s] else None for key, s in sources.items()}
+
+    def stats(self):
+        stats = {"routes": len(self._cache), "hits": self.hits, "misses": self.misses}
+        if self._graph is not None:
+            stats.update(nodes=self._graph.node_count, edges=self._graph.edge_count)
+        return stats
+
+
+def init_app(app):
+    app.config.setdefault("ROUTING_GRAPH", None)
+    app.config.setdefault("ROUTING_CACHE_SIZE", 1024)
+    # positions farther than this from any road are not routed
+    app.config.setdefault("ROUTING_MAX_SNAP_M", 2000)
+    router = Router(app.config["ROUTING_GRAPH"], app.config["ROUTING_CACHE_SIZE"], app.config["ROUTING_MAX_SNAP_M"])
+    app.extensions["router"] = router
+    return router
@@ -0,0 +1,76 @@
+# Serve the app outside the Flask development server.
+#
+#   python serve.py                              # ASGI on uvicorn, 1 worker x 32 threads
+#   python serve.py --workers 2 --threads 16
+#   python serve.py --wsgi --threads 32          # threaded werkzeug server, for comparison
+#
+# Workers are processes and threads run requests within each. SQLite allows
+# one writer at a time, so extra workers mainly help CPU-bound pages (map,
+# admin); they also split the in-process state: live streams only see
+# updates written by their own worker, and caches and rate limits are per
+# worker (set RATE_LIMIT_STORAGE to share limits). One worker with enough
+# threads for the expected concurrent requests is the default; open streams
+# run on a separate --streams pool.
+#
+# SIGTERM or Ctrl-C stops accepting connections, gives in-flight requests
+# --graceful-timeout seconds, then ends streams and flushes buffered
+# positions (app.shutdown) before exiting.
+import argparse
+import os
+import signal
+
+
+def serve_asgi(args):
+    import uvicorn
+
+    os.environ["SERVE_THREADS"] = str(args.threads)
+    os.environ["SERVE_STREAMS"] = str(args.streams)
+    uvicorn.run(
+        "asgi:create_asgi_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        lifespan="on",
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=args.access_log,
+    )
+
+
+def serve_wsgi(args):
+    from werkzeug.serving import make_server
+    from app import create_app, shutdown
+
+    app = create_app()
+    # a thread per request, unbounded; --workers and --threads do not apply
+    server = make_server(args.host, args.port, app, threaded=True)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"serving on http://{args.host}:{server.server_port} (wsgi)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        shutdown(app)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1, help="processes (ASGI only)")
+    parser.add_argument("--threads", type=int, default=32, help="requests running at once per worker (ASGI only)")
+    parser.add_argument("--streams", type=int, default=256, help="open event streams per worker, on threads of their own (ASGI only)")
+    parser.add_argument("--graceful-timeout", type=int, default=10)
+    parser.add_argument("--access-log", action="store_true")
+    parser.add_argument("--wsgi", action="store_true", help="threaded werkzeug server instead of ASGI")
+    args = parser.parse_args()
+    if args.wsgi:
+        serve_wsgi(args)
+    else:
+        serve_asgi(args)
+
+
+if __name__ == "__main__":
+    main()
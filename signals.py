@@ -0,0 +1,9 @@
+# Application signals. Senders pass the Flask app, so listeners registered
+# with `connect(..., sender=app)` only hear about their own app instance.
+from blinker import Namespace
+
+_signals = Namespace()
+
+# sent after a user's position is committed (or removed, with latitude and
+# longitude None); extra keyword arguments carry username/full_name if known
+location_changed = _signals.signal("location-changed")
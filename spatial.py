@@ -0,0 +1,191 @@
+# Spatial queries over user locations, backed by the user_locations R*Tree
+# and the location_grid indexes that db_init creates and keeps in sync with
+# user_profiles.
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+# Uniform grid: 0.1 degree cells (~11 km north-south), numbered row-major so
+# that one row of cells is a contiguous range of the location_grid.cell index.
+GRID_CELL_DEG = 0.1
+GRID_ROWS = 1800
+GRID_COLS = 3600
+
+BBOX_QUERY = (
+    "SELECT p.id, p.username, p.full_name, p.latitude, p.longitude "
+    "FROM user_locations AS l JOIN user_profiles AS p ON p.id = l.id "
+    "WHERE l.max_lat >= ? AND l.min_lat <= ? AND l.max_lng >= ? AND l.min_lng <= ? "
+    # R*Tree boxes are float32 and rounded outwards, so re-check the exact values
+    "AND p.latitude BETWEEN ? AND ? AND p.longitude BETWEEN ? AND ?"
+)
+# the same search returning only (id, latitude, longitude), for columnar encoding
+BBOX_POSITIONS_QUERY = (
+    "SELECT p.id, p.latitude, p.longitude "
+    "FROM user_locations AS l JOIN user_profiles AS p ON p.id = l.id "
+    "WHERE l.max_lat >= ? AND l.min_lat <= ? AND l.max_lng >= ? AND l.min_lng <= ? "
+    "AND p.latitude BETWEEN ? AND ? AND p.longitude BETWEEN ? AND ?"
+)
+
+# Web Mercator stops at ~85.05 degrees, like the map tiles
+MERCATOR_MAX_LAT = 85.0511287798
+
+GRID_QUERY = (
+    "SELECT p.id, p.username, p.full_name, p.latitude, p.longitude "
+    "FROM location_grid AS g JOIN user_profiles AS p ON p.id = g.user_id "
+    "WHERE g.cell BETWEEN ? AND ?"
+)
+
+
+def parse_bbox(value):
+    # "west,south,east,north" as produced by Leaflet's LatLngBounds.toBBoxString()
+    if not value:
+        return None
+    try:
+        west, south, east, north = (float(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError("bbox must be 'west,south,east,north'")
+    if not (-90 <= south <= north <= 90) or not (-180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError("bbox out of range")
+    return west, south, east, north
+
+
+def in_bbox(bbox, lat, lng):
+    west, south, east, north = bbox
+    if not south <= lat <= north:
+        return False
+    if west <= east:
+        return west <= lng <= east
+    return lng >= west or lng <= east  # crosses the antimeridian
+
+
+def users_in_bbox(db, bbox, query=BBOX_QUERY):
+    west, south, east, north = bbox
+    # a viewport crossing the antimeridian is split into two ranges
+    if west > east:
+        ranges = [(west, 180.0), (-180.0, east)]
+    else:
+        ranges = [(west, east)]
+    users = []
+    cur = db.cursor()
+    for lo, hi in ranges:
+        cur.execute(query, (south, north, lo, hi, south, north, lo, hi))
+        users.extend(cur.fetchall())
+    return users
+
+
+def web_mercator(lat, lng):
+    # normalised Web Mercator position: x, y in [0, 1], y growing southwards
+    lat = max(min(lat, MERCATOR_MAX_LAT), -MERCATOR_MAX_LAT)
+    sin_lat = math.sin(math.radians(lat))
+    x = (lng + 180) / 360
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+
+
+def _grid_row(lat):
+    return min(int((lat + 90) / GRID_CELL_DEG), GRID_ROWS - 1)
+
+
+def _grid_col(lng):
+    return min(int((lng + 180) / GRID_CELL_DEG), GRID_COLS - 1)
+
+
+def grid_cell(lat, lng):
+    return _grid_row(lat) * GRID_COLS + _grid_col(lng)
+
+
+def grid_cell_sql(lat, lng):
+    # SQL expression computing the same cell as grid_cell(), used by the
+    # location_grid triggers; CAST truncates like int() for non-negative values
+    return (
+        f"MIN(CAST(({lat} + 90) / {GRID_CELL_DEG} AS INTEGER), {GRID_ROWS - 1}) * {GRID_COLS} "
+        f"+ MIN(CAST(({lng} + 180) / {GRID_CELL_DEG} AS INTEGER), {GRID_COLS - 1})"
+    )
+
+
+def haversine_km(lat, lng, lats, lngs):
+    # great-circle distance from one point to arrays of points
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _grid_candidates(db, lat, lng, radius_km):
+    # rows/columns of cells that cover the circle around (lat, lng)
+    dlat = radius_km / KM_PER_DEG_LAT
+    lat_lo, lat_hi = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    # meridians converge, so size the longitude span for the widest latitude
+    cos_lat = math.cos(math.radians(max(abs(lat_lo), abs(lat_hi))))
+    if cos_lat * KM_PER_DEG_LAT * 180 <= radius_km:
+        col_ranges = [(0, GRID_COLS - 1)]
+    else:
+        dlng = radius_km / (KM_PER_DEG_LAT * cos_lat)
+        first = int(math.floor((lng - dlng + 180) / GRID_CELL_DEG))
+        last = int(math.floor((lng + dlng + 180) / GRID_CELL_DEG))
+        if last - first + 1 >= GRID_COLS:
+            col_ranges = [(0, GRID_COLS - 1)]
+        elif first < 0:
+            col_ranges = [(first + GRID_COLS, GRID_COLS - 1), (0, last)]
+        elif last >= GRID_COLS:
+            col_ranges = [(first, GRID_COLS - 1), (0, last - GRID_COLS)]
+        else:
+            col_ranges = [(first, last)]
+
+    rows = []
+    cur = db.cursor()
+    for row in range(_grid_row(lat_lo), _grid_row(lat_hi) + 1):
+        for first, last in col_ranges:
+            cur.execute(GRID_QUERY, (row * GRID_COLS + first, row * GRID_COLS + last))
+            rows.extend(cur.fetchall())
+    return rows
+
+
+def _within_radius(db, lat, lng, radius_km, exclude_id):
+    rows = [r for r in _grid_candidates(db, lat, lng, radius_km) if r[0] != exclude_id]
+    if not rows:
+        return [], np.empty(0)
+    coords = np.array([(r[3], r[4]) for r in rows], dtype=float)
+    distances = haversine_km(lat, lng, coords[:, 0], coords[:, 1])
+    keep = np.flatnonzero(distances <= radius_km)
+    order = keep[np.argsort(distances[keep], kind="stable")]
+    return [rows[i] for i in order], distances[order]
+
+
+def nearby_users(db, lat, lng, k=None, radius_km=None, exclude_id=None):
+    # Users within radius_km of (lat, lng) and/or the k nearest, closest
+    # first. Only grid cells around the point are read, so the cost follows
+    # the local density rather than the total number of users.
+    if radius_km is not None:
+        rows, distances = _within_radius(db, lat, lng, radius_km, exclude_id)
+    else:
+        # k nearest: grow the search circle until it holds k users; anything
+        # outside the circle is farther than everything inside it
+        radius = GRID_CELL_DEG * KM_PER_DEG_LAT
+        while True:
+            rows, distances = _within_radius(db, lat, lng, radius, exclude_id)
+            if len(rows) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                break
+            radius *= 2
+    if k is not None:
+        rows, distances = rows[:k], distances[:k]
+    return [(row, float(d)) for row, d in zip(rows, distances)]
+
+
+def rank_nearby(lat, lng, users, k=None, radius_km=None):
+    # nearby_users() over rows already in memory (dicts with latitude and
+    # longitude): [(user, distance_km)], closest first
+    if not users:
+        return []
+    distances = haversine_km(lat, lng, np.array([u["latitude"] for u in users], dtype=float),
+                             np.array([u["longitude"] for u in users], dtype=float))
+    order = np.argsort(distances, kind="stable")
+    if radius_km is not None:
+        order = order[distances[order] <= radius_km]
+    if k is not None:
+        order = order[:k]
+    return [(users[i], float(distances[i])) for i in order]
@@ -0,0 +1,39 @@
+import sqlite3
+import pytest
+from datetime import datetime
+from werkzeug.security import generate_password_hash
+from app import create_app
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": str(tmp_path / "test.db"),
+        "RATE_LIMIT_ENABLED": False,  # covered by test_ratelimit
+    })
+    yield app
+    app.extensions["password_hasher"].close()
+
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as c:
+        yield c
+
+
+@pytest.fixture
+def add_user(app):
+    # insert a user row directly, bypassing the (slow) password hashing routes
+    def _add_user(username, latitude=None, longitude=None, password=None, is_admin=0):
+        conn = sqlite3.connect(app.config["DATABASE"])
+        password_hash = generate_password_hash(password) if password else None
+        cur = conn.execute(
+            "INSERT INTO user_profiles (username, email, password_hash, full_name, latitude, longitude, is_admin, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (username, f"{username}@example.com", password_hash, username.title(), latitude, longitude, is_admin, datetime.utcnow().isoformat()),
+        )
+        conn.commit()
+        conn.close()
+        return cur.lastrowid
+
+    return _add_user
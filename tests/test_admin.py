@@ -0,0 +1,114 @@
+import re
+import sqlite3
+import repository
+
+
+def _login_admin(client, add_user):
+    add_user("admin", password="pw", is_admin=1)
+    rv = client.post("/profiles/login", json={"username": "admin", "password": "pw"})
+    assert rv.status_code == 200
+
+
+def _usernames(html):
+    return re.findall(r"<td>([^<]+?)(?: \(ADMIN\))?</td>\s*<td>[^<]*@", html)
+
+
+def _next_link(html):
+    match = re.search(r'href="(/profiles/admin\?[^"]*after_id=[^"]*)">Next page', html)
+    return match.group(1).replace("&amp;", "&") if match else None
+
+
+def test_admin_pages_follow_next_links(client, add_user):
+    _login_admin(client, add_user)
+    for name in ["carol", "Bob", "dave", "alice", "erin"]:
+        add_user(name)
+
+    url = "/profiles/admin?sort=username&order=asc&limit=2"
+    seen = []
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        seen += _usernames(html)
+        url = _next_link(html)
+    assert seen == ["admin", "alice", "Bob", "carol", "dave", "erin"]
+
+
+def test_admin_pages_reach_users_without_a_date(client, add_user, app):
+    _login_admin(client, add_user)
+    for i in range(4):
+        add_user(f"dated{i}")
+    undated = [add_user(f"undated{i}") for i in range(3)]
+    conn = sqlite3.connect(app.config["DATABASE"])
+    conn.executemany("UPDATE user_profiles SET created_at = NULL WHERE id = ?", [(i,) for i in undated])
+    conn.commit()
+    conn.close()
+
+    for order, expected in [
+        ("desc", ["dated3", "dated2", "dated1", "dated0", "admin", "undated2", "undated1", "undated0"]),
+        ("asc", ["undated0", "undated1", "undated2", "admin", "dated0", "dated1", "dated2", "dated3"]),
+    ]:
+        url, seen = f"/profiles/admin?order={order}&limit=3", []
+        while url:
+            html = client.get(url).get_data(as_text=True)
+            seen += _usernames(html)
+            url = _next_link(html)
+        assert seen == expected, order
+
+
+def test_admin_search_by_prefix(client, add_user):
+    _login_admin(client, add_user)
+    for name in ["driver1", "Driver2", "rider"]:
+        add_user(name)
+
+    html = client.get("/profiles/admin?q=DRI&sort=id&order=asc").get_data(as_text=True)
+    assert _usernames(html) == ["driver1", "Driver2"]
+    html = client.get("/profiles/admin?q=rider@").get_data(as_text=True)
+    assert _usernames(html) == ["rider"]
+
+
+def test_admin_rejects_bad_parameters(client, add_user):
+    _login_admin(client, add_user)
+    assert client.get("/profiles/admin?sort=password_hash").status_code == 400
+    assert client.get("/profiles/admin?limit=0").status_code == 400
+    assert client.get("/profiles/admin?after_id=3").status_code == 400
+
+
+def test_admin_edit_rejects_bad_positions(client, add_user, app):
+    _login_admin(client, add_user)
+    uid = add_user("driver", 21.3, -157.8)
+    for lat, lng in (("nan", "0"), ("inf", "0"), ("1000", "0"), ("0", "-181"), ("abc", "0")):
+        rv = client.post(f"/profiles/admin/edit/{uid}", data={"email": "d@example.com", "latitude": lat, "longitude": lng})
+        assert rv.status_code == 400
+    conn = sqlite3.connect(app.config["DATABASE"])
+    assert conn.execute("SELECT email, latitude FROM user_profiles WHERE id = ?", (uid,)).fetchone() == ("driver@example.com", 21.3)
+    conn.close()
+
+
+def test_list_admin_page_keyset_with_ties(app, add_user):
+    ids = [add_user(f"user{i}") for i in range(7)]
+    conn = sqlite3.connect(app.config["DATABASE"])
+    conn.row_factory = sqlite3.Row
+    conn.execute("UPDATE user_profiles SET created_at = '2024-01-01'")  # every key ties
+
+    seen, after, after_id = [], None, None
+    while True:
+        rows = repository.list_admin_page(conn, "created_at", True, after=after, after_id=after_id, limit=3).fetchall()
+        if not rows:
+            break
+        seen += [r["id"] for r in rows]
+        after, after_id = rows[-1]["sort_key"], rows[-1]["id"]
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_list_admin_page_uses_indexes(app):
+    conn = sqlite3.connect(app.config["DATABASE"])
+    statements = []
+    conn.set_trace_callback(statements.append)  # SQL with parameters expanded
+    for sort in repository.ADMIN_SORT_KEYS:
+        for descending in (True, False):
+            statements.clear()
+            repository.list_admin_page(conn, sort, descending, after="m", after_id=5, limit=10)
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + statements[-1])]
+            # every table access is an index seek; any sorting is of the
+            # two page-sized branches of the keyset union only
+            assert all(step.startswith("SEARCH") for step in plan if "user_profiles" in step), (sort, plan)
+            assert "MERGE (UNION ALL)" in plan or "USE TEMP B-TREE FOR ORDER BY" not in plan, (sort, plan)
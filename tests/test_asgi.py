@@ -0,0 +1,195 @@
+import asyncio
+import json
+import sqlite3
+import time
+import pytest
+from app import create_app
+from asgi import AsgiAdapter
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": str(tmp_path / "test.db"),
+        "RATE_LIMIT_ENABLED": False,
+        "LOCATION_BUFFER_ENABLED": True,
+        "LOCATION_FLUSH_INTERVAL": 3600,  # only shutdown flushes
+        "STREAM_KEEPALIVE_SECONDS": 0.05,
+    })
+    yield app
+    app.extensions["password_hasher"].close()
+
+
+def _call(adapter, method, path, body=b"", headers=(), max_chunks=None):
+    # drive one request; with max_chunks the client disconnects after that
+    # many body chunks
+    async def run():
+        sent = []
+        disconnect = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            chunks = [m for m in sent if m["type"] == "http.response.body" and m["body"]]
+            if max_chunks and len(chunks) >= max_chunks:
+                disconnect.set()
+
+        path_only, _, query = path.partition("?")
+        scope = {
+            "type": "http", "method": method, "path": path_only, "query_string": query.encode(),
+            "http_version": "1.1", "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 1234),
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        }
+        await asyncio.wait_for(adapter(scope, receive, send), 10)
+        return sent
+
+    sent = asyncio.run(run())
+    start = sent[0]
+    assert start["type"] == "http.response.start"
+    assert not sent[-1].get("more_body") or max_chunks
+    return start["status"], dict(start["headers"]), b"".join(m["body"] for m in sent[1:])
+
+
+def test_requests_run_through_the_flask_app(app, add_user):
+    adapter = AsgiAdapter(app, threads=2)
+    user_id = add_user("ann", 21.3, -157.8)
+    status, headers, body = _call(adapter, "GET", f"/profiles/{user_id}")
+    assert status == 200 and headers[b"content-type"] == b"application/json"
+    assert json.loads(body)["username"] == "ann"
+
+    payload = json.dumps({"username": "bo", "email": "bo@example.com", "password": "pw"}).encode()
+    status, _, body = _call(adapter, "POST", "/profiles/register", payload, [("Content-Type", "application/json")])
+    assert status == 201 and json.loads(body)["user_id"]
+
+    status, _, body = _call(adapter, "GET", "/profiles/?limit=1&fields=username")
+    assert json.loads(body)["profiles"] == [{"id": user_id, "username": "ann"}]
+
+
+def test_streams_are_sent_incrementally_and_stop_on_disconnect(app):
+    adapter = AsgiAdapter(app, threads=2)
+    status, headers, body = _call(adapter, "GET", "/profiles/stream", max_chunks=2)
+    assert status == 200 and headers[b"content-type"].startswith(b"text/event-stream")
+    assert body.startswith(b": connected\n\n: keepalive")
+    assert app.extensions["location_hub"].stats()["subscribers"] == 0
+
+
+def test_closed_streams_free_their_thread_at_once(app):
+    # a stream ends when its client leaves, not at its next keepalive, and
+    # streams never wait for or hold up the request pool
+    app.config["STREAM_KEEPALIVE_SECONDS"] = 30
+    adapter = AsgiAdapter(app, threads=1, streams=1)
+    accept = [("Accept", "text/event-stream")]
+    started = time.perf_counter()
+    for _ in range(3):
+        status, _, body = _call(adapter, "GET", "/profiles/stream", headers=accept, max_chunks=1)
+        assert status == 200 and body == b": connected\n\n"
+    assert time.perf_counter() - started < 5
+    assert app.extensions["location_hub"].stats()["subscribers"] == 0
+
+    async def one_stream_open():
+        leave = asyncio.Event()
+        opened = asyncio.Event()
+
+        async def receive():
+            if not opened.is_set():
+                opened.set()
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await leave.wait()
+            return {"type": "http.disconnect"}
+
+        async def discard(message):
+            pass
+
+        scope = {
+            "type": "http", "method": "GET", "path": "/profiles/stream", "query_string": b"",
+            "http_version": "1.1", "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 1234),
+            "headers": [(b"accept", b"text/event-stream")],
+        }
+        stream = asyncio.ensure_future(adapter(scope, receive, discard))
+        await opened.wait()
+        await asyncio.sleep(0.1)
+        sent = []
+
+        async def collect(message):
+            sent.append(message)
+
+        requests = iter([{"type": "http.request", "body": b"", "more_body": False}])
+        await asyncio.wait_for(adapter(scope, lambda: _next(requests), collect), 5)
+        assert sent[0]["status"] == 503
+        sent.clear()
+        requests = iter([{"type": "http.request", "body": b"", "more_body": False}])
+        plain = dict(scope, path="/profiles/test", headers=[])
+        await asyncio.wait_for(adapter(plain, lambda: _next(requests), collect), 5)
+        assert sent[0]["status"] == 200
+        leave.set()
+        await asyncio.wait_for(stream, 5)
+
+    asyncio.run(one_stream_open())
+
+
+def test_oversized_bodies_are_rejected(app):
+    app.config["MAX_CONTENT_LENGTH"] = 1000
+    adapter = AsgiAdapter(app, threads=1)
+    status, _, _ = _call(adapter, "POST", "/profiles/", b"x" * 2000, [("Content-Length", "2000")])
+    assert status == 413
+
+    async def chunked():
+        # no Content-Length: reading stops as soon as the limit is passed
+        sent, reads = [], []
+
+        async def receive():
+            reads.append(1)
+            return {"type": "http.request", "body": b"x" * 400, "more_body": True}
+
+        async def collect(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http", "method": "POST", "path": "/profiles/", "query_string": b"",
+            "http_version": "1.1", "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 1234),
+            "headers": [(b"content-type", b"application/json")],
+        }
+        await asyncio.wait_for(adapter(scope, receive, collect), 5)
+        return sent, reads
+
+    sent, reads = asyncio.run(chunked())
+    assert sent[0]["status"] == 413 and len(reads) == 3
+
+
+async def _next(messages):
+    # request messages, then a client that stays connected
+    for message in messages:
+        return message
+    await asyncio.Event().wait()
+
+
+def test_lifespan_shutdown_flushes_buffered_positions(app, add_user):
+    adapter = AsgiAdapter(app, threads=2)
+    user_id = add_user("ann", 1.0, 2.0)
+    app.extensions["location_buffer"].put(user_id, 21.3, -157.8)
+
+    async def lifespan():
+        messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        await adapter({"type": "lifespan"}, receive, send)
+        return sent
+
+    assert asyncio.run(lifespan()) == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    conn = sqlite3.connect(app.config["DATABASE"])
+    assert conn.execute("SELECT latitude, longitude FROM user_profiles WHERE id = ?", (user_id,)).fetchone() == (21.3, -157.8)
@@ -0,0 +1,85 @@
+import sqlite3
+import time
+from app import create_app
+
+T0 = int(time.time()) - 3600
+
+
+def _login(client, user_id):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+
+def _stored(app, user_id):
+    conn = sqlite3.connect(app.config["DATABASE"])
+    row = conn.execute("SELECT latitude, longitude FROM user_profiles WHERE id = ?", (user_id,)).fetchone()
+    conn.close()
+    return row
+
+
+def test_batch_needs_login_and_a_list(client):
+    assert client.post("/profiles/locations:batch", json={"locations": []}).status_code == 401
+    _login(client, 1)
+    assert client.post("/profiles/locations:batch", json={"locations": []}).status_code == 400
+    too_many = [[1, 0.0, 0.0]] * 1001
+    assert client.post("/profiles/locations:batch", json={"locations": too_many}).status_code == 400
+
+
+def test_items_get_their_own_status(app, client, add_user):
+    me = add_user("me")
+    other = add_user("other", 5.0, 6.0)
+    _login(client, me)
+    rv = client.post("/profiles/locations:batch", json={"locations": [
+        {"user_id": me, "latitude": 21.3, "longitude": -157.8, "ts": T0},
+        [other, 1.0, 2.0],
+        [me, 91.0, 0.0],
+        "nonsense",
+        [me, 1.0, 2.0, 1e20],
+    ]})
+    assert rv.status_code == 200
+    body = rv.get_json()
+    assert [r["status"] for r in body["results"]] == [200, 403, 400, 400, 400]
+    assert body["applied"] == 1
+    assert _stored(app, me) == (21.3, -157.8)
+    assert _stored(app, other) == (5.0, 6.0)
+    assert client.get(f"/profiles/{me}").get_json()["latitude"] == 21.3
+
+
+def test_admin_updates_a_convoy_in_one_request(app, client, add_user):
+    admin = add_user("lead", is_admin=1)
+    drivers = [add_user(f"driver{i}", 0.0, 0.0) for i in range(3)]
+    _login(client, admin)
+    client.get(f"/profiles/{drivers[0]}")  # cached before the update
+
+    locations = [[d, 10.0 + i, 20.0, T0 + i] for i, d in enumerate(drivers)]
+    locations += [[drivers[0], 30.0, 40.0, T0 + 10], [999999, 1.0, 1.0]]
+    rv = client.post("/profiles/locations:batch", json={"locations": locations})
+    assert [r["status"] for r in rv.get_json()["results"]] == [200, 200, 200, 200, 404]
+    # later items for the same user win; every fix is kept in the history
+    assert _stored(app, drivers[0]) == (30.0, 40.0)
+    assert _stored(app, drivers[2]) == (12.0, 20.0)
+    assert client.get(f"/profiles/{drivers[0]}").get_json()["latitude"] == 30.0
+    track = client.get(f"/profiles/{drivers[0]}/track?from={T0}&to={T0 + 100}").get_json()
+    assert len(track["points"]) == 2
+
+
+def test_batches_go_through_the_ingest_buffer_when_enabled(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": str(tmp_path / "test.db"),
+        "RATE_LIMIT_ENABLED": False,
+        "LOCATION_BUFFER_ENABLED": True,
+        "LOCATION_FLUSH_INTERVAL": 3600,
+    })
+    conn = sqlite3.connect(app.config["DATABASE"])
+    me = conn.execute("INSERT INTO user_profiles (username, email) VALUES ('me', 'me@example.com')").lastrowid
+    conn.commit()
+    client = app.test_client()
+    _login(client, me)
+    rv = client.post("/profiles/locations:batch", json={"locations": [[me, 1.0, 2.0], [me, 3.0, 4.0]]})
+    assert rv.get_json()["applied"] == 2
+    assert _stored(app, me) == (None, None)
+    assert client.get(f"/profiles/{me}").get_json()["latitude"] == 3.0
+    app.extensions["location_buffer"].close()
+    assert _stored(app, me) == (3.0, 4.0)
+    app.extensions["password_hasher"].close()
@@ -0,0 +1,113 @@
+import sqlite3
+import changelog
+import db
+from app import create_app
+
+
+def _login(client, user_id):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+
+def _changes(client, since, **args):
+    query = "".join(f"&{key}={value}" for key, value in args.items())
+    rv = client.get(f"/profiles/map/changes?since={since}{query}")
+    assert rv.status_code == 200, rv.get_json()
+    body = rv.get_json()
+    return body, [u["id"] for u in body["inserted"]], [u["id"] for u in body["moved"]], body["removed"]
+
+
+def test_changes_since_a_version(client, add_user):
+    driver, parked = add_user("driver", 21.3, -157.8), add_user("parked", 21.4, -157.9)
+    add_user("unlocated")
+    body, inserted, moved, removed = _changes(client, 0)
+    assert (inserted, moved, removed, body["more"]) == ([driver, parked], [], [], False)
+    version = body["version"]
+    assert f"var mapVersion = {version};" in client.get("/profiles/map").get_data(as_text=True)
+    assert _changes(client, version)[0] == {"version": version, "inserted": [], "moved": [], "removed": [], "more": False}
+
+    _login(client, driver)
+    client.put(f"/profiles/{driver}", json={"latitude": 21.31, "longitude": -157.81})
+    client.put(f"/profiles/{driver}", json={"latitude": 21.32, "longitude": -157.82})
+    client.put(f"/profiles/{driver}", json={"vehicle_type": "truck"})  # not shown on the map
+    newcomer = add_user("newcomer", 21.5, -157.7)
+    body, inserted, moved, removed = _changes(client, version)
+    assert (inserted, moved, removed) == ([newcomer], [driver], [])
+    assert body["moved"][0]["latitude"] == 21.32  # each user once, in their latest state
+    assert body["version"] > version
+
+    admin = add_user("admin", is_admin=1)
+    _login(client, admin)
+    version = body["version"]
+    client.post(f"/profiles/admin/edit/{parked}", data={"email": "p@example.com", "full_name": "Parked", "latitude": "", "longitude": ""})
+    client.get(f"/profiles/admin/delete/{newcomer}")
+    assert _changes(client, version)[1:] == ([], [], [parked, newcomer])
+
+    # back on the map counts as inserted again
+    version = _changes(client, version)[0]["version"]
+    client.post(f"/profiles/admin/edit/{parked}", data={"email": "p@example.com", "full_name": "Back", "latitude": "1", "longitude": "2"})
+    body, inserted, moved, removed = _changes(client, version)
+    assert inserted == [parked] and body["inserted"][0]["full_name"] == "Back"
+
+
+def test_changes_are_paged_and_filtered_by_viewport(client, add_user):
+    inside = [add_user(f"in{i}", 21.3, -157.8 + i * 0.01) for i in range(3)]
+    outside = add_user("outside", 40.0, -74.0)
+    body, inserted, _, _ = _changes(client, 0, limit=2)
+    assert inserted == inside[:2] and body["more"]
+    body, inserted, _, _ = _changes(client, body["version"], limit=2)
+    assert inserted == [inside[2], outside] and body["more"]
+
+    version = body["version"]
+    _login(client, inside[0])
+    client.put(f"/profiles/{inside[0]}", json={"latitude": 40.0, "longitude": -74.1})
+    _login(client, outside)
+    client.put(f"/profiles/{outside}", json={"latitude": 21.31, "longitude": -157.8})
+    # inside[0] left the viewport, outside entered it
+    assert _changes(client, version, bbox="-158,21,-157,22")[2:] == ([outside], [inside[0]])
+
+
+def test_changes_rejects_bad_versions(client):
+    assert client.get("/profiles/map/changes").status_code == 400
+    assert client.get("/profiles/map/changes?since=-1").status_code == 400
+    assert client.get("/profiles/map/changes?since=0&limit=0").status_code == 400
+    assert client.get("/profiles/map/changes?since=99").status_code == 410
+
+
+def test_buffered_positions_are_logged_when_flushed(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": str(tmp_path / "buffered.db"),
+        "RATE_LIMIT_ENABLED": False,
+        "LOCATION_BUFFER_ENABLED": True,
+        "LOCATION_FLUSH_INTERVAL": 3600,
+    })
+    client = app.test_client()
+    uid = client.post("/profiles/", json={"username": "gps", "email": "gps@example.com", "password": "pw"}).get_json()["id"]
+    _login(client, uid)
+    client.put(f"/profiles/{uid}", json={"latitude": 1.0, "longitude": 2.0})
+    assert _changes(client, 0)[1] == []
+    app.extensions["location_buffer"].flush()
+    body, inserted, _, _ = _changes(client, 0)
+    assert inserted == [uid] and body["inserted"][0]["latitude"] == 1.0
+    app.extensions["location_buffer"].close()
+    app.extensions["password_hasher"].close()
+
+
+def test_log_is_backfilled_and_read_by_index(tmp_path):
+    conn = sqlite3.connect(tmp_path / "old.db")
+    # a database from before the change log
+    conn.execute(
+        "CREATE TABLE user_profiles (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, "
+        "email TEXT UNIQUE NOT NULL, full_name TEXT, vehicle_type TEXT, latitude REAL, longitude REAL, created_at TEXT)"
+    )
+    conn.executemany("INSERT INTO user_profiles (username, email, latitude, longitude) VALUES (?, ?, ?, ?)",
+                     [("a", "a@x", 1.0, 2.0), ("b", "b@x", None, None), ("c", "c@x", 3.0, 4.0)])
+    db.init_schema(conn)
+    assert conn.execute("SELECT user_id, version, added FROM map_changes ORDER BY version").fetchall() == [(1, 1, 1), (3, 3, 3)]
+    conn.execute("UPDATE user_profiles SET latitude = 5.0 WHERE id = 3")
+    assert conn.execute("SELECT version, added FROM map_changes WHERE user_id = 3").fetchone() == (4, 3)
+
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + changelog.SELECT_CHANGES, (0, 10))]
+    assert not any(step.startswith("SCAN") for step in plan), plan
+    conn.close()
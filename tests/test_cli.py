@@ -0,0 +1,95 @@
+import json
+import sqlite3
+from werkzeug.security import check_password_hash
+
+
+def _rows(app, sql):
+    conn = sqlite3.connect(app.config["DATABASE"])
+    conn.row_factory = sqlite3.Row
+    return conn.execute(sql).fetchall()
+
+
+def test_import_csv_hashes_passwords_and_indexes_locations(app, tmp_path):
+    source = tmp_path / "fleet.csv"
+    source.write_text(
+        "username,email,password,full_name,latitude,longitude,is_admin\n"
+        "ann,ann@example.com,pw1,Ann,21.3,-157.8,\n"
+        "bo,bo@example.com,,,,,yes\n"
+    )
+    result = app.test_cli_runner().invoke(args=["users", "import", str(source), "--chunk-size", "1", "--defer-indexes"])
+    assert result.exit_code == 0, result.output
+    assert "imported 2 rows" in result.output
+
+    ann, bo = _rows(app, "SELECT * FROM user_profiles ORDER BY id")
+    assert check_password_hash(ann["password_hash"], "pw1")
+    assert (ann["latitude"], ann["is_admin"], ann["created_at"] is not None) == (21.3, 0, True)
+    assert (bo["password_hash"], bo["full_name"], bo["latitude"], bo["is_admin"]) == (None, None, None, 1)
+    # spatial triggers and the rebuilt secondary indexes are in place
+    assert [r[0] for r in _rows(app, "SELECT id FROM user_locations")] == [ann["id"]]
+    indexes = {r[0] for r in _rows(app, "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_user_profiles_created_at_key", "idx_location_grid_cell"} <= indexes
+
+
+def test_import_rejects_duplicates_unless_skipped(app, add_user, tmp_path):
+    add_user("ann")
+    source = tmp_path / "fleet.ndjson"
+    source.write_text(json.dumps({"username": "ann", "email": "ann@example.com"}) + "\n"
+                      + json.dumps({"username": "cy", "email": "cy@example.com"}) + "\n")
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["users", "import", str(source)])
+    assert result.exit_code != 0 and "UNIQUE constraint failed" in result.output
+
+    result = runner.invoke(args=["users", "import", str(source), "--skip-existing"])
+    assert result.exit_code == 0, result.output
+    assert "skipped 1 existing rows" in result.output
+    assert [r[0] for r in _rows(app, "SELECT username FROM user_profiles ORDER BY id")] == ["ann", "cy"]
+
+
+def test_import_rejects_bad_records(app, tmp_path):
+    runner = app.test_cli_runner()
+    for line in ('["ann", "ann@example.com"]',
+                 '{"username": "ann", "email": "ann@example.com", "latitude": 91, "longitude": 0}',
+                 '{"username": "ann", "email": "ann@example.com", "latitude": "NaN", "longitude": 0}',
+                 '{"username": "ann", "email": "ann@example.com", "latitude": [1], "longitude": 0}'):
+        source = tmp_path / "bad.ndjson"
+        source.write_text(line + "\n")
+        result = runner.invoke(args=["users", "import", str(source)])
+        assert result.exit_code == 1 and "Error: in the chunk starting at row 1" in result.output, result.output
+    assert _rows(app, "SELECT * FROM user_profiles") == []
+
+
+def test_imported_users_reach_the_map(app, client, tmp_path):
+    world = "/profiles/map/clusters?z=2&bbox=-180,-85,180,85"
+    assert client.get(world).get_json()["clusters"] == []  # loads the index
+    source = tmp_path / "fleet.csv"
+    source.write_text("username,email,latitude,longitude\nann,ann@example.com,21.3,-157.8\n")
+    assert app.test_cli_runner().invoke(args=["users", "import", str(source)]).exit_code == 0
+    assert [c["username"] for c in client.get(world).get_json()["clusters"]] == ["ann"]
+
+
+def test_export_round_trips_through_import(app, add_user, tmp_path):
+    add_user("ann", 21.3, -157.8, password="pw")
+    target = tmp_path / "users.csv"
+    result = app.test_cli_runner().invoke(args=["users", "export", str(target), "--include-password-hash"])
+    assert result.exit_code == 0, result.output
+    header, row = target.read_text().splitlines()
+    assert header.startswith("id,username,email") and header.endswith(",password_hash")
+
+    ndjson = app.test_cli_runner().invoke(args=["users", "export", "--format", "ndjson"])
+    assert json.loads(ndjson.stdout.splitlines()[0])["username"] == "ann"
+
+    sqlite3.connect(app.config["DATABASE"]).execute("DELETE FROM user_profiles").connection.commit()
+    assert app.test_cli_runner().invoke(args=["users", "import", str(target)]).exit_code == 0
+    (ann,) = _rows(app, "SELECT * FROM user_profiles")
+    assert ann["latitude"] == 21.3 and check_password_hash(ann["password_hash"], "pw")
+
+
+def test_create_and_set_password(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["users", "create", "root", "root@example.com", "--admin", "--password", "old"])
+    assert result.exit_code == 0, result.output
+    assert runner.invoke(args=["users", "create", "root", "x@example.com", "--password", "pw"]).exit_code != 0
+    assert runner.invoke(args=["users", "set-password", "root", "--password", "new"]).exit_code == 0
+    (root,) = _rows(app, "SELECT * FROM user_profiles")
+    assert root["is_admin"] == 1 and check_password_hash(root["password_hash"], "new")
+    assert runner.invoke(args=["users", "set-password", "nobody", "--password", "x"]).exit_code != 0
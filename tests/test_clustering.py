@@ -0,0 +1,99 @@
+import random
+import sqlite3
+from clustering import ClusterIndex
+
+WORLD = (-180.0, -85.0, 180.0, 85.0)
+
+
+def test_low_zoom_aggregates_and_high_zoom_separates():
+    index = ClusterIndex(max_zoom=14)
+    index.loaded = True
+    index.update(1, 21.30, -157.85, username="a")
+    index.update(2, 21.31, -157.86, username="b")
+    index.update(3, 40.71, -74.00, username="c")
+
+    clusters = sorted(index.query(3, WORLD), key=lambda c: -c["count"])
+    assert [c["count"] for c in clusters] == [2, 1]
+    assert abs(clusters[0]["latitude"] - 21.305) < 1e-9
+    assert clusters[1]["id"] == 3 and clusters[1]["username"] == "c"
+
+    honolulu = (-158.0, 21.2, -157.7, 21.4)
+    assert sorted(c["id"] for c in index.query(14, honolulu)) == [1, 2]
+
+
+def test_incremental_updates_match_a_full_rebuild():
+    rng = random.Random(3)
+    incremental = ClusterIndex(max_zoom=10)
+    incremental.loaded = True
+    positions = {}
+    for step in range(2000):
+        uid = rng.randrange(200)
+        if rng.random() < 0.1:
+            positions.pop(uid, None)
+            incremental.update(uid, None, None)
+        else:
+            positions[uid] = (rng.uniform(20, 22), rng.uniform(-159, -157))
+            incremental.update(uid, *positions[uid])
+
+    rebuilt = ClusterIndex(max_zoom=10)
+    rebuilt.loaded = True
+    for uid, (lat, lng) in positions.items():
+        rebuilt.update(uid, lat, lng)
+    for zoom in (0, 5, 10):
+        got = sorted((c["count"], round(c["latitude"], 9)) for c in incremental.query(zoom, WORLD))
+        want = sorted((c["count"], round(c["latitude"], 9)) for c in rebuilt.query(zoom, WORLD))
+        assert got == want
+
+
+def test_clusters_endpoint_follows_profile_updates(client, add_user):
+    uid = add_user("mover", 21.3, -157.8, password="pw")
+    add_user("other", 21.3, -157.8)
+    rv = client.get("/profiles/map/clusters?z=2&bbox=-180,-85,180,85")
+    assert [c["count"] for c in rv.get_json()["clusters"]] == [2]
+
+    client.post("/profiles/login", json={"username": "mover", "password": "pw"})
+    client.put(f"/profiles/{uid}", json={"latitude": 40.7, "longitude": -74.0})
+    rv = client.get("/profiles/map/clusters?z=2&bbox=-180,-85,180,85")
+    assert sorted(c["count"] for c in rv.get_json()["clusters"]) == [1, 1]
+
+    # beyond the clustering zooms every user comes back individually
+    rv = client.get("/profiles/map/clusters?z=18&bbox=-158,21,-157,22")
+    assert [c["username"] for c in rv.get_json()["clusters"]] == ["other"]
+    assert client.get("/profiles/map/clusters?z=2").status_code == 400
+
+
+def test_clusters_see_writes_from_other_processes(app, client, add_user):
+    add_user("here", 21.3, -157.8)
+    assert [c["count"] for c in client.get("/profiles/map/clusters?z=2&bbox=-180,-85,180,85").get_json()["clusters"]] == [1]
+
+    # e.g. another worker or `flask users import`: no signal reaches the index
+    conn = sqlite3.connect(app.config["DATABASE"])
+    conn.execute("INSERT INTO user_profiles (username, email, latitude, longitude) VALUES ('elsewhere', 'e@x', 40.7, -74.0)")
+    conn.execute("UPDATE user_profiles SET latitude = 21.31 WHERE username = 'here'")
+    conn.commit()
+    clusters = client.get("/profiles/map/clusters?z=2&bbox=-180,-85,180,85").get_json()["clusters"]
+    assert sorted((c["username"], c["latitude"]) for c in clusters) == [("elsewhere", 40.7), ("here", 21.31)]
+
+    conn.execute("DELETE FROM user_profiles WHERE username = 'elsewhere'")
+    conn.commit()
+    conn.close()
+    assert [c["username"] for c in client.get("/profiles/map/clusters?z=2&bbox=-180,-85,180,85").get_json()["clusters"]] == ["here"]
+    stats = app.extensions["cluster_index"].stats()
+    assert stats["reloads"] == 1 and stats["refreshed"] == 3
+
+
+def test_clusters_skip_unplottable_rows(app, client, add_user):
+    add_user("good", 21.3, -157.8)
+    add_user("far", 1000.0, 0.0)
+    world = "/profiles/map/clusters?z=2&bbox=-180,-85,180,85"
+    assert [c["username"] for c in client.get(world).get_json()["clusters"]] == ["good"]
+
+    # and the same for rows the index catches up on from the change log
+    conn = sqlite3.connect(app.config["DATABASE"])
+    conn.execute("INSERT INTO user_profiles (username, email, latitude, longitude) VALUES ('text', 't@x', 'abc', -74.0)")
+    conn.execute("UPDATE user_profiles SET longitude = 500 WHERE username = 'good'")
+    conn.commit()
+    conn.close()
+    rv = client.get(world)
+    assert rv.status_code == 200 and rv.get_json()["clusters"] == []
+    assert app.extensions["cluster_index"].stats()["skipped"] == 3
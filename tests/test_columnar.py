@@ -0,0 +1,56 @@
+import math
+import numpy as np
+import pytest
+import columnar
+
+HEADERS = {"Accept": columnar.MIMETYPE}
+
+
+@pytest.mark.parametrize("gap", [1, 300, 70000, 2 ** 40])
+def test_round_trip(gap):
+    ids = [5 + gap * i for i in (3, 0, 2, 1)]
+    lats, lngs = [10.1234567, -89.9999999, 0.0, float("nan")], [179.9999999, -180.0, 1e-7, float("nan")]
+    payload = columnar.encode(ids, lats, lngs)
+    assert len(payload) % 4 == 0
+    decoded_ids, decoded_lats, decoded_lngs = columnar.decode(payload)
+    order = np.argsort(ids)
+    assert decoded_ids.tolist() == sorted(ids)
+    np.testing.assert_allclose(decoded_lats, np.array(lats)[order], atol=1e-7)
+    np.testing.assert_allclose(decoded_lngs, np.array(lngs)[order], atol=1e-7)
+
+
+def test_empty_and_compact():
+    assert [a.tolist() for a in columnar.decode(columnar.encode([], [], []))] == [[], [], []]
+    payload = columnar.encode_rows([(i, 21.3, -157.8) for i in range(1, 1001)])
+    assert len(payload) == columnar.HEADER.size + 1000 + 8 * 1000  # one byte per id gap
+    with pytest.raises(ValueError):
+        columnar.decode(b"JSON" + payload[4:])
+
+
+def test_location_endpoints_encode_on_request(client, add_user):
+    near = add_user("near", 21.3, -157.8)
+    far = add_user("far", 40.0, -74.0)
+    unlocated = add_user("unlocated")
+
+    rv = client.get("/profiles/locations?bbox=-158,21,-157,22", headers=HEADERS)
+    assert rv.mimetype == columnar.MIMETYPE
+    ids, lats, lngs = columnar.decode(rv.data)
+    assert ids.tolist() == [near] and (lats[0], lngs[0]) == pytest.approx((21.3, -157.8))
+    assert client.get("/profiles/locations?bbox=-158,21,-157,22").get_json()["users"][0]["id"] == near
+
+    ids, lats, _ = columnar.decode(client.get("/profiles/", headers=HEADERS).data)
+    assert ids.tolist() == [near, far, unlocated] and math.isnan(lats[2])
+    rv = client.get("/profiles/?limit=2", headers=HEADERS)
+    assert columnar.decode(rv.data)[0].tolist() == [near, far] and rv.headers["X-Next-After"] == str(far)
+    rv = client.get(f"/profiles/?limit=2&after={far}", headers=HEADERS)
+    assert columnar.decode(rv.data)[0].tolist() == [unlocated] and "X-Next-After" not in rv.headers
+
+    with client.session_transaction() as sess:
+        sess["user_id"] = near
+    group_id = client.post("/profiles/groups", json={"name": "convoy"}).get_json()["id"]
+    client.post(f"/profiles/groups/{group_id}/members", json={"user_id": far})
+    with client.session_transaction() as sess:
+        sess["user_id"] = far
+    client.post(f"/profiles/groups/{group_id}/invitation")
+    ids, _, lngs = columnar.decode(client.get(f"/profiles/groups/{group_id}/locations", headers=HEADERS).data)
+    assert ids.tolist() == [near, far] and lngs.tolist() == [-157.8, -74.0]
@@ -0,0 +1,35 @@
+from db import get_db
+
+
+def test_connections_are_reused_between_requests(app):
+    with app.app_context():
+        first = get_db()
+    with app.app_context():
+        assert get_db() is first
+
+
+def test_pooled_connections_are_configured(app):
+    with app.app_context():
+        db = get_db()
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert db.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+
+def test_open_transaction_is_rolled_back_on_release(app, add_user):
+    with app.app_context():
+        get_db().execute("DELETE FROM user_profiles")
+    add_user("survivor")
+    with app.app_context():
+        assert get_db().execute("SELECT COUNT(*) FROM user_profiles").fetchone()[0] == 1
+
+
+def test_pooling_can_be_disabled(tmp_path):
+    from app import create_app
+
+    app = create_app({"DATABASE": str(tmp_path / "nopool.db"), "DATABASE_POOL_SIZE": 0})
+    assert "db_pool" not in app.extensions
+    with app.app_context():
+        first = get_db()
+    with app.app_context():
+        assert get_db() is not first
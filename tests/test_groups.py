@@ -0,0 +1,183 @@
+import sqlite3
+import db
+import groups
+
+
+def _login(client, user_id):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+
+def _group(client, owner, *members, name="convoy"):
+    # a group whose members have all accepted; logged in as the owner after
+    _login(client, owner)
+    group_id = client.post("/profiles/groups", json={"name": name}).get_json()["id"]
+    for member in members:
+        assert client.post(f"/profiles/groups/{group_id}/members", json={"user_id": member}).status_code == 201
+    for member in members:
+        _login(client, member)
+        assert client.post(f"/profiles/groups/{group_id}/invitation").status_code == 200
+    _login(client, owner)
+    return group_id
+
+
+def test_create_and_list_groups(client, add_user):
+    me = add_user("me")
+    assert client.post("/profiles/groups", json={"name": "x"}).status_code == 401
+    _login(client, me)
+    assert client.post("/profiles/groups", json={"name": " "}).status_code == 400
+
+    rv = client.post("/profiles/groups", json={"name": "Road trip"})
+    assert rv.status_code == 201
+    group = rv.get_json()
+    assert group["name"] == "Road trip" and group["owner_id"] == me and group["role"] == "leader"
+    assert [g["id"] for g in client.get("/profiles/groups").get_json()["groups"]] == [group["id"]]
+    assert client.get(f"/profiles/groups/{group['id']}").get_json()["role"] == "leader"
+    assert client.get("/profiles/groups/999").status_code == 404
+
+
+def test_only_members_see_a_group(client, add_user):
+    owner, member, outsider = add_user("owner", 1.0, 1.0), add_user("member", 1.0, 1.1), add_user("outsider", 1.0, 1.2)
+    group_id = _group(client, owner, member)
+
+    _login(client, outsider)
+    for path in ("", "/members", "/locations", "/nearby", "/map"):
+        assert client.get(f"/profiles/groups/{group_id}{path}").status_code == 403
+    _login(client, member)
+    assert client.get(f"/profiles/groups/{group_id}/locations").status_code == 200
+    # members cannot add others, leaders can
+    assert client.post(f"/profiles/groups/{group_id}/members", json={"user_id": outsider}).status_code == 403
+    _login(client, owner)
+    rv = client.post(f"/profiles/groups/{group_id}/members", json={"username": "outsider"})
+    assert rv.get_json() == {"group_id": group_id, "user_id": outsider, "role": "member", "invited": True}
+    rv = client.post(f"/profiles/groups/{group_id}/members", json={"user_id": member, "role": "leader"})
+    assert rv.get_json()["invited"] is False
+    assert client.post(f"/profiles/groups/{group_id}/members", json={"user_id": 999}).status_code == 404
+
+
+def test_locations_and_nearby_are_scoped_to_the_group(client, add_user):
+    owner = add_user("owner", 21.30, -157.85)
+    near, far = add_user("near", 21.31, -157.85), add_user("far", 21.60, -157.85)
+    unlocated = add_user("unlocated")
+    stranger = add_user("stranger", 21.30, -157.851)  # closest of all, but not in the group
+    group_id = _group(client, owner, near, far, unlocated)
+
+    users = client.get(f"/profiles/groups/{group_id}/locations").get_json()["users"]
+    assert sorted(u["id"] for u in users) == [owner, near, far]
+    bbox = "-158.0,21.2,-157.7,21.4"
+    users = client.get(f"/profiles/groups/{group_id}/locations?bbox={bbox}").get_json()["users"]
+    assert sorted(u["id"] for u in users) == [owner, near]
+
+    nearby = client.get(f"/profiles/groups/{group_id}/nearby?k=5").get_json()["users"]
+    assert [u["id"] for u in nearby] == [near, far]
+    assert nearby[0]["distance_km"] < nearby[1]["distance_km"]
+    nearby = client.get(f"/profiles/groups/{group_id}/nearby?radius_km=5").get_json()["users"]
+    assert [u["id"] for u in nearby] == [near]
+    assert client.get(f"/profiles/groups/{group_id}/nearby?k=0").status_code == 400
+    assert stranger not in [u["id"] for u in client.get(f"/profiles/groups/{group_id}/members").get_json()["members"]]
+
+    rv = client.get(f"/profiles/groups/{group_id}/map")
+    assert rv.status_code == 200
+    assert b"stranger" not in rv.data and b"Near" in rv.data
+
+
+def test_members_are_paged_by_id(client, add_user):
+    owner = add_user("owner")
+    members = [add_user(f"m{i}") for i in range(5)]
+    group_id = _group(client, owner, *members)
+
+    page = client.get(f"/profiles/groups/{group_id}/members?limit=4").get_json()
+    assert [m["id"] for m in page["members"]] == [owner] + members[:3]
+    assert page["members"][0]["role"] == "leader"
+    page = client.get(f"/profiles/groups/{group_id}/members?limit=4&after={page['next_after']}").get_json()
+    assert [m["id"] for m in page["members"]] == members[3:]
+    assert page["next_after"] is None
+
+
+def test_leaving_removing_and_deleting(client, add_user):
+    owner, a, b = add_user("owner"), add_user("a"), add_user("b")
+    group_id = _group(client, owner, a, b)
+
+    _login(client, a)
+    assert client.delete(f"/profiles/groups/{group_id}/members/{b}").status_code == 403
+    assert client.delete(f"/profiles/groups/{group_id}/members/{a}").status_code == 200
+    assert client.get("/profiles/groups").get_json()["groups"] == []
+    assert client.delete(f"/profiles/groups/{group_id}").status_code == 403
+
+    _login(client, owner)
+    assert client.delete(f"/profiles/groups/{group_id}/members/{owner}").status_code == 400
+    assert client.delete(f"/profiles/groups/{group_id}/members/{a}").status_code == 404
+    assert client.delete(f"/profiles/groups/{group_id}").status_code == 200
+    assert client.get(f"/profiles/groups/{group_id}").status_code == 404
+
+
+def test_invitees_are_not_members_until_they_accept(client, add_user):
+    owner, invitee = add_user("owner", 1.0, 1.0), add_user("invitee", 5.0, 5.0)
+    group_id = _group(client, owner)
+    client.post(f"/profiles/groups/{group_id}/members", json={"user_id": invitee})
+    assert [u["id"] for u in client.get(f"/profiles/groups/{group_id}/locations").get_json()["users"]] == [owner]
+    assert [m["id"] for m in client.get(f"/profiles/groups/{group_id}/members").get_json()["members"]] == [owner]
+
+    _login(client, invitee)
+    assert client.get("/profiles/groups").get_json()["groups"][0]["invited"] == 1
+    assert client.get(f"/profiles/groups/{group_id}").status_code == 403
+    assert client.delete(f"/profiles/groups/{group_id}/invitation").status_code == 200
+    assert client.get("/profiles/groups").get_json()["groups"] == []
+    assert client.post(f"/profiles/groups/{group_id}/invitation").status_code == 404
+
+    _login(client, owner)
+    client.post(f"/profiles/groups/{group_id}/members", json={"user_id": invitee})
+    _login(client, invitee)
+    rv = client.post(f"/profiles/groups/{group_id}/invitation")
+    assert rv.status_code == 200 and rv.get_json()["role"] == "member"
+    assert client.get("/profiles/groups").get_json()["groups"][0]["invited"] == 0
+    assert client.get(f"/profiles/groups/{group_id}/locations").status_code == 200
+
+
+def test_leaders_cannot_take_over_positions_by_inviting(client, add_user):
+    # adding a user to your group does not let you move them
+    attacker, boss = add_user("attacker"), add_user("boss", 40.0, -74.0, is_admin=1)
+    group_id = _group(client, attacker)
+    client.post(f"/profiles/groups/{group_id}/members", json={"username": "boss", "role": "leader"})
+    rv = client.post("/profiles/locations:batch", json={"locations": [[boss, 0.0, 0.0]]})
+    assert rv.get_json()["applied"] == 0 and rv.get_json()["results"][0]["status"] == 403
+    assert client.get(f"/profiles/{boss}").get_json()["latitude"] == 40.0
+
+
+def test_leaders_update_their_members_positions(client, add_user):
+    leader, driver, stranger = add_user("leader"), add_user("driver"), add_user("stranger")
+    group_id = _group(client, leader, driver)
+
+    rv = client.post("/profiles/locations:batch", json={"locations": [[driver, 1.0, 2.0], [stranger, 1.0, 2.0]]})
+    assert [r["status"] for r in rv.get_json()["results"]] == [200, 403]
+    assert client.get(f"/profiles/{driver}").get_json()["latitude"] == 1.0
+
+    _login(client, driver)
+    rv = client.post("/profiles/locations:batch", json={"locations": [[leader, 1.0, 2.0]]})
+    assert rv.get_json()["results"][0]["status"] == 403
+
+
+def test_deleting_a_user_removes_their_memberships(app, client, add_user):
+    owner, member = add_user("owner"), add_user("member")
+    admin = add_user("admin", is_admin=1)
+    group_id = _group(client, owner, member)
+    _login(client, admin)
+    client.get(f"/profiles/admin/delete/{member}")
+    assert [m["id"] for m in client.get(f"/profiles/groups/{group_id}/members").get_json()["members"]] == [owner]
+    client.get(f"/profiles/admin/delete/{owner}")
+    assert client.get(f"/profiles/groups/{group_id}").status_code == 404
+
+
+def test_group_queries_only_touch_the_group(app):
+    # every group-scoped statement starts from a primary-key or index search
+    conn = sqlite3.connect(app.config["DATABASE"])
+    db.init_schema(conn)
+    for sql, params in [
+        (groups.SELECT_MEMBERS, (1, 0, 10)),
+        (groups.SELECT_MEMBER_LOCATIONS, (1,)),
+        (groups.SELECT_USER_GROUPS, (1,)),
+        (groups.SELECT_LED_MEMBERS.format(placeholders="?, ?"), (1, 2, 3)),
+    ]:
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        assert not any(step.startswith("SCAN") for step in plan), (sql, plan)
+    conn.close()
@@ -0,0 +1,113 @@
+import math
+import time
+from datetime import datetime, timezone
+import numpy as np
+import history
+import ingest
+from app import create_app
+from db import get_db
+
+DAY = 24 * 3600
+T0 = 1767225600.0  # 2026-01-01T00:00:00Z
+RECENT = float(int(time.time()) // DAY * DAY - DAY)  # yesterday, 00:00 UTC; fixes must be recent
+
+
+def test_points_are_partitioned_by_day(app):
+    with app.app_context():
+        db = get_db()
+        history.append_points(db, [(1, T0 + 10, 1.0, 2.0), (1, T0 + DAY + 10, 3.0, 4.0), (2, T0 + 20, 5.0, 6.0)])
+        db.commit()
+        assert history.partitions_between(db, T0, T0 + 2 * DAY) == [
+            "location_history_20260101",
+            "location_history_20260102",
+        ]
+        assert list(history.iter_track(db, 1, T0, T0 + 2 * DAY)) == [(T0 + 10, 1.0, 2.0), (T0 + DAY + 10, 3.0, 4.0)]
+        assert list(history.iter_track(db, 1, T0 + 11, T0 + DAY)) == []
+
+        assert history.drop_partitions_before(db, T0 + DAY) == ["location_history_20260101"]
+        assert list(history.iter_track(db, 1, T0, T0 + 2 * DAY)) == [(T0 + DAY + 10, 3.0, 4.0)]
+
+
+def test_simplify_keeps_corners_of_a_straight_track():
+    # 1 Hz along a straight line east, then straight north
+    east = [(t, 21.0, -157.0 + t * 1e-4) for t in range(100)]
+    north = [(100 + t, 21.0 + (t + 1) * 1e-4, east[-1][2]) for t in range(100)]
+    kept = history.simplify(east + north, tolerance_m=1.0)
+    assert len(kept) == 3
+    assert kept[1][0] == 99
+    assert np.array_equal(history.simplify(east[:2], 1.0), np.array(east[:2], dtype=float))
+
+
+def test_track_endpoint_records_updates_and_downsamples(client, add_user):
+    uid = add_user("driver", password="pw")
+    other = add_user("other", password="pw")
+    client.post("/profiles/login", json={"username": "driver", "password": "pw"})
+    for t in range(60):
+        rv = client.put(f"/profiles/{uid}", json={"latitude": 21.0, "longitude": -157.0 + t * 1e-4, "ts": RECENT + t})
+        assert rv.status_code == 200
+
+    track = client.get(f"/profiles/{uid}/track?from={RECENT}&to={datetime.fromtimestamp(RECENT + 60, timezone.utc):%Y-%m-%dT%H:%M:%S}").get_json()
+    assert track["user_id"] == uid
+    assert len(track["points"]) == 60
+    assert track["points"][0] == [RECENT, 21.0, -157.0]
+
+    simplified = client.get(f"/profiles/{uid}/track?from={RECENT}&to={RECENT + 60}&tolerance=5").get_json()
+    assert len(simplified["points"]) == 2
+
+    assert client.get(f"/profiles/{other}/track").status_code == 403
+    assert client.get(f"/profiles/{uid}/track?from=abc").status_code == 400
+    for query in ("to=inf", "from=1e18", "from=-1e15", "from=nan"):
+        assert client.get(f"/profiles/{uid}/track?{query}").status_code == 400
+    for ts in (1e20, RECENT - 400 * DAY, float("inf")):
+        body = '{"latitude": 1, "longitude": 2, "ts": %r}' % ts
+        assert client.put(f"/profiles/{uid}", data=body.replace("inf", "Infinity"), content_type="application/json").status_code == 400
+
+
+def test_bad_points_do_not_stall_the_buffer(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": str(tmp_path / "buffered.db"),
+        "RATE_LIMIT_ENABLED": False,
+        "LOCATION_BUFFER_ENABLED": True,
+        "LOCATION_FLUSH_INTERVAL": 3600,
+    })
+    client = app.test_client()
+    uid = client.post("/profiles/", json={"username": "gps", "email": "gps@example.com", "password": "pw"}).get_json()["id"]
+    with client.session_transaction() as sess:
+        sess["user_id"] = uid
+    assert client.put(f"/profiles/{uid}", json={"latitude": 1, "longitude": 2, "ts": 1e20}).status_code == 400
+    assert client.put(f"/profiles/{uid}", json={"latitude": 91, "longitude": 2}).status_code == 400
+
+    buffer = app.extensions["location_buffer"]
+    buffer.put(uid, 1.0, 2.0, 1e20)  # got past validation somehow
+    buffer.put(uid, 3.0, 4.0, RECENT)
+    assert buffer.flush() == 1
+    assert buffer.stats()["dropped_points"] == 1 and buffer.stats()["pending_history"] == 0
+    assert client.get(f"/profiles/{uid}").get_json()["latitude"] == 3.0
+    buffer.close()
+    app.extensions["password_hasher"].close()
+
+
+def test_old_history_expires(app):
+    def partitions(db):
+        return sorted(row[0] for row in db.execute(history.SELECT_PARTITIONS))
+
+    with app.app_context():
+        db = get_db()
+        history.append_points(db, [(1, RECENT - 10 * DAY, 1.0, 2.0), (1, RECENT - 5 * DAY, 1.0, 2.0), (1, RECENT, 3.0, 4.0)])
+        db.commit()
+        names = partitions(db)
+
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["history", "expire"]).exit_code != 0  # no LOCATION_HISTORY_DAYS
+    assert runner.invoke(args=["history", "expire", "--days", "7"]).exit_code == 0
+    with app.app_context():
+        assert partitions(get_db()) == names[1:]
+
+    # the flush thread does the same with LOCATION_HISTORY_DAYS
+    app.config["LOCATION_HISTORY_DAYS"] = 3
+    buffer = ingest.LocationBuffer(app.config, history_days=3)
+    assert buffer.expire_history() == [names[1]]
+    assert buffer.stats()["expired_partitions"] == 1
+    buffer.close()
+    assert runner.invoke(args=["history", "expire"]).exit_code == 0
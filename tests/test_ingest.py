@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+import time
+import pytest
+import columnar
+import ingest
+from app import create_app
+from db import connect
+
+
+@pytest.fixture
+def buffered_app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": str(tmp_path / "buffered.db"),
+        "LOCATION_BUFFER_ENABLED": True,
+        "LOCATION_FLUSH_INTERVAL": 3600,  # flushed explicitly by the tests
+        "LOCATION_FLUSH_MAX_PENDING": 1000,
+    })
+    yield app
+    app.extensions["location_buffer"].close()
+
+
+def stored_location(app, user_id):
+    conn = sqlite3.connect(app.config["DATABASE"])
+    row = conn.execute("SELECT latitude, longitude FROM user_profiles WHERE id = ?", (user_id,)).fetchone()
+    conn.close()
+    return row
+
+
+def logged_in_user(app, username):
+    client = app.test_client()
+    rv = client.post("/profiles/", json={"username": username, "email": f"{username}@example.com", "password": "pw"})
+    client.post("/profiles/login", json={"username": username, "password": "pw"})
+    return client, rv.get_json()["id"]
+
+
+def test_location_updates_are_buffered_and_coalesced(buffered_app):
+    client, uid = logged_in_user(buffered_app, "gps")
+    for i in range(5):
+        rv = client.put(f"/profiles/{uid}", json={"latitude": 10.0 + i, "longitude": 20.0})
+        assert rv.status_code == 200
+        assert rv.get_json()["latitude"] == 10.0 + i
+
+    # nothing written yet, but reads are served from the buffer
+    assert stored_location(buffered_app, uid) == (None, None)
+    assert client.get(f"/profiles/{uid}").get_json()["latitude"] == 14.0
+
+    buffer = buffered_app.extensions["location_buffer"]
+    assert buffer.flush() == 1
+    assert stored_location(buffered_app, uid) == (14.0, 20.0)
+    stats = client.get("/profiles/stats").get_json()["ingest"]
+    assert stats["updates"] == 5 and stats["coalesced"] == 4
+    assert stats["flushes"] == 1 and stats["flushed_rows"] == 1 and stats["pending"] == 0
+    # every fix, not just the latest, lands in the location history
+    assert stats["history_rows"] == 5
+
+
+def test_other_updates_bypass_the_buffer(buffered_app):
+    client, uid = logged_in_user(buffered_app, "direct")
+    client.put(f"/profiles/{uid}", json={"latitude": 1.0, "longitude": 2.0})
+    rv = client.put(f"/profiles/{uid}", json={"latitude": 3.0, "longitude": 4.0, "vehicle_type": "bus"})
+    assert rv.get_json()["vehicle_type"] == "bus"
+    assert stored_location(buffered_app, uid) == (3.0, 4.0)
+    # the direct write superseded the buffered fix
+    assert buffered_app.extensions["location_buffer"].get(uid) is None
+
+
+def test_flush_in_progress_does_not_overwrite_a_direct_write(buffered_app, monkeypatch):
+    client, uid = logged_in_user(buffered_app, "gps")
+    client.put(f"/profiles/{uid}", json={"latitude": 1.0, "longitude": 1.0})
+    buffer = buffered_app.extensions["location_buffer"]
+    buffer._conn = None
+
+    # the flush has taken the batch but not yet written it
+    taken, go = threading.Event(), threading.Event()
+
+    def slow_connect(config):
+        taken.set()
+        go.wait(5)
+        return connect(config)
+
+    monkeypatch.setattr(ingest, "connect", slow_connect)
+    flusher = threading.Thread(target=buffer.flush)
+    flusher.start()
+    assert taken.wait(5)
+    writer = threading.Thread(target=client.put, args=(f"/profiles/{uid}",), kwargs={"json": {"latitude": 2.0, "longitude": 2.0, "full_name": "G"}})
+    writer.start()
+    time.sleep(0.2)
+    go.set()
+    flusher.join(5)
+    writer.join(5)
+    assert stored_location(buffered_app, uid) == (2.0, 2.0)
+
+
+def test_size_threshold_triggers_flush(tmp_path):
+    app = create_app({
+        "DATABASE": str(tmp_path / "threshold.db"),
+        "LOCATION_BUFFER_ENABLED": True,
+        "LOCATION_FLUSH_INTERVAL": 3600,
+        "LOCATION_FLUSH_MAX_PENDING": 2,
+    })
+    buffer = app.extensions["location_buffer"]
+    client, uid = logged_in_user(app, "one")
+    buffer.put(uid, 5.0, 6.0)
+    buffer.put(uid + 1, 7.0, 8.0)
+    deadline = time.time() + 5
+    while buffer.flushes == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert buffer.flushes == 1
+    assert stored_location(app, uid) == (5.0, 6.0)
+    buffer.close()
+
+
+def test_list_reads_see_buffered_positions(buffered_app):
+    client, me = logged_in_user(buffered_app, "me")
+    _, near = logged_in_user(buffered_app, "near")
+    _, far = logged_in_user(buffered_app, "far")
+    conn = sqlite3.connect(buffered_app.config["DATABASE"])
+    conn.executemany("UPDATE user_profiles SET latitude = ?, longitude = ? WHERE id = ?",
+                     [(21.3, -157.8, me), (21.31, -157.81, near), (40.7, -74.0, far)])
+    conn.commit()
+    conn.close()
+
+    # buffered, not yet flushed: "far" drives into Honolulu, "near" leaves it
+    buffer = buffered_app.extensions["location_buffer"]
+    buffer.put(far, 21.3001, -157.8001)
+    buffer.put(near, 34.0, -118.2)
+
+    profiles = {p["id"]: p for p in client.get("/profiles/").get_json()["profiles"]}
+    assert profiles[far]["latitude"] == 21.3001 and profiles[near]["latitude"] == 34.0
+    lines = client.get("/profiles/?fields=id,latitude&format=ndjson").get_data(as_text=True).splitlines()
+    assert '{"id": %d, "latitude": 21.3001}' % far in lines
+
+    users = client.get("/profiles/locations?bbox=-158.5,21.0,-157.5,21.7").get_json()["users"]
+    assert sorted(u["id"] for u in users) == [me, far]
+    rv = client.get("/profiles/locations?bbox=-158.5,21.0,-157.5,21.7", headers={"Accept": columnar.MIMETYPE})
+    assert sorted(columnar.decode(rv.data)[0].tolist()) == [me, far]
+
+    nearest = client.get("/profiles/nearby?k=1").get_json()["users"]
+    assert [u["id"] for u in nearest] == [far] and nearest[0]["distance_km"] < 0.1
+    assert [u["id"] for u in client.get("/profiles/nearby?radius_km=50").get_json()["users"]] == [far]
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+import meeting
+
+
+def _login(client, user_id):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+
+def _distances(points, centre):
+    return np.hypot(*(points - centre).T)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 50, 400])
+def test_solvers_find_the_optimum(size):
+    rng = np.random.default_rng(size)
+    points = rng.normal(size=(size, 2)) * 10
+    median, centre = meeting.geometric_median(points), meeting.minimax_center(points)
+    # no nearby point does better
+    for offset in rng.normal(size=(200, 2)) * 0.05:
+        assert _distances(points, median).sum() <= _distances(points, median + offset).sum() + 1e-6
+        assert _distances(points, centre).max() <= _distances(points, centre + offset).max() + 1e-9
+
+
+def test_median_may_sit_on_a_member():
+    points = np.array([[0.0, 0.0], [0.0, 0.0], [0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+    assert meeting.geometric_median(points) == pytest.approx([0.0, 0.0], abs=1e-5)
+    assert meeting.minimax_center(points) == pytest.approx([0.5, 0.5])
+
+
+def test_meeting_point_across_the_antimeridian():
+    lat, lng, distances = meeting.meeting_point([10.0, 10.0], [179.9, -179.9], meeting.MAX)
+    assert lat == pytest.approx(10.0) and abs(lng) == pytest.approx(180.0)
+    assert distances == pytest.approx([10.95, 10.95], abs=0.01)
+
+
+def test_meeting_point_endpoint(client, add_user):
+    owner, a, b = add_user("owner", 21.30, -157.90), add_user("a", 21.30, -157.80), add_user("b", 21.30, -157.81)
+    outsider, unlocated = add_user("outsider", 21.3, -157.85), add_user("unlocated")
+    _login(client, owner)
+    group_id = client.post("/profiles/groups", json={"name": "convoy"}).get_json()["id"]
+    for member in (a, b, unlocated):
+        client.post(f"/profiles/groups/{group_id}/members", json={"user_id": member})
+    for member in (a, b, unlocated):
+        _login(client, member)
+        client.post(f"/profiles/groups/{group_id}/invitation")
+    _login(client, owner)
+
+    url = f"/profiles/groups/{group_id}/meeting-point"
+    body = client.get(url).get_json()
+    # the median of three points on a line is the middle one
+    assert (body["latitude"], body["longitude"]) == pytest.approx((21.30, -157.81), abs=1e-4)
+    assert (body["objective"], body["metric"]) == ("sum", "geodesic")
+    distances = {m["user_id"]: m["distance_km"] for m in body["members"]}
+    assert set(distances) == {owner, a, b} and distances[b] == pytest.approx(0, abs=0.01)
+    assert body["total_km"] == pytest.approx(sum(distances.values()), abs=0.01)
+
+    body = client.get(url + "?objective=max").get_json()
+    assert body["longitude"] == pytest.approx(-157.85, abs=1e-4)
+    assert body["max_km"] == pytest.approx(5.18, abs=0.01)
+
+    assert client.get(url + "?objective=mean").status_code == 400
+    assert client.get(url + "?metric=air").status_code == 400
+    assert client.get(url + "?metric=road").status_code == 503
+    _login(client, outsider)
+    assert client.get(url).status_code == 403
+    _login(client, unlocated)
+    client.post("/profiles/groups", json={"name": "alone"})
+    assert client.get(f"/profiles/groups/{group_id + 1}/meeting-point").status_code == 404
@@ -0,0 +1,76 @@
+import logging
+import re
+import sqlite3
+import pytest
+from app import create_app
+from db import get_db
+from metrics import normalize_sql
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": str(tmp_path / "test.db"),
+        "RATE_LIMIT_ENABLED": False,
+        "METRICS_ENABLED": True,
+    })
+    yield app
+    app.extensions["password_hasher"].close()
+
+
+def _sample(text, name, **labels):
+    for line in text.splitlines():
+        match = re.match(r"(\w+)(?:\{(.*)\})? (\S+)$", line)
+        if match and match[1] == name:
+            found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match[2] or ""))
+            if all(found.get(k) == v for k, v in labels.items()):
+                return float(match[3])
+    return None
+
+
+def test_metrics_endpoint_is_off_by_default(tmp_path):
+    app = create_app({"TESTING": True, "DATABASE": str(tmp_path / "test.db")})
+    assert app.test_client().get("/metrics").status_code == 404
+    with app.app_context():
+        assert isinstance(get_db(), sqlite3.Connection)
+    app.extensions["password_hasher"].close()
+
+
+def test_request_latency_histogram(client, add_user):
+    user_id = add_user("ann", 21.3, -157.8)
+    for _ in range(3):
+        assert client.get(f"/profiles/{user_id}").status_code == 200
+    client.get("/profiles/999999")
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    ok = dict(endpoint="profiles.get_profile", method="GET", status="200")
+    assert _sample(text, "http_request_duration_seconds_count", **ok) == 3
+    assert _sample(text, "http_request_duration_seconds_bucket", le="+Inf", **ok) == 3
+    assert _sample(text, "http_request_duration_seconds_count", endpoint="profiles.get_profile", status="404") == 1
+
+
+def test_statements_are_timed_with_rows_counted(app, client, add_user):
+    for name in ("ann", "bo", "cy"):
+        add_user(name)
+    assert len(client.get("/profiles/?limit=10").get_json()["profiles"]) == 3
+
+    text = client.get("/metrics").get_data(as_text=True)
+    (statement,) = [s for s in set(re.findall(r'statement="([^"]*)"', text)) if "LIMIT" in s]
+    assert _sample(text, "sqlite_rows_returned_total", statement=statement) == 3
+    assert _sample(text, "sqlite_query_duration_seconds_count", statement=statement) == 1
+
+
+def test_slow_queries_are_logged_with_plan(app, client, add_user, caplog):
+    app.extensions["metrics"].slow_query_seconds = 0
+    user_id = add_user("ann")
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        client.get(f"/profiles/{user_id}")
+    (record,) = [r for r in caplog.records if "FROM user_profiles WHERE id" in r.getMessage()]
+    assert "SEARCH user_profiles USING INTEGER PRIMARY KEY" in record.getMessage()
+    assert "sqlite_slow_queries_total{" in client.get("/metrics").get_data(as_text=True)
+
+
+def test_normalize_sql_folds_literals_and_placeholder_lists():
+    assert normalize_sql("SELECT *\n  FROM t WHERE id IN (?, ?,?) LIMIT 10") == "SELECT * FROM t WHERE id IN (?, ...) LIMIT N"
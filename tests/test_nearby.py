@@ -0,0 +1,75 @@
+import math
+import random
+import numpy as np
+from spatial import grid_cell, haversine_km
+
+
+def login(client, username, password="secret"):
+    rv = client.post("/profiles/login", json={"username": username, "password": password})
+    assert rv.status_code == 200
+
+
+def test_nearby_requires_login(client):
+    assert client.get("/profiles/nearby").status_code == 401
+
+
+def test_nearby_k_nearest_sorted_by_distance(client, add_user):
+    add_user("me", 21.30, -157.85, password="secret")
+    near = add_user("near", 21.31, -157.85)
+    mid = add_user("mid", 21.50, -157.85)
+    far = add_user("far", 40.71, -74.00)
+    add_user("unlocated")
+    login(client, "me")
+
+    rv = client.get("/profiles/nearby?k=2")
+    assert rv.status_code == 200
+    users = rv.get_json()["users"]
+    assert [u["id"] for u in users] == [near, mid]
+    assert users[0]["distance_km"] < users[1]["distance_km"]
+
+    # k larger than the local density expands the search until it is satisfied
+    users = client.get("/profiles/nearby?k=5").get_json()["users"]
+    assert [u["id"] for u in users] == [near, mid, far]
+
+
+def test_nearby_radius(client, add_user):
+    add_user("me", 21.30, -157.85, password="secret")
+    near = add_user("near", 21.31, -157.85)
+    add_user("mid", 21.50, -157.85)
+    login(client, "me")
+
+    users = client.get("/profiles/nearby?radius_km=5").get_json()["users"]
+    assert [u["id"] for u in users] == [near]
+    assert client.get("/profiles/nearby?radius_km=-1").status_code == 400
+    assert client.get("/profiles/nearby?k=abc").status_code == 400
+
+
+def test_nearby_matches_brute_force(app, add_user):
+    from db import get_db
+    from spatial import nearby_users
+
+    rng = random.Random(7)
+    points = {}
+    for i in range(300):
+        lat, lng = rng.uniform(-1, 1), rng.uniform(179, 181)
+        lng = lng - 360 if lng > 180 else lng
+        points[add_user(f"u{i}", lat, lng)] = (lat, lng)
+
+    with app.app_context():
+        got = nearby_users(get_db(), 0.0, 180.0, radius_km=60)
+    ids = np.array(list(points))
+    coords = np.array(list(points.values()))
+    distances = haversine_km(0.0, 180.0, coords[:, 0], coords[:, 1])
+    expected = sorted(ids[distances <= 60].tolist())
+    assert sorted(row[0] for row, _ in got) == expected
+    assert all(math.isclose(d, distances[list(points).index(row[0])]) for row, d in got)
+
+
+def test_grid_cell_matches_trigger(app, add_user):
+    import sqlite3
+
+    uid = add_user("x", -33.8688, 151.2093)
+    conn = sqlite3.connect(app.config["DATABASE"])
+    cell = conn.execute("SELECT cell FROM location_grid WHERE user_id = ?", (uid,)).fetchone()[0]
+    conn.close()
+    assert cell == grid_cell(-33.8688, 151.2093)
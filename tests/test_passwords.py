@@ -0,0 +1,65 @@
+import sqlite3
+import pytest
+from werkzeug.security import generate_password_hash
+from app import create_app
+from passwords import PasswordHasher, PasswordHasherBusy, method_prefix
+
+FAST = "pbkdf2:sha256:1000"
+
+
+@pytest.mark.parametrize("workers", [0, 1])
+def test_hash_and_verify(workers):
+    hasher = PasswordHasher(FAST, workers=workers)
+    try:
+        stored = hasher.hash("secret")
+        assert stored.startswith(FAST + "$")
+        assert hasher.verify(stored, "secret") == (True, None)
+        assert hasher.verify(stored, "wrong") == (False, None)
+        assert hasher.verify(None, "secret") == (False, None)
+        assert hasher.stats()["completed"] == 4
+    finally:
+        hasher.close()
+
+
+def test_verify_upgrades_old_hashes():
+    hasher = PasswordHasher("pbkdf2:sha256:2000", workers=0)
+    ok, new_hash = hasher.verify(generate_password_hash("secret", FAST), "secret")
+    assert ok and new_hash.startswith("pbkdf2:sha256:2000$")
+    assert hasher.verify(new_hash, "secret") == (True, None)
+    assert method_prefix("scrypt") == "scrypt:32768:8:1"
+
+
+def test_full_queue_is_rejected():
+    hasher = PasswordHasher(FAST, workers=0, max_pending=1)
+    hasher._slots.acquire()  # one call in flight
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash("secret")
+    assert hasher.stats()["rejected"] == 1
+
+
+@pytest.fixture
+def fast_app(tmp_path):
+    app = create_app({"TESTING": True, "DATABASE": str(tmp_path / "test.db"), "PASSWORD_HASH_METHOD": FAST})
+    yield app
+    app.extensions["password_hasher"].close()
+
+
+def test_login_rehashes_and_sheds_load(fast_app):
+    conn = sqlite3.connect(fast_app.config["DATABASE"])
+    conn.execute(
+        "INSERT INTO user_profiles (username, email, password_hash) VALUES (?, ?, ?)",
+        ("old", "old@example.com", generate_password_hash("pw", "pbkdf2:sha256:500")),
+    )
+    conn.commit()
+    client = fast_app.test_client()
+
+    assert client.post("/profiles/login", json={"username": "old", "password": "pw"}).status_code == 200
+    stored = conn.execute("SELECT password_hash FROM user_profiles WHERE username = 'old'").fetchone()[0]
+    assert stored.startswith(FAST + "$")
+
+    hasher = fast_app.extensions["password_hasher"]
+    for _ in range(hasher.max_pending):
+        hasher._slots.acquire()
+    rv = client.post("/profiles/login", json={"username": "old", "password": "pw"})
+    assert rv.status_code == 503
+    assert rv.headers["Retry-After"] == "1"
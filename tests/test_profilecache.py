@@ -0,0 +1,61 @@
+import sqlite3
+import time
+from profilecache import ProfileCache
+
+
+def test_get_profile_etag_and_write_invalidation(app, client, add_user):
+    uid = add_user("cached", 1.0, 2.0, password="pw")
+    rv = client.get(f"/profiles/{uid}")
+    assert rv.status_code == 200 and rv.get_json()["username"] == "cached"
+    etag = rv.headers["ETag"]
+
+    rv = client.get(f"/profiles/{uid}", headers={"If-None-Match": etag})
+    assert rv.status_code == 304 and rv.data == b""
+    assert app.extensions["profile_cache"].stats()["hits"] == 1
+
+    client.post("/profiles/login", json={"username": "cached", "password": "pw"})
+    assert client.put(f"/profiles/{uid}", json={"vehicle_type": "bus"}).status_code == 200
+    rv = client.get("/profiles/me", headers={"If-None-Match": etag})
+    assert rv.status_code == 200
+    assert rv.get_json()["vehicle_type"] == "bus"
+    assert client.get("/profiles/999").status_code == 404
+
+
+def test_lru_and_ttl_eviction(app, add_user):
+    ids = [add_user(f"user{i}") for i in range(3)]
+    conn = sqlite3.connect(app.config["DATABASE"])
+    conn.row_factory = sqlite3.Row
+    cache = ProfileCache(max_entries=2, ttl=60)
+    for profile_id in ids:
+        cache.get(conn, profile_id)
+    assert cache.stats()["entries"] == 2 and cache.evictions == 1
+
+    # a stale entry is served until its TTL runs out
+    short = ProfileCache(ttl=0.05)
+    short.get(conn, ids[0])
+    conn.execute("UPDATE user_profiles SET full_name = 'Renamed' WHERE id = ?", (ids[0],))
+    assert short.get(conn, ids[0])[2]["full_name"] == "User0"
+    time.sleep(0.06)
+    assert short.get(conn, ids[0])[2]["full_name"] == "Renamed"
+
+
+def test_buffered_positions_are_overlaid(tmp_path):
+    from app import create_app
+
+    app = create_app({"TESTING": True, "DATABASE": str(tmp_path / "t.db"), "RATE_LIMIT_ENABLED": False,
+                      "LOCATION_BUFFER_ENABLED": True, "LOCATION_FLUSH_INTERVAL": 60})
+    client = app.test_client()
+    conn = sqlite3.connect(app.config["DATABASE"])
+    uid = conn.execute("INSERT INTO user_profiles (username, email, latitude, longitude) VALUES ('b', 'b@x', 1.0, 1.0)").lastrowid
+    conn.commit()
+    first = client.get(f"/profiles/{uid}")
+
+    app.extensions["location_buffer"].put(uid, 5.0, 6.0)
+    rv = client.get(f"/profiles/{uid}", headers={"If-None-Match": first.headers["ETag"]})
+    assert rv.status_code == 200 and rv.get_json()["latitude"] == 5.0
+
+    app.extensions["location_buffer"].flush()  # invalidates the cached row
+    assert client.get(f"/profiles/{uid}").get_json()["latitude"] == 5.0
+    assert app.extensions["profile_cache"].stats()["invalidations"] == 1
+    app.extensions["location_buffer"].close()
+    app.extensions["password_hasher"].close()
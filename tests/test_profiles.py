@@ -61,3 +61,55 @@ def test_delete_profile(client):
     # verify it's gone
     rv_get = client.get(f"/profiles/{pid}")
     assert rv_get.status_code == 404
+
+
+def test_list_profiles_keyset_pagination(client):
+    for name in ("p1", "p2", "p3"):
+        client.post("/profiles/", json={"username": name, "email": f"{name}@example.com", "password": "pw"})
+
+    rv = client.get("/profiles/?limit=2")
+    data = rv.get_json()
+    assert [p["username"] for p in data["profiles"]] == ["p1", "p2"]
+    assert all("password_hash" not in p for p in data["profiles"])
+
+    rv = client.get(f"/profiles/?limit=2&after={data['next_after']}")
+    data = rv.get_json()
+    assert [p["username"] for p in data["profiles"]] == ["p3"]
+    assert data["next_after"] is None
+
+
+def test_list_profiles_projection_and_ndjson(client):
+    for name in ("n1", "n2"):
+        client.post("/profiles/", json={"username": name, "email": f"{name}@example.com", "password": "pw"})
+
+    rv = client.get("/profiles/?fields=username")
+    assert rv.get_json()["profiles"][0].keys() == {"id", "username"}
+    assert client.get("/profiles/?fields=password_hash").status_code == 400
+
+    rv = client.get("/profiles/?fields=username", headers={"Accept": "application/x-ndjson"})
+    assert rv.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+    assert [row["username"] for row in lines] == ["n1", "n2"]
+
+
+def test_update_profile_rejects_bad_positions(client):
+    rv = client.post("/profiles/", json={"username": "gps", "email": "gps@example.com", "password": "pw"})
+    pid = rv.get_json()["id"]
+    client.post("/profiles/login", json={"username": "gps", "password": "pw"})
+    assert client.put(f"/profiles/{pid}", json={"latitude": 21.3, "longitude": -157.8}).status_code == 200
+
+    for bad in ({"latitude": 1000, "longitude": 0}, {"latitude": "abc"}, {"longitude": True, "vehicle_type": "bus"}):
+        assert client.put(f"/profiles/{pid}", json=bad).status_code == 400
+    got = client.get(f"/profiles/{pid}").get_json()
+    assert (got["latitude"], got["longitude"], got["vehicle_type"]) == (21.3, -157.8, None)
+
+    # null still clears the position
+    rv = client.put(f"/profiles/{pid}", json={"latitude": None, "longitude": None})
+    assert rv.status_code == 200 and rv.get_json()["latitude"] is None
+
+
+def test_create_profile_rejects_bad_positions(client):
+    for lat, lng in ((91, 0), (0, 181), (float("nan"), 0), ("21.3", -157.8)):
+        payload = {"username": "gps", "email": "gps@example.com", "password": "pw", "latitude": lat, "longitude": lng}
+        assert client.post("/profiles/", json=payload).status_code == 400
+    assert client.get("/profiles/").get_json()["profiles"] == []
@@ -0,0 +1,61 @@
+import pytest
+from app import create_app
+from ratelimit import MemoryStore, SQLiteStore
+
+
+@pytest.mark.parametrize("make_store", [MemoryStore, lambda: None], ids=["memory", "sqlite"])
+def test_token_bucket_refills(make_store, tmp_path):
+    store = make_store() or SQLiteStore(str(tmp_path / "limits.db"))
+    # 2 tokens per second, bursts of 3
+    assert [store.take("k", 2, 3, now=100.0)[0] for _ in range(3)] == [True, True, True]
+    allowed, _, retry_after = store.take("k", 2, 3, now=100.0)
+    assert not allowed and retry_after == pytest.approx(0.5)
+    assert store.take("k", 2, 3, now=100.5)[0]
+    assert not store.take("k", 2, 3, now=100.5)[0]
+    assert store.take("other", 2, 3, now=100.5)[0]
+
+
+def test_sqlite_store_is_shared(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first, second = SQLiteStore(path), SQLiteStore(path)
+    assert first.take("k", 1, 1, now=10.0)[0]
+    assert not second.take("k", 1, 1, now=10.0)[0]
+
+
+def test_memory_store_evicts_full_and_excess_buckets():
+    store = MemoryStore(max_keys=2)
+    store.take("a", 1, 1, now=0.0)
+    store.take("b", 1, 1, now=0.5)
+    store.take("c", 1, 1, now=1.0)  # "a" has refilled and is dropped
+    assert len(store) == 2
+    store.take("d", 1, 1, now=1.2)  # over max_keys: the oldest goes
+    assert len(store) == 2
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": str(tmp_path / "test.db"),
+        "RATE_LIMITS": {"POST profiles.login": (2, 60), "PUT profiles.update_profile": (1, 10)},
+    })
+    yield app
+    app.extensions["password_hasher"].close()
+
+
+def test_routes_answer_429_with_retry_after(app, client, add_user):
+    uid = add_user("driver", password="pw")
+    login = {"username": "nobody", "password": "x"}
+    assert client.post("/profiles/login", json=login).status_code == 401
+    assert client.post("/profiles/login", json=login).status_code == 401
+    rv = client.post("/profiles/login", json=login)
+    assert rv.status_code == 429
+    assert rv.headers["Retry-After"] == "30"
+    assert client.get("/profiles/login").status_code == 200  # only POST is limited
+
+    # location updates are limited per logged-in user
+    with client.session_transaction() as session:
+        session["user_id"] = uid
+    assert client.put(f"/profiles/{uid}", json={"latitude": 1.0, "longitude": 2.0}).status_code == 200
+    assert client.put(f"/profiles/{uid}", json={"latitude": 1.0, "longitude": 2.0}).status_code == 429
+    assert app.extensions["rate_limiter"].stats()["limited"] == 2
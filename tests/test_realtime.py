@@ -0,0 +1,70 @@
+import json
+import pytest
+from realtime import LocationHub
+
+
+def test_hub_filters_by_viewport_and_sends_leave():
+    hub = LocationHub()
+    honolulu = hub.subscribe((-158.5, 21.0, -157.5, 21.7))
+    world = hub.subscribe()
+
+    hub.publish(1, 21.3, -157.8)
+    assert [e["type"] for e in honolulu.drain(0)] == ["move"]
+    assert [e["type"] for e in world.drain(0)] == ["move"]
+
+    # leaving the viewport is delivered as a "leave" delta
+    hub.publish(1, 40.7, -74.0)
+    assert [(e["type"], e["id"]) for e in honolulu.drain(0)] == [("leave", 1)]
+    assert world.drain(0)[0]["latitude"] == 40.7
+
+    # further moves outside the viewport are not delivered at all
+    hub.publish(1, 40.8, -74.0)
+    assert honolulu.drain(0) == []
+
+
+def test_a_bad_position_is_not_kept():
+    hub = LocationHub()
+    honolulu = hub.subscribe((-158.5, 21.0, -157.5, 21.7))
+    hub.publish(1, 21.3, -157.8)
+    honolulu.drain(0)
+    with pytest.raises(TypeError):
+        hub.publish(1, "abc", -157.8)
+    # the last good position is still the one the next move leaves from
+    hub.publish(1, 40.7, -74.0)
+    assert [(e["type"], e["id"]) for e in honolulu.drain(0)] == [("leave", 1)]
+
+
+def test_subscriber_coalesces_updates_per_user():
+    hub = LocationHub()
+    sub = hub.subscribe()
+    for i in range(5):
+        hub.publish(7, 10.0 + i, 20.0)
+    hub.publish(8, 1.0, 2.0)
+
+    events = sub.drain(0)
+    assert [(e["id"], e["latitude"]) for e in events] == [(7, 14.0), (8, 1.0)]
+    assert hub.stats()["coalesced"] == 4
+
+    hub.unsubscribe(sub)
+    assert hub.stats()["subscribers"] == 0
+
+
+def test_stream_pushes_profile_updates(app, add_user):
+    uid = add_user("streamer", 21.3, -157.8, password="secret")
+    watcher = app.test_client()
+    mover = app.test_client()
+    mover.post("/profiles/login", json={"username": "streamer", "password": "secret"})
+
+    rv = watcher.get("/profiles/stream?bbox=-158.5,21.0,-157.5,21.7", buffered=False)
+    assert rv.mimetype == "text/event-stream"
+    chunks = iter(rv.response)
+    assert next(chunks).startswith(b": connected")
+
+    assert mover.put(f"/profiles/{uid}", json={"latitude": 21.4, "longitude": -157.9}).status_code == 200
+    chunk = next(chunks).decode()
+    assert chunk.startswith("event: locations")
+    events = json.loads(chunk.split("data: ", 1)[1])
+    assert events[0]["id"] == uid and events[0]["latitude"] == 21.4
+    assert events[0]["username"] == "streamer"
+    rv.close()
+    assert app.extensions["location_hub"].stats()["subscribers"] == 0
@@ -0,0 +1,38 @@
+import repository
+from db import get_db
+
+
+def test_insert_profile_returns_public_row(app):
+    with app.app_context():
+        db = get_db()
+        row = repository.insert_profile(db, "dora", "dora@example.com", "hash", latitude=1.5, longitude=2.5)
+        db.commit()
+        assert dict(row)["username"] == "dora"
+        assert "password_hash" not in row.keys()
+        assert dict(repository.get_profile(db, row["id"])) == dict(row)
+
+
+def test_update_profile_only_touches_given_fields(app, add_user):
+    uid = add_user("eve", 10.0, 20.0)
+    with app.app_context():
+        db = get_db()
+        row = repository.update_profile(db, uid, {"vehicle_type": "van", "latitude": None, "password_hash": "x"})
+        db.commit()
+        assert row["vehicle_type"] == "van"
+        assert row["full_name"] == "Eve"
+        assert row["latitude"] is None
+        assert row["longitude"] == 20.0
+        assert repository.update_profile(db, uid + 100, {"full_name": "ghost"}) is None
+
+
+def test_profile_endpoints_do_not_leak_password_hash(client, add_user):
+    uid = add_user("frank", password="secret")
+    assert "password_hash" not in client.get(f"/profiles/{uid}").get_json()
+    client.post("/profiles/login", json={"username": "frank", "password": "secret"})
+    me = client.get("/profiles/me").get_json()
+    assert me["id"] == uid and "password_hash" not in me
+
+    rv = client.put(f"/profiles/{uid}", json={"latitude": 5.0, "longitude": 6.0})
+    assert rv.status_code == 200
+    assert rv.get_json()["full_name"] == "Frank"
+    assert (rv.get_json()["latitude"], rv.get_json()["longitude"]) == (5.0, 6.0)
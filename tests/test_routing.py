@@ -0,0 +1,179 @@
+import random
+import numpy as np
+import pytest
+import routing
+from app import create_app
+
+# A-B-C is a two-way residential street; A-D-C a faster one-way primary road.
+# E-F is an island and G-H a footway, neither of which is kept.
+OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="21.3000" lon="-157.8600"/>
+  <node id="2" lat="21.3000" lon="-157.8500"/>
+  <node id="3" lat="21.3000" lon="-157.8400"/>
+  <node id="4" lat="21.3020" lon="-157.8500"/>
+  <node id="5" lat="21.5000" lon="-157.5000"/>
+  <node id="6" lat="21.5010" lon="-157.5000"/>
+  <node id="7" lat="21.3000" lon="-157.8700"/>
+  <node id="8" lat="21.3010" lon="-157.8700"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><nd ref="999"/><tag k="highway" v="residential"/></way>
+  <way id="11"><nd ref="1"/><nd ref="4"/><nd ref="3"/><tag k="highway" v="primary"/><tag k="oneway" v="yes"/></way>
+  <way id="12"><nd ref="5"/><nd ref="6"/><tag k="highway" v="residential"/></way>
+  <way id="13"><nd ref="7"/><nd ref="8"/><tag k="highway" v="footway"/></way>
+</osm>
+"""
+A, B, C, D = (21.3, -157.86), (21.3, -157.85), (21.3, -157.84), (21.302, -157.85)
+
+
+@pytest.fixture
+def extract(tmp_path):
+    path = tmp_path / "roads.osm"
+    path.write_text(OSM)
+    return str(path)
+
+
+@pytest.fixture
+def app(tmp_path, extract):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": str(tmp_path / "test.db"),
+        "RATE_LIMIT_ENABLED": False,
+        "ROUTING_GRAPH": extract,
+    })
+    yield app
+    app.extensions["password_hasher"].close()
+
+
+def _grid(side, seed):
+    # random square road grid with a few missing streets and mixed speeds
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(side * side), side)
+    lat, lng = 21.0 + rows * 0.001, -158.0 + cols * 0.001
+    index = np.arange(side * side).reshape(side, side)
+    a = np.concatenate((index[:, :-1].ravel(), index[:-1, :].ravel()))
+    b = np.concatenate((index[:, 1:].ravel(), index[1:, :].ravel()))
+    keep = rng.random(len(a)) > 0.15
+    a, b = a[keep], b[keep]
+    speed = rng.choice([30.0, 50.0, 100.0], len(a))
+    oneway = rng.random(len(a)) < 0.2
+    return lat, lng, np.concatenate((a, b[~oneway])), np.concatenate((b, a[~oneway])), np.concatenate((speed, speed[~oneway]))
+
+
+def test_reads_drivable_ways_with_one_way_streets(extract):
+    graph = routing.build_graph(*routing.read_osm(extract))
+    assert graph.node_count == 4
+    assert graph.edge_count == 6  # A-B-C both ways, A-D-C forwards only
+
+    router = routing.Router()
+    router.set_graph(graph)
+    there, back = router.route(A, C), router.route(C, A)
+    assert [21.302, -157.85] in there["points"]
+    assert back["points"] == [list(C), list(B), list(A)]
+    assert there["duration_s"] < back["duration_s"]
+    assert back["distance_m"] == pytest.approx(2072, abs=1)
+
+
+@pytest.mark.parametrize("landmarks", [0, 4])
+def test_a_star_finds_the_fastest_path(landmarks):
+    graph = routing.build_graph(*_grid(25, seed=landmarks), landmarks=landmarks)
+    forward = graph.indptr.tolist(), graph.targets.tolist(), graph.seconds.tolist()
+    rng = random.Random(1)
+    for _ in range(10):
+        source = rng.randrange(graph.node_count)
+        expected = routing._travel_times(graph.node_count, *forward, source)
+        for target in rng.sample(range(graph.node_count), 10):
+            nodes, seconds = graph.shortest_path(source, target)
+            assert seconds == pytest.approx(expected[target], rel=1e-5)
+            assert nodes[0] == source and nodes[-1] == target
+        paths = graph.paths_to([target, source], source)
+        assert paths[target][1] == pytest.approx(routing._travel_times(graph.node_count, *forward, target)[source], rel=1e-5)
+        assert paths[source] == ([source], 0.0)
+
+
+def test_graph_file_round_trip(tmp_path):
+    graph = routing.build_graph(*_grid(10, seed=0), landmarks=2)
+    graph.save(str(tmp_path / "graph.npz"))
+    loaded = routing.Graph.load(str(tmp_path / "graph.npz"))
+    assert loaded.node_count == graph.node_count
+    assert np.array_equal(loaded.landmarks, graph.landmarks)
+    assert loaded.shortest_path(0, graph.node_count - 1) == graph.shortest_path(0, graph.node_count - 1)
+
+
+def test_routes_endpoint(client, app):
+    assert client.get("/profiles/routes?from=21.3,-157.86").status_code == 400
+    assert client.get("/profiles/routes?from=21.3,-157.86&to=95,0").status_code == 400
+    assert client.get("/profiles/routes?from=21.3,-157.86&to=22.5,-157.84").status_code == 404
+
+    rv = client.get("/profiles/routes?from=21.3001,-157.8601&to=21.3,-157.8401")
+    assert rv.status_code == 200
+    route = rv.get_json()
+    assert route["points"][0] == list(A) and route["points"][-1] == list(C)
+    assert route["distance_m"] > 2000 and route["duration_s"] > 0
+
+    client.get("/profiles/routes?from=21.3,-157.86&to=21.3,-157.84")  # same snapped nodes
+    stats = client.get("/profiles/stats").get_json()["routes"]
+    assert (stats["hits"], stats["nodes"]) == (1, 4)
+
+
+def test_routing_needs_a_graph(tmp_path):
+    app = create_app({"TESTING": True, "DATABASE": str(tmp_path / "plain.db"), "RATE_LIMIT_ENABLED": False})
+    client = app.test_client()
+    assert client.get("/profiles/routes?from=21.3,-157.86&to=21.3,-157.84").status_code == 503
+    assert "routes" not in client.get("/profiles/stats").get_json()
+    app.extensions["password_hasher"].close()
+
+
+def test_group_route_to_a_meeting_point(client, add_user):
+    owner, driver, lost = add_user("owner", *A), add_user("driver", *B), add_user("lost", 25.0, -150.0)
+    add_user("stranger", *D)
+    with client.session_transaction() as sess:
+        sess["user_id"] = owner
+    group_id = client.post("/profiles/groups", json={"name": "convoy"}).get_json()["id"]
+    for member in (driver, lost):
+        client.post(f"/profiles/groups/{group_id}/members", json={"user_id": member})
+    for member in (driver, lost):
+        with client.session_transaction() as sess:
+            sess["user_id"] = member
+        client.post(f"/profiles/groups/{group_id}/invitation")
+    with client.session_transaction() as sess:
+        sess["user_id"] = owner
+
+    body = client.get(f"/profiles/groups/{group_id}/route?to=21.3,-157.84").get_json()
+    routes = {r["user_id"]: r for r in body["routes"]}
+    assert set(routes) == {owner, driver}
+    assert routes[owner]["points"][0] == list(A) and routes[owner]["points"][-1] == list(C)
+    assert routes[driver]["points"] == [list(B), list(C)]
+    assert body["unrouted"] == [lost]
+    assert client.get(f"/profiles/groups/{group_id}/route?to=30,-157.84").status_code == 404
+
+
+def test_cli_builds_a_graph_file(app, extract, tmp_path):
+    output = tmp_path / "roads.npz"
+    result = app.test_cli_runner().invoke(args=["routing", "build", extract, str(output), "--landmarks", "2"])
+    assert result.exit_code == 0, result.output
+    assert "4 nodes, 6 edges" in result.output
+    assert routing.Graph.load(str(output)).landmarks.tolist() != []
+
+
+def test_group_meets_on_the_roads(client, add_user):
+    owner, east = add_user("owner", *A), add_user("east", 21.3, -157.8399)
+    with client.session_transaction() as sess:
+        sess["user_id"] = owner
+    group_id = client.post("/profiles/groups", json={"name": "convoy"}).get_json()["id"]
+    client.post(f"/profiles/groups/{group_id}/members", json={"user_id": east})
+    with client.session_transaction() as sess:
+        sess["user_id"] = east
+    client.post(f"/profiles/groups/{group_id}/invitation")
+    with client.session_transaction() as sess:
+        sess["user_id"] = owner
+
+    # halfway is B, but the one-way primary road makes C the quicker place to meet
+    body = client.get(f"/profiles/groups/{group_id}/meeting-point?metric=road&objective=max").get_json()
+    assert [body["latitude"], body["longitude"]] == list(C)
+    durations = {m["user_id"]: m["duration_s"] for m in body["members"]}
+    assert body["max_s"] == max(durations.values()) and body["unrouted"] == []
+
+    # without ?to= the group is routed to the road meeting point
+    body = client.get(f"/profiles/groups/{group_id}/route?objective=max").get_json()
+    assert body["to"] == {"latitude": C[0], "longitude": C[1]}
+    assert {r["user_id"]: r["duration_s"] for r in body["routes"]} == durations
@@ -0,0 +1,53 @@
+import sqlite3
+
+
+def test_locations_bbox_returns_only_users_inside(client, add_user):
+    inside = add_user("honolulu", 21.3069, -157.8583)
+    add_user("newyork", 40.7128, -74.0060)
+    add_user("nowhere")
+
+    rv = client.get("/profiles/locations?bbox=-158.5,21.0,-157.5,21.7")
+    assert rv.status_code == 200
+    users = rv.get_json()["users"]
+    assert [u["id"] for u in users] == [inside]
+    assert "password_hash" not in users[0]
+
+
+def test_locations_bbox_is_required_and_validated(client):
+    assert client.get("/profiles/locations").status_code == 400
+    assert client.get("/profiles/locations?bbox=1,2,3").status_code == 400
+    assert client.get("/profiles/locations?bbox=0,95,1,96").status_code == 400
+
+
+def test_locations_bbox_crossing_antimeridian(client, add_user):
+    east = add_user("fiji", -17.7, 178.0)
+    west = add_user("samoa", -13.8, -172.0)
+    add_user("sydney", -33.9, 151.2)
+
+    rv = client.get("/profiles/locations?bbox=170,-20,-170,-10")
+    ids = sorted(u["id"] for u in rv.get_json()["users"])
+    assert ids == sorted([east, west])
+
+
+def test_spatial_index_follows_updates_and_deletes(app, client, add_user):
+    uid = add_user("mover", 10.0, 10.0)
+    conn = sqlite3.connect(app.config["DATABASE"])
+    conn.execute("UPDATE user_profiles SET latitude = 50.0, longitude = 50.0 WHERE id = ?", (uid,))
+    conn.commit()
+
+    assert client.get("/profiles/locations?bbox=9,9,11,11").get_json()["users"] == []
+    assert len(client.get("/profiles/locations?bbox=49,49,51,51").get_json()["users"]) == 1
+
+    conn.execute("DELETE FROM user_profiles WHERE id = ?", (uid,))
+    conn.commit()
+    conn.close()
+    assert client.get("/profiles/locations?bbox=49,49,51,51").get_json()["users"] == []
+
+
+def test_map_inlines_only_viewport_users(client, add_user):
+    add_user("inside_user", 21.3, -157.8)
+    add_user("outside_user", 40.7, -74.0)
+
+    html = client.get("/profiles/map?bbox=-158.5,21.0,-157.5,21.7").get_data(as_text=True)
+    assert "inside_user" in html
+    assert "outside_user" not in html
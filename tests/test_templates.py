@@ -0,0 +1,46 @@
+def _login(client, username):
+    rv = client.post("/profiles/login", json={"username": username, "password": "pw"})
+    assert rv.status_code == 200
+
+
+def test_admin_dashboard_escapes_user_text(client, add_user):
+    add_user("admin", password="pw", is_admin=1)
+    add_user("<script>alert(1)</script>")
+    _login(client, "admin")
+
+    html = client.get("/profiles/admin").get_data(as_text=True)
+    assert "<script>alert(1)</script>" not in html
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in html
+    assert 'href="/profiles/admin/edit/2"' in html
+    assert html.count("<tr>") == 3  # header + two users
+
+
+def test_map_inlines_viewport_users_as_json(client, add_user):
+    uid = add_user("driver", 21.3, -157.8, password="pw")
+    add_user("</script>", 21.31, -157.81)
+    _login(client, "driver")
+
+    html = client.get("/profiles/map?bbox=-158,21,-157,22").get_data(as_text=True)
+    assert f"var currentUserId = {uid};" in html
+    assert "map.fitBounds([[21.0, -158.0], [22.0, -157.0]]);" in html
+    assert html.count("</script>") == 2  # the Leaflet include and the page script
+    assert '"username": "driver"' in html
+
+
+def test_map_treats_a_deleted_users_session_as_anonymous(client, add_user):
+    add_user("admin", password="pw", is_admin=1)
+    gone = add_user("gone", 21.3, -157.8)
+    _login(client, "admin")
+    client.get(f"/profiles/admin/delete/{gone}")
+    with client.session_transaction() as sess:
+        sess["user_id"] = gone
+
+    rv = client.get("/profiles/map")
+    assert rv.status_code == 200
+    html = rv.get_data(as_text=True)
+    assert "var currentUserId = null;" in html and "updateLocationBtn\">" not in html
+
+
+def test_static_pages_render(client):
+    assert b'action="/profiles/login"' in client.get("/profiles/login").data
+    assert b'action="/profiles/register"' in client.get("/profiles/register").data
@@ -0,0 +1,69 @@
+import sqlite3
+from tiles import TileCache, tile_bbox, tile_for
+
+
+def test_tile_math_round_trips():
+    z, x, y = tile_for(21.3069, -157.8583, 12)
+    west, south, east, north = tile_bbox(z, x, y)
+    assert west <= -157.8583 <= east and south <= 21.3069 <= north
+    assert tile_bbox(0, 0, 0)[0] == -180.0
+
+
+def test_tile_endpoint_etag_and_invalidation(client, add_user):
+    uid = add_user("tiler", 21.3069, -157.8583, password="pw")
+    z, x, y = tile_for(21.3069, -157.8583, 12)
+    url = f"/profiles/tiles/{z}/{x}/{y}.json"
+
+    rv = client.get(url)
+    assert rv.status_code == 200
+    assert rv.mimetype == "application/geo+json"
+    assert [f["id"] for f in rv.get_json()["features"]] == [uid]
+    etag = rv.headers["ETag"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    # the user leaves the tile: its cached copy is invalidated
+    client.post("/profiles/login", json={"username": "tiler", "password": "pw"})
+    client.put(f"/profiles/{uid}", json={"latitude": 40.7, "longitude": -74.0})
+    rv = client.get(url, headers={"If-None-Match": etag})
+    assert rv.status_code == 200
+    assert rv.get_json()["features"] == []
+
+    assert client.get("/profiles/tiles/2/0/0.json").status_code == 404
+    assert client.get(f"/profiles/tiles/12/{2 ** 12}/0.json").status_code == 404
+
+
+def test_unrelated_moves_keep_cached_tiles(app, add_user):
+    from db import get_db
+
+    cache = TileCache(min_zoom=10, max_zoom=12, max_tiles=2)
+    add_user("a", 21.3, -157.8)
+    with app.app_context():
+        db = get_db()
+        cache.get(db, *tile_for(21.3, -157.8, 12))
+        cache.invalidate(999, 40.7, -74.0)  # far away
+        cache.get(db, *tile_for(21.3, -157.8, 12))
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # LRU eviction beyond max_tiles
+        cache.get(db, 10, 0, 0)
+        cache.get(db, 10, 1, 0)
+        assert cache.stats()["tiles"] == 2
+        cache.get(db, *tile_for(21.3, -157.8, 12))
+        assert cache.misses == 4
+
+
+def test_tiles_see_writes_from_other_processes(app, client, add_user):
+    uid = add_user("tiler", 21.3069, -157.8583)
+    url = "/profiles/tiles/{}/{}/{}.json"
+    here, there = tile_for(21.3069, -157.8583, 12), tile_for(40.7, -74.0, 12)
+    etag = client.get(url.format(*here)).headers["ETag"]
+    assert client.get(url.format(*there)).get_json()["features"] == []
+
+    # no location_changed signal for this one
+    conn = sqlite3.connect(app.config["DATABASE"])
+    conn.execute("UPDATE user_profiles SET latitude = 40.7, longitude = -74.0 WHERE id = ?", (uid,))
+    conn.commit()
+    conn.close()
+    assert client.get(url.format(*here), headers={"If-None-Match": etag}).get_json()["features"] == []
+    assert [f["id"] for f in client.get(url.format(*there)).get_json()["features"]] == [uid]
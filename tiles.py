@@ -0,0 +1,168 @@
+# z/x/y tiles of user locations as GeoJSON, kept in an LRU cache. A tile is
+# only dropped from the cache when a user inside it moves, or a user moves
+# into it, so panning a busy map costs a few small revalidated requests.
+# Moves written outside this process (other workers, imports, plain SQL)
+# are picked up from the map change log before serving a tile, as in
+# clustering.ClusterIndex.
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+import changelog
+from signals import location_changed
+from spatial import users_in_bbox, web_mercator
+
+
+def tile_bbox(z, x, y):
+    # (west, south, east, north) of a Web Mercator tile
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def tile_for(lat, lng, z):
+    n = 2 ** z
+    x, y = web_mercator(lat, lng)
+    return z, min(int(x * n), n - 1), min(int(y * n), n - 1)
+
+
+def render_tile(users):
+    features = [
+        {
+            "type": "Feature",
+            "id": u["id"],
+            "geometry": {"type": "Point", "coordinates": [u["longitude"], u["latitude"]]},
+            "properties": {"username": u["username"], "full_name": u["full_name"]},
+        }
+        for u in users
+    ]
+    return json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":")).encode()
+
+
+# more changes than this since the last look and the whole cache is dropped
+REFRESH_LIMIT = 10000
+
+
+class TileCache:
+    def __init__(self, min_zoom=10, max_zoom=18, max_tiles=1024):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()  # (z, x, y) -> (etag, body, member ids)
+        self._members = {}  # user id -> cached tiles that contain the user
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by every invalidation
+        self._refresh_lock = threading.Lock()
+        self.version = None  # map change log version the cache has seen
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, db, z, x, y, overlay=None):
+        # (etag, body) for a tile, rendering it on a miss
+        key = (z, x, y)
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        users = [overlay(u) if overlay else dict(u) for u in users_in_bbox(db, tile_bbox(z, x, y))]
+        body = render_tile(users)
+        etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        members = [u["id"] for u in users]
+        with self._lock:
+            if generation != self._generation:
+                # positions changed while rendering; serve it but don't cache it
+                return etag, body
+            self._drop(key)
+            self._tiles[key] = (etag, body, members)
+            for user_id in members:
+                self._members.setdefault(user_id, set()).add(key)
+            while len(self._tiles) > self.max_tiles:
+                self._drop(next(iter(self._tiles)))
+        return etag, body
+
+    def _drop(self, key):
+        entry = self._tiles.pop(key, None)
+        if entry is None:
+            return False
+        for user_id in entry[2]:
+            keys = self._members.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._members[user_id]
+        return True
+
+    def invalidate(self, user_id, latitude=None, longitude=None):
+        # drop the tiles the user was in and the ones covering the new position
+        with self._lock:
+            self._generation += 1
+            keys = set(self._members.get(user_id, ()))
+            if latitude is not None and longitude is not None:
+                keys.update(tile_for(latitude, longitude, z) for z in range(self.min_zoom, self.max_zoom + 1))
+            for key in keys:
+                if self._drop(key):
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._tiles)
+            self._tiles.clear()
+            self._members.clear()
+
+    def refresh(self, db):
+        # drop the tiles of users changed since the last call
+        with self._refresh_lock:
+            version = changelog.current_version(db)
+            if self.version is None or version < self.version:
+                # first use (nothing cached yet), or the database was replaced
+                self.clear()
+                self.version = version
+                return
+            if version == self.version:
+                return
+            inserted, moved, removed, last, more = changelog.changes_since(db, self.version, REFRESH_LIMIT)
+            if more:
+                self.clear()
+                self.version = version
+                return
+            for user in inserted + moved:
+                self.invalidate(user["id"], user["latitude"], user["longitude"])
+            for user_id in removed:
+                self.invalidate(user_id)
+            self.version = last
+
+    def on_location_changed(self, sender, user_id, latitude, longitude, **fields):
+        self.invalidate(user_id, latitude, longitude)
+
+    def on_flush(self, batch):
+        # buffered positions reached the database: tiles rendered from the
+        # old rows in the meantime are stale
+        for user_id, (latitude, longitude) in batch.items():
+            self.invalidate(user_id, latitude, longitude)
+
+    def stats(self):
+        return {"tiles": len(self._tiles), "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+def init_app(app):
+    app.config.setdefault("TILE_MIN_ZOOM", 10)
+    app.config.setdefault("TILE_MAX_ZOOM", 18)
+    app.config.setdefault("TILE_CACHE_SIZE", 1024)
+    cache = TileCache(app.config["TILE_MIN_ZOOM"], app.config["TILE_MAX_ZOOM"], app.config["TILE_CACHE_SIZE"])
+    app.extensions["tile_cache"] = cache
+    location_changed.connect(cache.on_location_changed, sender=app)
+    buffer = app.extensions.get("location_buffer")
+    if buffer:
+        buffer.flush_listeners.append(cache.on_flush)
+    return cache